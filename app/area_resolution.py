@@ -1,38 +1,119 @@
-from pydantic import BaseModel
+from typing import ClassVar, Tuple
+from pydantic import BaseModel, model_validator
 import math
+import numpy as np
 
-from .types import LatLon
+from .projection import LocalFrame, wrap_longitude
+from .tour import TourPlanner
+from .types import LatLon, Route
+
+# most side directions of a polygon that planners will try sweeping it in
+MAX_SWEEP_ANGLES = 8
+# points around the outline of a circle, when drawing it
+OUTLINE_POINTS = 128
+
+
+def route_to_latlons(route: Route) -> list[LatLon]:
+    """Convert an (n, 2) route array back into a list of lat/lon tuples."""
+    return [(lat, lon) for lat, lon in route.tolist()]
 
 
 class TargetArea(BaseModel):
     """An area to be divided into a search sequence for a drone."""
 
-    def search_area(self, vision: float) -> list[LatLon]:
-        """Get a sequence of points to fully cover the search area."""
+    # names of routing methods (with vectorized `_array` variants) for planners to choose from,
+    # on top of `sweep_route`
+    routing_methods: ClassVar[Tuple[str, ...]] = ()
+
+    def bounds(self) -> Tuple[LatLon, LatLon]:
+        """The (lowest, highest) corners of a lat/lon box enclosing the area."""
+        return (0.0, 0.0), (0.0, 0.0)
+
+    def contains(self, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+        """Vectorized test of which points are inside the area."""
+        return np.zeros(np.broadcast(lats, lons).shape, dtype=np.bool_)
+
+    def outline(self) -> list[Route]:
+        """The boundaries of the area, as closed rings of points (for drawing it)."""
         return []
 
+    def centre(self) -> LatLon:
+        """Middle of the area's bounds."""
+        (min_lat, min_lon), (max_lat, max_lon) = self.bounds()
+        return (min_lat + max_lat) / 2, (min_lon + max_lon) / 2
+
+    def in_frame(self, frame: LocalFrame) -> "TargetArea":
+        """The same area, with its lat/lon converted to metres in `frame`.
+
+        Distances (eg. radii) are taken to already be in metres.
+        """
+        return self
+
+    def sweep_angles(self) -> list[float]:
+        """Candidate directions (radians from the latitude axis) to sweep the area in."""
+        return [math.pi * i / 12 for i in range(12)]
+
+    def sweep_route(self, vision: float, angle: float) -> Route:
+        """Get a boustrophedon (back and forth) sweep of the area, with lines at `angle`."""
+        return np.empty((0, 2))
+
+    def local_search_route(self, vision: float) -> Route:
+        """`search_route` for an area already converted into a flat frame (see `in_frame`)."""
+        return np.empty((0, 2))
+
+    def search_route(self, vision: float) -> Route:
+        """Get a sequence of points to fully cover the search area, as an (n, 2) array.
+
+        The area is covered in a local frame around its centre, so `vision` is in metres.
+        """
+        frame = LocalFrame(*self.centre())
+        return frame.to_latlon(self.in_frame(frame).local_search_route(vision))
+
+    def search_area(self, vision: float) -> list[LatLon]:
+        """Get a sequence of points to fully cover the search area, with `vision` in metres."""
+        return route_to_latlons(self.search_route(vision))
+
 
 class TargetCircle(TargetArea):
-    """Circle centred around a lat/lon with a radius.
+    """Circle centred around a lat/lon with a radius, in metres.
 
     Has methods for routing drones to cover it, given a particular (circular) vision radius.
+    The routing methods work in the same units as the centre, so are meant for the circle
+    converted into a flat frame (see `in_frame`) rather than for lat/lon.
     """
 
     lat: float
     lon: float
     radius: float
 
-    def slice_angles(self, vision: float) -> list[float]:
-        """Get a sequence of radius angles that divide the circle into arcs.
+    routing_methods: ClassVar[Tuple[str, ...]] = (
+        "path_method1",
+        "path_method2",
+        "path_method3",
+    )
 
-        An angle will be used such that `vision` is the length of the curved side of the arc(s).
-        """
+    def slice_angles_array(self, vision: float) -> np.ndarray:
+        """Vectorized `slice_angles`."""
 
         # calculate arc angle
         inc_angle = math.atan2(vision * 2, self.radius)
         # minimum number of arcs with this angle to cover the whole circle
         num_slices = int(math.ceil(2 * math.pi / inc_angle))
-        return [inc_angle * i for i in range(num_slices)]
+        return inc_angle * np.arange(num_slices)
+
+    def slice_angles(self, vision: float) -> list[float]:
+        """Get a sequence of radius angles that divide the circle into arcs.
+
+        An angle will be used such that `vision` is the length of the curved side of the arc(s).
+        """
+        return self.slice_angles_array(vision).tolist()
+
+    def displace_from_centre_array(self, thetas: np.ndarray, dist: float) -> Route:
+        """Vectorized `displace_from_centre`, for many bearings at the same distance."""
+
+        return np.column_stack(
+            (np.sin(thetas) * dist + self.lat, np.cos(thetas) * dist + self.lon)
+        )
 
     def displace_from_centre(self, theta: float, dist: float) -> LatLon:
         """Get a point given a bearing and distance from the centre."""
@@ -45,69 +126,368 @@ class TargetCircle(TargetArea):
         """Convenience method to get the centre of the circle."""
         return self.lat, self.lon
 
+    def in_frame(self, frame: LocalFrame) -> "LocalCircle":
+        lat, lon = frame.to_local(np.array(self.centre())).tolist()
+        return LocalCircle(lat=lat, lon=lon, radius=self.radius)
+
+    def path_method1_array(self, vision: float) -> Route:
+        """Vectorized `path_method1`."""
+
+        rim = self.displace_from_centre_array(
+            self.slice_angles_array(vision), self.radius
+        )
+
+        # go to the outside of each arc, then back in again,
+        # so every even index is the centre and every odd one is on the rim
+        coords = np.empty((len(rim) * 2 + 1, 2))
+        coords[0::2] = self.centre()
+        coords[1::2] = rim
+        return coords
+
     def path_method1(self, vision: float) -> list[LatLon]:
         """Generate a radial point sequence."""
+        return route_to_latlons(self.path_method1_array(vision))
 
-        coords: list[LatLon] = [self.centre()]
+    def path_method2_array(self, vision: float) -> Route:
+        """Vectorized `path_method2`."""
 
-        for theta in self.slice_angles(vision):
-            # go to the outside of the next arc, then back in again
-            coords.append(self.displace_from_centre(theta, self.radius))
-            coords.append(self.centre())
+        rim = self.displace_from_centre_array(
+            self.slice_angles_array(vision), self.radius
+        )
+        num_pairs, odd = divmod(len(rim), 2)
 
-        return coords
+        # each pair of arcs is: out to the rim, *along* the circumference one arc,
+        # then back to the centre :)
+        pairs = np.empty((num_pairs, 3, 2))
+        pairs[:, :2] = rim[: num_pairs * 2].reshape(num_pairs, 2, 2)
+        pairs[:, 2] = self.centre()
+
+        parts = [np.array([self.centre()]), pairs.reshape(-1, 2)]
+        # if there's an arc left over, don't cross our first arc again,
+        # just go out and back
+        if odd:
+            parts.append(np.array([rim[-1], self.centre()]))
+        return np.concatenate(parts)
 
     def path_method2(self, vision: float) -> list[LatLon]:
         """Generate a radial point sequence, with lower overall distance."""
+        return route_to_latlons(self.path_method2_array(vision))
 
-        coords: list[LatLon] = [self.centre()]
-        slices = self.slice_angles(vision)
-
-        for i in range(0, len(slices), 2):
-            # go to the outside of the next arc
-            theta1 = slices[i]
-            coords.append(self.displace_from_centre(theta1, self.radius))
-            # if we're not about to cross our first arc again (ie. this is not the last arc),
-            # move *along* the circumference one arc
-            if i + 1 < len(slices):
-                theta2 = slices[i + 1]
-                coords.append(self.displace_from_centre(theta2, self.radius))
-            # then back to the centre :)
-            coords.append(self.centre())
+    def path_method3_array(self, vision: float) -> Route:
+        """Vectorized `path_method3`."""
 
+        # start at the very "bottom" of the circle
+        start_lat = self.lat - self.radius
+
+        # generate a sequence of latitudes that we're gonna cross the circle at,
+        # skipping the first one since it's our start point
+        num_lines = int(math.ceil((self.radius * 2) / vision))
+        latitude_lines = start_lat + vision * np.arange(1, num_lines)
+
+        # use pythagoras to calculate the longitude difference between
+        # the centre of the circle and the point(s) at the intersection of
+        # the circle and each latitude line
+        vert_from_centre = np.fabs(self.lat - latitude_lines)
+        hor_from_centre = np.sqrt(np.fabs(self.radius**2 - vert_from_centre**2))
+
+        coords = np.empty((len(latitude_lines) * 2 + 1, 2))
+        coords[0] = start_lat, self.lon
+        coords[1::2, 0] = latitude_lines
+        coords[1::2, 1] = self.lon + hor_from_centre
+        coords[2::2, 0] = latitude_lines
+        coords[2::2, 1] = self.lon - hor_from_centre
         return coords
 
     def path_method3(self, vision: float) -> list[LatLon]:
         """Generate a zig-zag across the circle."""
+        return route_to_latlons(self.path_method3_array(vision))
 
-        # start at the very "bottom" of the circle
-        start_lat = self.lat - self.radius
-        coords = [(start_lat, self.lon)]
+    def bounds(self) -> Tuple[LatLon, LatLon]:
+        # the radius in degrees of each, which differ away from the equator
+        dlat, dlon = self.radius / LocalFrame(self.lat, self.lon).scale
+        return (
+            (self.lat - dlat, self.lon - dlon),
+            (self.lat + dlat, self.lon + dlon),
+        )
+
+    def contains(self, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+        north, east = LocalFrame(self.lat, self.lon).scale
+        return (
+            np.hypot((lats - self.lat) * north, wrap_longitude(lons - self.lon) * east)
+            <= self.radius
+        )
+
+    def outline(self) -> list[Route]:
+        frame = LocalFrame(self.lat, self.lon)
+        return [frame.to_latlon(ring) for ring in self.in_frame(frame).outline()]
+
+    def sweep_angles(self) -> list[float]:
+        # a circle looks the same in every direction
+        return [0.0]
+
+    def sweep_route(self, vision: float, angle: float) -> Route:
+        """Generate a zig-zag across the circle like `path_method3`, but alternating direction.
+
+        Lines are crossed in alternating directions, so there are no diagonal legs back across
+        the circle between them.
+        """
 
-        # generate a sequence of latitudes that we're gonna cross the circle at
+        # work relative to the centre, with lines parallel to the longitude axis
         num_lines = int(math.ceil((self.radius * 2) / vision))
-        latitude_lines: list[float] = [
-            start_lat + (vision * i)
-            # skip the first one since it's our start point
-            for i in range(1, num_lines)
+        lines = -self.radius + vision * np.arange(1, num_lines)
+        half_widths = np.sqrt(np.fabs(self.radius**2 - lines**2))
+        # flip every other line, so each one starts where the last one ended
+        sides = np.where(np.arange(len(lines)) % 2 == 0, 1.0, -1.0)
+
+        local = np.empty((len(lines) * 2 + 1, 2))
+        local[0] = -self.radius, 0.0
+        local[1::2, 0] = lines
+        local[1::2, 1] = half_widths * sides
+        local[2::2, 0] = lines
+        local[2::2, 1] = -half_widths * sides
+
+        # rotate the lines round to the sweep angle, and back out to the centre
+        cos, sin = math.cos(angle), math.sin(angle)
+        coords = np.empty_like(local)
+        coords[:, 0] = local[:, 0] * cos - local[:, 1] * sin + self.lat
+        coords[:, 1] = local[:, 0] * sin + local[:, 1] * cos + self.lon
+        return coords
+
+    def local_search_route(self, vision: float) -> Route:
+        return self.path_method3_array(vision)
+
+
+class LocalCircle(TargetCircle):
+    """A `TargetCircle` in a flat frame, with its centre in metres like its radius."""
+
+    def bounds(self) -> Tuple[LatLon, LatLon]:
+        return (
+            (self.lat - self.radius, self.lon - self.radius),
+            (self.lat + self.radius, self.lon + self.radius),
+        )
+
+    def contains(self, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+        return np.hypot(lats - self.lat, lons - self.lon) <= self.radius
+
+    def outline(self) -> list[Route]:
+        angles = np.linspace(0, 2 * math.pi, OUTLINE_POINTS + 1)
+        return [self.displace_from_centre_array(angles, self.radius)]
+
+    def search_route(self, vision: float) -> Route:
+        # already flat, so there's nothing to project
+        return self.local_search_route(vision)
+
+
+def _rotate(points: np.ndarray, angle: float) -> np.ndarray:
+    """Rotate lat/lon points into (across, along) coordinates for sweep lines at `angle`.
+
+    Rotating by `-angle` goes back again.
+    """
+    cos, sin = math.cos(angle), math.sin(angle)
+    return points @ np.array([[cos, -sin], [sin, cos]])
+
+
+def _scanlines(edges: np.ndarray, levels: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Intersect the lines `u = level` with polygon edges, vectorized over both.
+
+    `edges` is an (n, 2, 2) array of (u, v) start and end points, and `levels` must be sorted.
+    Returns the index of the level and the v of every crossing, sorted by level then v.
+    """
+    a, b = edges[:, 0], edges[:, 1]
+    # each edge crosses a contiguous run of the levels, half open so that a line through a
+    # vertex only crosses one of the edges meeting at it, and never crosses a parallel edge
+    first = np.searchsorted(levels, np.minimum(a[:, 0], b[:, 0]))
+    counts = np.searchsorted(levels, np.maximum(a[:, 0], b[:, 0])) - first
+
+    edge = np.repeat(np.arange(len(edges)), counts)
+    # offset of each crossing within its edge's run
+    within = np.arange(len(edge)) - np.repeat(np.cumsum(counts) - counts, counts)
+    rows = first[edge] + within
+
+    a, b = a[edge], b[edge]
+    values = a[:, 1] + (levels[rows] - a[:, 0]) * (b[:, 1] - a[:, 1]) / (
+        b[:, 0] - a[:, 0]
+    )
+    order = np.lexsort((values, rows))
+    return rows[order], values[order]
+
+
+def _decompose(lines: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """Group the intervals of sweep lines into cells that can each be swept back and forth.
+
+    Intervals (sorted by line, then start) on neighbouring lines are in the same cell when
+    they only overlap each other, so concave parts of a polygon and the sides of holes end up
+    in cells of their own.
+    Returns the cell of each interval, as the index of the first interval in it.
+    """
+    n = len(lines)
+    # put every line's intervals in their own band, so one global search finds overlaps
+    # between neighbouring lines
+    low = min(starts.min(), ends.min())
+    width = 2 * (max(starts.max(), ends.max()) - low) + 1
+    lo_keys = starts - low + lines * width
+    hi_keys = ends - low + lines * width
+
+    def overlapping(lo: np.ndarray, hi: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """First overlapping interval and how many there are, for bands shifted into place."""
+        first = np.searchsorted(hi_keys, lo, side="right")
+        last = np.searchsorted(lo_keys, hi, side="left")
+        return first, last - first
+
+    up, up_count = overlapping(lo_keys - width, hi_keys - width)
+    _, down_count = overlapping(lo_keys + width, hi_keys + width)
+    linked = up_count == 1
+    linked[linked] = down_count[up[linked]] == 1
+
+    # follow each chain of links back to its first interval, by pointer jumping
+    cells = np.where(linked, up, np.arange(n))
+    while True:
+        jumped = cells[cells]
+        if np.array_equal(jumped, cells):
+            return cells
+        cells = jumped
+
+
+class TargetPolygon(TargetArea):
+    """Polygon of lat/lon vertices, optionally with holes in it that don't need searching.
+
+    Rings are implicitly closed, with the last vertex joining back up to the first.
+    """
+
+    exterior: list[LatLon]
+    holes: list[list[LatLon]] = []
+
+    @model_validator(mode="after")
+    def check_rings(self) -> "TargetPolygon":
+        if any(len(ring) < 3 for ring in (self.exterior, *self.holes)):
+            raise ValueError("every ring must have at least 3 vertices")
+        return self
+
+    def edges(self, angle: float = 0.0) -> np.ndarray:
+        """Every edge of the polygon and its holes as an (n, 2, 2) array of start and end points.
+
+        Points are rotated into sweep line coordinates for lines at `angle`.
+        """
+        rings = [
+            np.asarray(ring, dtype=np.float64) for ring in (self.exterior, *self.holes)
         ]
+        edges = np.concatenate(
+            [np.stack((ring, np.roll(ring, -1, axis=0)), axis=1) for ring in rings]
+        )
+        return _rotate(edges, angle) if angle else edges
 
-        # use pythagoras to calculate the longitude difference between
-        # the centre of the circle and the point(s) at the intersection of
-        # the circle and a given latitude line
-        def get_abs_hor_displacement(latitude: float) -> float:
-            vert_from_centre = math.fabs(self.lat - latitude)
+    def in_frame(self, frame: LocalFrame) -> "TargetPolygon":
+        # already validated, and could be a lot of vertices to validate again
+        return TargetPolygon.model_construct(
+            exterior=frame.to_local(np.asarray(self.exterior)).tolist(),
+            holes=[frame.to_local(np.asarray(hole)).tolist() for hole in self.holes],
+        )
 
-            # pythagoras
-            diff_squares = math.fabs((self.radius**2) - (vert_from_centre**2))
-            return math.sqrt(diff_squares)
+    def outline(self) -> list[Route]:
+        rings = [
+            np.asarray(ring, dtype=np.float64) for ring in (self.exterior, *self.holes)
+        ]
+        return [np.concatenate((ring, ring[:1])) for ring in rings]
 
-        for line in latitude_lines:
-            hor_from_centre1 = get_abs_hor_displacement(line)
-            coords.append((line, self.lon + hor_from_centre1))
-            coords.append((line, self.lon - hor_from_centre1))
+    def bounds(self) -> Tuple[LatLon, LatLon]:
+        points = np.asarray(self.exterior, dtype=np.float64)
+        (min_lat, min_lon), (max_lat, max_lon) = points.min(axis=0), points.max(axis=0)
+        return (float(min_lat), float(min_lon)), (float(max_lat), float(max_lon))
 
-        return coords
+    def contains(self, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+        lats, lons = np.broadcast_arrays(
+            np.asarray(lats, dtype=np.float64), np.asarray(lons, dtype=np.float64)
+        )
+        levels, which = np.unique(lats, return_inverse=True)
+        which = which.reshape(-1)
+        rows, values = _scanlines(self.edges(), levels)
 
-    def search_area(self, vision: float) -> list[LatLon]:
-        return self.path_method3(vision)
+        # sort the points in amongst the crossings of their latitude lines (crossings first
+        # on ties), so the number of crossings before each point can be counted all at once
+        n = len(rows)
+        crossing = np.concatenate(
+            (np.ones(n, np.bool_), np.zeros(len(which), np.bool_))
+        )
+        order = np.lexsort(
+            (
+                ~crossing,
+                np.concatenate((values, lons.reshape(-1))),
+                np.concatenate((rows, which)),
+            )
+        )
+        crossing = crossing[order]
+        before = np.cumsum(crossing) - crossing
+        points = order[~crossing] - n
+
+        left = np.empty(len(which), dtype=np.int64)
+        left[points] = before[~crossing] - np.searchsorted(rows, which[points])
+        # even-odd rule, which also leaves out holes
+        return (left % 2 == 1).reshape(lats.shape)
+
+    def sweep_angles(self) -> list[float]:
+        """Directions of the polygon's longest sides, since sweeping along them turns least."""
+        edges = self.edges()
+        legs = edges[:, 1] - edges[:, 0]
+        lengths = np.hypot(legs[:, 0], legs[:, 1])
+        legs, lengths = legs[lengths > 0], lengths[lengths > 0]
+
+        # angle of sweep lines parallel to each side, merging ones that are (nearly) the same,
+        # with the longest side of each standing in for the rest
+        order = np.argsort(-lengths, kind="stable")
+        angles = np.arctan2(-legs[order, 0], legs[order, 1]) % math.pi
+        _, first, which = np.unique(
+            np.round(angles, 6) % math.pi, return_index=True, return_inverse=True
+        )
+        totals = np.bincount(which.reshape(-1), weights=lengths[order])
+        best = np.argsort(-totals, kind="stable")[:MAX_SWEEP_ANGLES]
+        return angles[first[best]].tolist()
+
+    def sweep_route(self, vision: float, angle: float) -> Route:
+        """Sweep the polygon back and forth, a cell at a time.
+
+        Each sweep line is cut into the intervals inside the polygon, and the intervals are
+        grouped into cells that can each be swept without leaving the polygon.
+        Cells are then flown in nearest neighbour order.
+        """
+        edges = self.edges(angle)
+        low, high = edges[..., 0].min(), edges[..., 0].max()
+        # evenly spread lines at most `vision` apart, half a gap in from each side
+        num_lines = max(1, int(math.ceil((high - low) / vision)))
+        levels = low + (high - low) * (np.arange(num_lines) + 0.5) / num_lines
+
+        rows, values = _scanlines(edges, levels)
+        if not len(rows):
+            return np.empty((0, 2))
+        lines, starts, ends = rows[0::2], values[0::2], values[1::2]
+        cells = _decompose(lines, starts, ends)
+
+        # order intervals by cell then line, alternating direction within each cell
+        order = np.lexsort((lines, cells))
+        lines, starts, ends, cells = (
+            lines[order],
+            starts[order],
+            ends[order],
+            cells[order],
+        )
+        first = np.flatnonzero(np.diff(cells, prepend=-1))
+        sizes = np.diff(first, append=len(cells))
+        flipped = (np.arange(len(cells)) - np.repeat(first, sizes)) % 2 == 1
+
+        local = np.empty((len(lines) * 2, 2))
+        local[:, 0] = np.repeat(levels[lines], 2)
+        local[0::2, 1] = np.where(flipped, ends, starts)
+        local[1::2, 1] = np.where(flipped, starts, ends)
+
+        bounds = np.append(first * 2, len(local))
+        tour: TourPlanner[int] = TourPlanner()
+        for i in range(len(first)):
+            tour.add(i, tuple(local[bounds[i]]), tuple(local[bounds[i + 1] - 1]))
+        tour.rebuild(start=tuple(local[0]))
+        parts = [
+            local[bounds[i] : bounds[i + 1]][:: -1 if reverse else 1]
+            for i, reverse in tour.order()
+        ]
+        return _rotate(np.concatenate(parts), -angle)
+
+    def local_search_route(self, vision: float) -> Route:
+        return self.sweep_route(vision, self.sweep_angles()[0])
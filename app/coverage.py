@@ -0,0 +1,294 @@
+from collections import deque
+from typing import NamedTuple, Optional, Tuple
+import math
+import time
+
+import numpy as np
+
+from .area_resolution import TargetArea
+from .projection import FrameAnchor
+from .types import Route
+
+Cell = Tuple[int, int]
+
+
+class CellArea(NamedTuple):
+    """An area made up of grid cells: a mask of a block of cells starting at `origin`."""
+
+    origin: Cell
+    mask: np.ndarray
+
+
+# side length (in cells) of the square tiles the grid is allocated in
+TILE = 64
+
+# name of the routing "method" for routes generated from coverage cells
+COVERAGE = "coverage"
+
+
+class CoverageGrid:
+    """Sparse occupancy grid recording which cells of the world are covered.
+
+    The grid is split into square tiles that are only allocated once something in them is
+    covered, so memory grows with the extent of the areas covered rather than the world.
+
+    With an `anchor`, areas and points are lat/lon, and the grid is laid out in metres in the
+    anchor's frame (so `cell_size` is in metres); routes over cells come back as lat/lon.
+    Like any flat frame, it's only accurate within a few tens of kilometres of where it was
+    anchored, so areas out of the anchor's range are refused, and points out of it ignored.
+    Without one, everything is already in the grid's units.
+    """
+
+    def __init__(self, cell_size: float, anchor: Optional[FrameAnchor] = None):
+        self.cell_size = cell_size
+        self.anchor = anchor
+        self._tiles: dict[Cell, np.ndarray] = dict()
+
+    def __len__(self) -> int:
+        """Number of allocated tiles."""
+        return len(self._tiles)
+
+    def cells_covered(self) -> int:
+        return sum(int(tile.sum()) for tile in self._tiles.values())
+
+    def clear(self) -> None:
+        self._tiles.clear()
+
+    def cell(self, lat: float, lon: float) -> Cell:
+        return math.floor(lat / self.cell_size), math.floor(lon / self.cell_size)
+
+    def in_range(self, target: TargetArea) -> bool:
+        """Whether all of `target` is in range of the anchor (always, without one)."""
+        if self.anchor is None:
+            return True
+        (min_lat, min_lon), (max_lat, max_lon) = target.bounds()
+        corners = self.anchor.in_range(
+            np.array([min_lat, min_lat, max_lat, max_lat]),
+            np.array([min_lon, max_lon, min_lon, max_lon]),
+        )
+        return bool(corners.all())
+
+    def rasterize(self, target: TargetArea) -> Tuple[Cell, np.ndarray]:
+        """Find the cells whose centres are inside `target`.
+
+        Returns the cell at the lowest corner of the area's bounds, and a mask of the cells in
+        the bounds starting from it.
+        Raises ValueError if the area isn't all in range of the anchor.
+        """
+        if self.anchor is not None:
+            frame = self.anchor.at(*target.centre())
+            if not self.in_range(target):
+                raise ValueError("area is too far from where the grid was anchored")
+            target = target.in_frame(frame)
+        low, high = target.bounds()
+        i0, j0 = self.cell(*low)
+        i1, j1 = self.cell(*high)
+        lats = (np.arange(i0, i1 + 1) + 0.5) * self.cell_size
+        lons = (np.arange(j0, j1 + 1) + 0.5) * self.cell_size
+        return (i0, j0), target.contains(lats[:, None], lons[None, :])
+
+    def _tile_slices(self, origin: Cell, shape: Tuple[int, ...]):
+        """Split a block of cells up by the tiles it overlaps.
+
+        Yields each tile, and the slices of the tile and the block that line up.
+        """
+        i0, j0 = origin
+        i1, j1 = i0 + shape[0], j0 + shape[1]
+        for ti in range(i0 // TILE, (i1 - 1) // TILE + 1):
+            lo_i, hi_i = max(i0, ti * TILE), min(i1, (ti + 1) * TILE)
+            for tj in range(j0 // TILE, (j1 - 1) // TILE + 1):
+                lo_j, hi_j = max(j0, tj * TILE), min(j1, (tj + 1) * TILE)
+                tile = (
+                    slice(lo_i - ti * TILE, hi_i - ti * TILE),
+                    slice(lo_j - tj * TILE, hi_j - tj * TILE),
+                )
+                block = (slice(lo_i - i0, hi_i - i0), slice(lo_j - j0, hi_j - j0))
+                yield (ti, tj), tile, block
+
+    def covered(self, origin: Cell, shape: Tuple[int, ...]) -> np.ndarray:
+        """Get which cells of a block are covered."""
+        out = np.zeros(shape, dtype=np.bool_)
+        for key, tile, block in self._tile_slices(origin, shape):
+            grid = self._tiles.get(key)
+            if grid is not None:
+                out[block] = grid[tile]
+        return out
+
+    def mark(self, origin: Cell, mask: np.ndarray) -> None:
+        """Mark the cells set in `mask` (a block starting at `origin`) as covered."""
+        for key, tile, block in self._tile_slices(origin, mask.shape):
+            part = mask[block]
+            if not part.any():
+                continue
+            grid = self._tiles.get(key)
+            if grid is None:
+                grid = self._tiles[key] = np.zeros((TILE, TILE), dtype=np.bool_)
+            grid[tile] |= part
+
+    def unmark(self, origin: Cell, mask: np.ndarray) -> None:
+        """Mark the cells set in `mask` (a block starting at `origin`) as not covered."""
+        for key, tile, block in self._tile_slices(origin, mask.shape):
+            grid = self._tiles.get(key)
+            if grid is None:
+                continue
+            grid[tile] &= ~mask[block]
+            if not grid.any():
+                del self._tiles[key]
+
+    def cells_near(
+        self, lats: np.ndarray, lons: np.ndarray, radius: float
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Find every cell whose centre is within `radius` of each of the points.
+
+        Returns which point each cell is near, and the cells' rows and columns.
+        Points out of range of the anchor aren't near any.
+        """
+        lats, lons = np.asarray(lats, dtype=np.float64), np.asarray(
+            lons, dtype=np.float64
+        )
+        which = np.arange(len(lats))
+        if self.anchor is not None and len(lats):
+            # placed by the first point if need be, rather than checked against it
+            frame = self.anchor.frame or self.anchor.at(lats[0], lons[0])
+            which = np.flatnonzero(self.anchor.in_range(lats, lons))
+            lats, lons = frame.to_local(np.column_stack((lats, lons))[which]).T
+        if not len(lats):
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty, empty
+
+        # every cell in the square around each point that the circle could reach
+        k = math.ceil(radius / self.cell_size) + 1
+        offsets = np.arange(-k, k + 1)
+        i = (
+            np.floor(lats / self.cell_size).astype(np.int64)[:, None, None]
+            + offsets[:, None]
+        )
+        j = np.floor(lons / self.cell_size).astype(np.int64)[:, None, None] + offsets
+        near = (
+            np.hypot(
+                (i + 0.5) * self.cell_size - lats[:, None, None],
+                (j + 0.5) * self.cell_size - lons[:, None, None],
+            )
+            <= radius
+        )
+        points = np.broadcast_to(which[:, None, None], near.shape)
+        return (
+            points[near],
+            np.broadcast_to(i, near.shape)[near],
+            np.broadcast_to(j, near.shape)[near],
+        )
+
+    def mark_points(self, lats: np.ndarray, lons: np.ndarray, radius: float) -> None:
+        """Mark every cell whose centre is within `radius` of any of the points as covered."""
+        _, i, j = self.cells_near(lats, lons, radius)
+        if not len(i):
+            return
+        tiles = np.stack((i // TILE, j // TILE), axis=1)
+        keys, which = np.unique(tiles, axis=0, return_inverse=True)
+        which = which.reshape(-1)
+        for n, (ti, tj) in enumerate(keys.tolist()):
+            grid = self._tiles.get((ti, tj))
+            if grid is None:
+                grid = self._tiles[(ti, tj)] = np.zeros((TILE, TILE), dtype=np.bool_)
+            here = which == n
+            grid[i[here] - ti * TILE, j[here] - tj * TILE] = True
+
+    def uncovered(self, area: CellArea) -> CellArea:
+        """The cells of `area` that aren't covered yet."""
+        return CellArea(
+            area.origin, area.mask & ~self.covered(area.origin, area.mask.shape)
+        )
+
+    def claim(self, target: TargetArea) -> CellArea:
+        """Mark the cells of `target` as covered, returning the ones that weren't already."""
+        origin, uncovered = self.uncovered(CellArea(*self.rasterize(target)))
+        self.mark(origin, uncovered)
+        return CellArea(origin, uncovered)
+
+    def route_cells(self, origin: Cell, mask: np.ndarray) -> Route:
+        """Generate a back and forth sweep over the centres of the cells set in `mask`.
+
+        Each row's runs of consecutive cells become a single line, and rows alternate direction.
+        """
+        padded = np.pad(mask, ((0, 0), (1, 1))).astype(np.int8)
+        edges = np.diff(padded, axis=1)
+        # nonzero is in row-major order, so each run's start and end line up
+        rows, starts = np.nonzero(edges == 1)
+        _, ends = np.nonzero(edges == -1)
+        ends -= 1
+        if not len(rows):
+            return np.empty((0, 2))
+
+        # flip every other row that has something in it
+        flipped = (np.searchsorted(np.unique(rows), rows) % 2).astype(np.bool_)
+        order = np.lexsort((np.where(flipped, -starts, starts), rows))
+        rows, starts, ends, flipped = (
+            rows[order],
+            starts[order],
+            ends[order],
+            flipped[order],
+        )
+        firsts = np.where(flipped, ends, starts)
+        lasts = np.where(flipped, starts, ends)
+
+        cells = np.empty((len(rows) * 2, 2))
+        cells[0::2, 0] = rows
+        cells[0::2, 1] = firsts
+        cells[1::2, 0] = rows
+        cells[1::2, 1] = lasts
+        # single cell runs would visit the same point twice
+        keep = np.ones(len(cells), dtype=np.bool_)
+        keep[1:] = np.any(cells[1:] != cells[:-1], axis=1)
+        cells = cells[keep]
+
+        points = (cells + np.array(origin) + 0.5) * self.cell_size
+        # cells only get set once something has placed the anchor
+        frame = None if self.anchor is None else self.anchor.frame
+        if frame is not None:
+            points = frame.to_latlon(points)
+        return points
+
+
+class ClaimedCoverage(CoverageGrid):
+    """A `CoverageGrid` of claims on areas, which lapse `ttl` seconds after they're made.
+
+    Claims don't overlap, since each is only of what wasn't already claimed, so any one can
+    be released early without touching the others.
+    """
+
+    def __init__(
+        self,
+        cell_size: float,
+        anchor: Optional[FrameAnchor] = None,
+        ttl: float = 3600.0,
+    ):
+        super().__init__(cell_size, anchor)
+        self.ttl = ttl
+        # oldest first, so they lapse in order
+        self._claims: deque[Tuple[float, CellArea]] = deque()
+
+    def clear(self) -> None:
+        super().clear()
+        self._claims.clear()
+
+    def expire(self, now: Optional[float] = None) -> None:
+        """Release the claims that have lapsed."""
+        now = time.monotonic() if now is None else now
+        while self._claims and self._claims[0][0] <= now:
+            self.unmark(*self._claims.popleft()[1])
+
+    def claim(self, target: TargetArea, now: Optional[float] = None) -> CellArea:
+        now = time.monotonic() if now is None else now
+        self.expire(now)
+        area = super().claim(target)
+        if area.mask.any():
+            self._claims.append((now + self.ttl, area))
+        return area
+
+    def release(self, area: CellArea) -> None:
+        """Give up a claim before it lapses."""
+        for n, (_, claimed) in enumerate(self._claims):
+            if claimed is area:
+                del self._claims[n]
+                self.unmark(*area)
+                return
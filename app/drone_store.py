@@ -0,0 +1,230 @@
+from collections.abc import Mapping
+from datetime import datetime, timezone
+from enum import Enum
+from typing import TYPE_CHECKING, Iterator, Optional
+
+import numpy as np
+from pydantic import BaseModel, model_validator
+
+from .types import DroneId, LatLon
+
+if TYPE_CHECKING:
+    from .journal import Journal
+
+
+class DroneStatus(str, Enum):
+    idle = "idle"
+    flying = "flying"
+    unknown = "unknown"
+
+
+# stored status codes are indices into this
+STATUS_BY_CODE = list(DroneStatus)
+CODE_BY_STATUS = {status: code for code, status in enumerate(STATUS_BY_CODE)}
+
+
+class DroneData(BaseModel):
+    status: DroneStatus
+    battery: int
+    lastUpdate: datetime
+    lastSeen: LatLon
+
+
+class DroneStatusBatch(BaseModel):
+    """Status updates for many drones at once, as one column per field."""
+
+    ids: list[DroneId]
+    status: list[DroneStatus]
+    battery: list[int]
+    lastUpdate: list[datetime]
+    lat: list[float]
+    lon: list[float]
+
+    @model_validator(mode="after")
+    def check_lengths(self) -> "DroneStatusBatch":
+        columns = (self.status, self.battery, self.lastUpdate, self.lat, self.lon)
+        if any(len(column) != len(self.ids) for column in columns):
+            raise ValueError("every column must have one entry per id")
+        return self
+
+    @classmethod
+    def of(cls, drones: dict[DroneId, DroneData]) -> "DroneStatusBatch":
+        # already validated as `DroneData`, so skip validating them again
+        return cls.model_construct(
+            ids=list(drones),
+            status=[drone.status for drone in drones.values()],
+            battery=[drone.battery for drone in drones.values()],
+            lastUpdate=[drone.lastUpdate for drone in drones.values()],
+            lat=[drone.lastSeen[0] for drone in drones.values()],
+            lon=[drone.lastSeen[1] for drone in drones.values()],
+        )
+
+
+def to_timestamp(when: datetime) -> float:
+    """Seconds since the epoch, treating naive datetimes as UTC."""
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return when.timestamp()
+
+
+class DroneStore(Mapping):
+    """Drone statuses stored as a struct of numpy arrays, one row per drone.
+
+    Reading a drone builds a `DroneData` on demand; writes go straight into the columns, and
+    many drones can be written at once with `put_batch`.
+    Rows of removed drones are reused by new ones.
+
+    If `journal` is set, it's told about every drone that changes or is removed.
+    """
+
+    def __init__(self, capacity: int = 64):
+        self._rows: dict[DroneId, int] = dict()
+        self._free: list[int] = []
+        self._size = 0
+        self.lat = np.zeros(capacity)
+        self.lon = np.zeros(capacity)
+        self.battery = np.zeros(capacity, dtype=np.int32)
+        self.status = np.zeros(capacity, dtype=np.uint8)
+        self.last_update = np.zeros(capacity)
+        self.journal: Optional["Journal"] = None
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __iter__(self) -> Iterator[DroneId]:
+        return iter(self._rows)
+
+    def __contains__(self, id: object) -> bool:
+        return id in self._rows
+
+    def __getitem__(self, id: DroneId) -> DroneData:
+        row = self._rows[id]
+        return DroneData(
+            status=STATUS_BY_CODE[self.status[row]],
+            battery=int(self.battery[row]),
+            lastUpdate=datetime.fromtimestamp(self.last_update[row], timezone.utc),
+            lastSeen=(float(self.lat[row]), float(self.lon[row])),
+        )
+
+    def row(self, id: DroneId) -> Optional[int]:
+        return self._rows.get(id)
+
+    def position(self, id: DroneId) -> Optional[LatLon]:
+        row = self._rows.get(id)
+        if row is None:
+            return None
+        return float(self.lat[row]), float(self.lon[row])
+
+    def _grow(self, capacity: int) -> None:
+        for name in ("lat", "lon", "battery", "status", "last_update"):
+            column = getattr(self, name)
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[: len(column)] = column
+            setattr(self, name, grown)
+
+    def _row_for(self, id: DroneId) -> int:
+        """Get the row of a drone, allocating one if it's new."""
+        row = self._rows.get(id)
+        if row is not None:
+            return row
+        if self._free:
+            row = self._free.pop()
+        else:
+            row = self._size
+            self._size += 1
+            if row >= len(self.lat):
+                self._grow(max(len(self.lat) * 2, 1))
+        self._rows[id] = row
+        return row
+
+    def put(self, id: DroneId, drone: DroneData) -> bool:
+        """Store a drone's status, returning whether anything changed."""
+        return bool(self.put_batch(DroneStatusBatch.of({id: drone})))
+
+    def put_batch(self, batch: DroneStatusBatch) -> list[DroneId]:
+        """Store many drones' statuses at once, returning the ids of the ones that changed.
+
+        If a drone appears more than once, the last update wins.
+        """
+        # keep only the last update for each drone
+        last = {id: i for i, id in enumerate(batch.ids)}
+        ids = list(last)
+        order = np.fromiter(last.values(), dtype=np.intp, count=len(last))
+
+        existing = np.fromiter(
+            (id in self._rows for id in ids), dtype=np.bool_, count=len(ids)
+        )
+        rows = np.fromiter(
+            (self._row_for(id) for id in ids),
+            dtype=np.intp,
+            count=len(ids),
+        )
+
+        lat = np.asarray(batch.lat, dtype=np.float64)[order]
+        lon = np.asarray(batch.lon, dtype=np.float64)[order]
+        battery = np.asarray(batch.battery, dtype=np.int32)[order]
+        status = np.fromiter(
+            (CODE_BY_STATUS[status] for status in batch.status),
+            dtype=np.uint8,
+            count=len(batch.status),
+        )[order]
+        last_update = np.fromiter(
+            (to_timestamp(when) for when in batch.lastUpdate),
+            dtype=np.float64,
+            count=len(batch.lastUpdate),
+        )[order]
+
+        changed = ~existing | (
+            (self.lat[rows] != lat)
+            | (self.lon[rows] != lon)
+            | (self.battery[rows] != battery)
+            | (self.status[rows] != status)
+            | (self.last_update[rows] != last_update)
+        )
+
+        self.lat[rows] = lat
+        self.lon[rows] = lon
+        self.battery[rows] = battery
+        self.status[rows] = status
+        self.last_update[rows] = last_update
+        changed_ids = [
+            id for id, was_changed in zip(ids, changed.tolist()) if was_changed
+        ]
+        if self.journal is not None and changed_ids:
+            self.journal.drones_changed(self, changed_ids, rows[changed])
+        return changed_ids
+
+    def put_columns(
+        self,
+        ids: list[DroneId],
+        lat: np.ndarray,
+        lon: np.ndarray,
+        battery: np.ndarray,
+        status: np.ndarray,
+        last_update: np.ndarray,
+    ) -> None:
+        """Store rows that are already in the store's own format, eg. when restoring them."""
+        rows = np.fromiter(
+            (self._row_for(id) for id in ids), dtype=np.intp, count=len(ids)
+        )
+        self.lat[rows] = lat
+        self.lon[rows] = lon
+        self.battery[rows] = battery
+        self.status[rows] = status
+        self.last_update[rows] = last_update
+        if self.journal is not None and ids:
+            self.journal.drones_changed(self, ids, rows)
+
+    def remove(self, id: DroneId) -> None:
+        row = self._rows.pop(id, None)
+        if row is not None:
+            self._free.append(row)
+            if self.journal is not None:
+                self.journal.drones_removed([id])
+
+    def clear(self) -> None:
+        if self.journal is not None:
+            self.journal.drones_cleared()
+        self._rows.clear()
+        self._free.clear()
+        self._size = 0
@@ -0,0 +1,113 @@
+from collections import OrderedDict
+from enum import Enum
+from typing import Awaitable, Optional, Tuple
+import asyncio
+import uuid
+
+from pydantic import BaseModel, PrivateAttr
+
+from .area_resolution import TargetArea
+from .planning import RouteCost
+from .types import Route
+
+
+class JobState(str, Enum):
+    pending = "pending"
+    done = "done"
+    failed = "failed"
+
+
+class Job(BaseModel):
+    """Handle on a route that's being planned in the background."""
+
+    id: str
+    state: JobState = JobState.pending
+    method: Optional[str] = None
+    cost: Optional[RouteCost] = None
+    seconds: Optional[float] = None
+    error: Optional[str] = None
+    # the area and the route planned over it, kept for previews but not part of responses,
+    # until the preview's been rendered and cached
+    _planned: Optional[Tuple[TargetArea, Route]] = PrivateAttr(None)
+    # the cache key of the rendered preview, once it has been
+    _preview: Optional[str] = PrivateAttr(None)
+
+    @property
+    def planned(self) -> Optional[Tuple[TargetArea, Route]]:
+        return self._planned
+
+    @property
+    def preview(self) -> Optional[str]:
+        return self._preview
+
+    def set_planned(self, target: TargetArea, route: Route) -> None:
+        self._planned = (target, route)
+
+    def set_preview(self, key: str) -> None:
+        """Record that the preview's been cached, so the area and route needn't be kept."""
+        self._planned = None
+        self._preview = key
+
+
+class JobRegistry:
+    """Tracks background planning jobs by id.
+
+    Pending jobs are always kept; only the most recent `max_finished` finished jobs are remembered.
+    """
+
+    def __init__(self, max_finished: int = 1024):
+        self.max_finished = max_finished
+        self._jobs: OrderedDict[str, Job] = OrderedDict()
+        self._tasks: dict[str, asyncio.Task] = dict()
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def new(self) -> Job:
+        job = Job(id=uuid.uuid4().hex)
+        self._jobs[job.id] = job
+        return job
+
+    def start(self, job: Job, work: Awaitable[None]) -> None:
+        """Run `work` in the background on behalf of `job`, marking it failed if it raises."""
+
+        async def run():
+            try:
+                await work
+            except Exception as e:
+                job.state = JobState.failed
+                job.error = repr(e)
+            finally:
+                self._tasks.pop(job.id, None)
+                self.finish(job)
+
+        self._tasks[job.id] = asyncio.create_task(run())
+
+    def finish(self, job: Job) -> None:
+        """Record that `job` is no longer pending, forgetting the oldest finished jobs if needed."""
+        if job.id not in self._jobs:
+            return
+        self._jobs.move_to_end(job.id)
+        finished = len(self._jobs) - len(self._tasks)
+        for job_id in list(self._jobs):
+            if finished <= self.max_finished:
+                break
+            if job_id not in self._tasks:
+                del self._jobs[job_id]
+                finished -= 1
+
+    async def wait(self, job_id: str) -> Optional[Job]:
+        """Wait for a job to finish, if it's still pending."""
+        task = self._tasks.get(job_id)
+        if task is not None:
+            await asyncio.shield(task)
+        return self.get(job_id)
+
+    def clear(self) -> None:
+        for task in self._tasks.values():
+            task.cancel()
+        self._tasks.clear()
+        self._jobs.clear()
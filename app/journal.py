@@ -0,0 +1,387 @@
+from typing import Any, BinaryIO, Optional, Tuple
+import asyncio
+import base64
+import json
+import math
+import os
+import struct
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from .area_resolution import TargetArea, TargetCircle, TargetPolygon
+from .coverage import CellArea
+from .drone_store import DroneStore
+from .scheduler import QueuedRoute, RouteScheduler
+from .types import DroneId
+
+# record kinds
+DRONES = 1
+DRONES_REMOVED = 2
+DRONES_CLEARED = 3
+QUEUED = 4
+TAKEN = 5
+QUEUE_CLEARED = 6
+# first record of a snapshot, whose sequence number is the last logged change it includes
+SNAPSHOT = 7
+
+# kind, sequence number, payload length, crc32 of the payload
+HEADER = struct.Struct("<BQII")
+# id, priority, seconds since the epoch it was queued, number of points, area length
+QUEUED_HEADER = struct.Struct("<QqdII")
+# vision radius the route was planned with (nan if it isn't known), after the area; records
+# from before it was kept just end after the area
+QUEUED_VISION = struct.Struct("<d")
+TAKEN_ID = struct.Struct("<Q")
+
+LOG_NAME = "wal.log"
+SNAPSHOT_NAME = "snapshot.bin"
+
+AREA_TYPES = {cls.__name__: cls for cls in (TargetCircle, TargetPolygon)}
+
+# drone columns, in the order and format they're written in
+DRONE_COLUMNS = (
+    ("lat", "<f8"),
+    ("lon", "<f8"),
+    ("battery", "<i4"),
+    ("status", "u1"),
+    ("last_update", "<f8"),
+)
+
+
+def _record(kind: int, seq: int, payload: bytes = b"") -> bytes:
+    return HEADER.pack(kind, seq, len(payload), zlib.crc32(payload)) + payload
+
+
+def _pack_ids(ids: list[DroneId]) -> bytes:
+    encoded = [id.encode() for id in ids]
+    lengths = np.fromiter((len(e) for e in encoded), dtype="<u4", count=len(encoded))
+    return struct.pack("<I", len(encoded)) + lengths.tobytes() + b"".join(encoded)
+
+
+def _unpack_ids(payload: memoryview, offset: int = 0) -> Tuple[list[DroneId], int]:
+    (n,) = struct.unpack_from("<I", payload, offset)
+    offset += 4
+    lengths = np.frombuffer(payload, dtype="<u4", count=n, offset=offset)
+    offset += 4 * n
+    bounds = [0, *np.cumsum(lengths).tolist()]
+    raw = bytes(payload[offset : offset + bounds[-1]])
+    ids = [raw[start:end].decode() for start, end in zip(bounds, bounds[1:])]
+    return ids, offset + bounds[-1]
+
+
+def _pack_drones(store: DroneStore, ids: list[DroneId], rows: np.ndarray) -> bytes:
+    parts = [_pack_ids(ids)]
+    for name, dtype in DRONE_COLUMNS:
+        parts.append(getattr(store, name)[rows].astype(dtype, copy=False).tobytes())
+    return b"".join(parts)
+
+
+def _unpack_drones(payload: memoryview) -> Tuple[list[DroneId], list[np.ndarray]]:
+    ids, offset = _unpack_ids(payload)
+    columns = []
+    for _, dtype in DRONE_COLUMNS:
+        column = np.frombuffer(payload, dtype=dtype, count=len(ids), offset=offset)
+        columns.append(column)
+        offset += column.nbytes
+    return ids, columns
+
+
+def pack_area(area: Any) -> bytes:
+    """Serialise the area a queued route covers, or nothing if it's not one we know of."""
+    data: dict[str, Any]
+    if isinstance(area, CellArea):
+        data = {
+            "origin": list(area.origin),
+            "shape": list(area.mask.shape),
+            "mask": base64.b64encode(np.packbits(area.mask).tobytes()).decode(),
+        }
+    elif isinstance(area, TargetArea) and type(area).__name__ in AREA_TYPES:
+        data = {"type": type(area).__name__, "area": area.model_dump(mode="json")}
+    else:
+        return b""
+    return json.dumps(data, separators=(",", ":")).encode()
+
+
+def unpack_area(raw: bytes) -> Any:
+    if not raw:
+        return None
+    data = json.loads(raw)
+    if "mask" in data:
+        shape = tuple(data["shape"])
+        bits = np.frombuffer(base64.b64decode(data["mask"]), dtype=np.uint8)
+        mask = np.unpackbits(bits, count=shape[0] * shape[1]).astype(np.bool_)
+        return CellArea(tuple(data["origin"]), mask.reshape(shape))
+    return AREA_TYPES[data["type"]].model_validate(data["area"])
+
+
+def _pack_queued(queued: QueuedRoute, wall: float) -> bytes:
+    route = queued.route.astype("<f8", copy=False).tobytes()
+    area = pack_area(queued.area)
+    return (
+        QUEUED_HEADER.pack(
+            queued.id, queued.priority, wall, len(queued.route), len(area)
+        )
+        + route
+        + area
+        + QUEUED_VISION.pack(math.nan if queued.vision is None else queued.vision)
+    )
+
+
+def read_records(path: str) -> Tuple[list[Tuple[int, int, memoryview]], int]:
+    """Read every intact record from a log or snapshot.
+
+    Returns the (kind, seq, payload) records, and how many bytes of the file they make up;
+    anything after that was torn by a crash mid-write.
+    """
+    try:
+        with open(path, "rb") as f:
+            data = memoryview(f.read())
+    except FileNotFoundError:
+        return [], 0
+
+    records = []
+    offset = 0
+    while offset + HEADER.size <= len(data):
+        kind, seq, length, crc = HEADER.unpack_from(data, offset)
+        start = offset + HEADER.size
+        payload = data[start : start + length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            break
+        records.append((kind, seq, payload))
+        offset = start + length
+    return records, offset
+
+
+class Journal:
+    """Write-ahead log, with periodic snapshots, of the drone store and route queue.
+
+    Changes are appended to an in-memory buffer as they happen, and written out and fsynced
+    in batches every `flush_interval` seconds, so a crash loses at most that much.
+    Once the log grows past `snapshot_bytes`, the whole state is written to a snapshot and
+    the log is started again.
+    Recovering replays the snapshot, then whatever of the log came after it.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        flush_interval: float = 0.05,
+        snapshot_bytes: int = 8 << 20,
+    ):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.snapshot_bytes = snapshot_bytes
+        self.log_path = os.path.join(directory, LOG_NAME)
+        self.snapshot_path = os.path.join(directory, SNAPSHOT_NAME)
+        self.drones: Optional[DroneStore] = None
+        self.queue: Optional[RouteScheduler] = None
+        self._seq = 0
+        self._buffer = bytearray()
+        self._log: Optional[BinaryIO] = None
+        self._log_size = 0
+        # held while writing files, which happens on other threads
+        self._lock = threading.Lock()
+
+    def _append(self, kind: int, payload: bytes = b"") -> None:
+        self._seq += 1
+        self._buffer += _record(kind, self._seq, payload)
+
+    # listeners, called by the drone store and route queue
+
+    def drones_changed(
+        self, store: DroneStore, ids: list[DroneId], rows: np.ndarray
+    ) -> None:
+        self._append(DRONES, _pack_drones(store, ids, rows))
+
+    def drones_removed(self, ids: list[DroneId]) -> None:
+        self._append(DRONES_REMOVED, _pack_ids(ids))
+
+    def drones_cleared(self) -> None:
+        self._append(DRONES_CLEARED)
+
+    def route_queued(self, queued: QueuedRoute) -> None:
+        wall = time.time() - (time.monotonic() - queued.enqueued)
+        self._append(QUEUED, _pack_queued(queued, wall))
+
+    def route_removed(self, queued: QueuedRoute) -> None:
+        self._append(TAKEN, TAKEN_ID.pack(queued.id))
+
+    def queue_cleared(self) -> None:
+        self._append(QUEUE_CLEARED)
+
+    def recover(self, drones: DroneStore, queue: RouteScheduler) -> None:
+        """Restore the state from the snapshot and log into `drones` and `queue`.
+
+        Then starts journalling their changes, from a fresh snapshot of what was restored.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        # every drone record's columns, and where in them each drone's latest status is
+        drone_columns: list[list[np.ndarray]] = [[] for _ in DRONE_COLUMNS]
+        restored_drones: dict[DroneId, int] = dict()
+        restored_count = 0
+        restored_queue: dict[int, tuple] = dict()
+        last = 0
+
+        # a torn record at the end of the log is just dropped, along with anything after it
+        snapshot, _ = read_records(self.snapshot_path)
+        log, _ = read_records(self.log_path)
+        for kind, seq, payload in snapshot + log:
+            if kind == SNAPSHOT:
+                last = seq
+                continue
+            if seq:
+                if seq <= last:
+                    # already part of the snapshot
+                    continue
+                last = seq
+            if kind == DRONES:
+                ids, columns = _unpack_drones(payload)
+                for restored, column in zip(drone_columns, columns):
+                    restored.append(column)
+                restored_drones.update(
+                    zip(ids, range(restored_count, restored_count + len(ids)))
+                )
+                restored_count += len(ids)
+            elif kind == DRONES_REMOVED:
+                for id in _unpack_ids(payload)[0]:
+                    restored_drones.pop(id, None)
+            elif kind == DRONES_CLEARED:
+                restored_drones.clear()
+            elif kind == QUEUED:
+                id, priority, wall, points, area_length = QUEUED_HEADER.unpack_from(
+                    payload
+                )
+                start = QUEUED_HEADER.size
+                route = np.frombuffer(
+                    payload, dtype="<f8", count=points * 2, offset=start
+                ).reshape(-1, 2)
+                start += route.nbytes
+                area = bytes(payload[start : start + area_length])
+                start += area_length
+                vision = None
+                if len(payload) >= start + QUEUED_VISION.size:
+                    (vision,) = QUEUED_VISION.unpack_from(payload, start)
+                    vision = None if math.isnan(vision) else vision
+                restored_queue[id] = (route, priority, wall, area, vision)
+            elif kind == TAKEN:
+                restored_queue.pop(TAKEN_ID.unpack(payload)[0], None)
+            elif kind == QUEUE_CLEARED:
+                restored_queue.clear()
+
+        if restored_drones:
+            latest = np.fromiter(
+                restored_drones.values(), dtype=np.intp, count=len(restored_drones)
+            )
+            drones.put_columns(
+                list(restored_drones),
+                *(np.concatenate(column)[latest] for column in drone_columns),
+            )
+        now = time.time()
+        queue.restore(
+            (route.copy(), priority, max(0.0, now - wall), unpack_area(area), vision)
+            for route, priority, wall, area, vision in sorted(
+                restored_queue.values(), key=lambda entry: entry[2]
+            )
+        )
+
+        self._seq = last
+        self.drones, self.queue = drones, queue
+        drones.journal = queue.journal = self
+        # compact the log into the snapshot, which also starts it again with nothing torn in it
+        self._write_snapshot(self._snapshot())
+
+    def _snapshot(self) -> bytes:
+        """Serialise the whole state as of now."""
+        drones, queue = self.drones, self.queue
+        if drones is None or queue is None:
+            raise RuntimeError(
+                "there's nothing to snapshot until the journal has recovered"
+            )
+        # the records making up a snapshot have no sequence number of their own
+        records = [_record(SNAPSHOT, self._seq)]
+        ids = list(drones)
+        if ids:
+            rows = np.fromiter(
+                (drones.row(id) for id in ids), dtype=np.intp, count=len(ids)
+            )
+            records.append(_record(DRONES, 0, _pack_drones(drones, ids, rows)))
+        now_wall, now = time.time(), time.monotonic()
+        for queued in queue:
+            wall = now_wall - (now - queued.enqueued)
+            records.append(_record(QUEUED, 0, _pack_queued(queued, wall)))
+        # everything buffered so far is part of the snapshot now
+        self._buffer.clear()
+        return b"".join(records)
+
+    def _write_snapshot(self, data: bytes) -> None:
+        """Atomically replace the snapshot, then start the log again."""
+        with self._lock:
+            temporary = self.snapshot_path + ".tmp"
+            with open(temporary, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporary, self.snapshot_path)
+            self._fsync_directory()
+
+            if self._log is not None:
+                self._log.close()
+            # anything in the old log is already in the snapshot, and would be skipped on
+            # replay anyway, so a crash before this truncation is harmless
+            self._log = open(self.log_path, "wb")
+            self._log_size = 0
+
+    def _fsync_directory(self) -> None:
+        if os.name != "posix":
+            return
+        fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _write(self, data: bytes) -> None:
+        with self._lock:
+            if self._log is None:
+                # closed while this waited, and the final snapshot already has it all
+                return
+            self._log.write(data)
+            self._log.flush()
+            os.fsync(self._log.fileno())
+            self._log_size += len(data)
+
+    def flush(self) -> None:
+        """Write out and fsync everything buffered so far, blocking until it's done."""
+        if self._buffer and self._log is not None:
+            data = bytes(self._buffer)
+            self._buffer.clear()
+            self._write(data)
+
+    async def run(self) -> None:
+        """Flush the log every `flush_interval` seconds, snapshotting when it gets too big.
+
+        The writing and fsyncing happens on a thread, so the event loop carries on meanwhile.
+        """
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            if self._log_size >= self.snapshot_bytes:
+                await asyncio.to_thread(self._write_snapshot, self._snapshot())
+            elif self._buffer:
+                data = bytes(self._buffer)
+                self._buffer.clear()
+                await asyncio.to_thread(self._write, data)
+
+    def close(self) -> None:
+        """Snapshot the final state and stop journalling."""
+        if self._log is None:
+            return
+        self._write_snapshot(self._snapshot())
+        with self._lock:
+            self._log.close()
+            self._log = None
+        # only ever has a log once it's recovered into these
+        if self.drones is not None and self.queue is not None:
+            self.drones.journal = self.queue.journal = None
@@ -0,0 +1,114 @@
+from typing import Hashable, Iterable, Optional, Tuple
+import math
+import time
+
+
+class LivenessTracker:
+    """Deadlines for drones to report in by, on a timer wheel.
+
+    Time is split into ticks `resolution` seconds long, and every drone sits in the slot of the
+    tick its deadline falls in. Hearing from a drone moves it to a later slot, which is O(1),
+    and expiring only visits the slots that have come due, so its cost depends on how many
+    drones expired rather than on how many there are.
+    Slots are kept by absolute tick in a dict, rather than in a fixed ring, so deadlines any
+    distance away fit without wrapping around or cascading between wheels.
+
+    A drone that hasn't been heard from for `stale_after` seconds is stale, and one that
+    hasn't been heard from for `evict_after` seconds is dead; each is reported once. Deadlines
+    are rounded up to a whole tick, so drones expire up to `resolution` seconds late, but never
+    early.
+    """
+
+    def __init__(self, stale_after: float, evict_after: float, resolution: float = 1.0):
+        if not 0 < stale_after <= evict_after:
+            raise ValueError("drones must go stale before they're evicted")
+        self.stale_after = stale_after
+        self.evict_after = evict_after
+        self.resolution = resolution
+        self._slots: dict[int, set[Hashable]] = dict()
+        # the tick each drone is due at, and whether it's already stale
+        self._due: dict[Hashable, Tuple[int, bool]] = dict()
+        # the last tick that's been expired, once anything has been
+        self._expired: Optional[int] = None
+
+    def __len__(self) -> int:
+        return len(self._due)
+
+    def __contains__(self, id: Hashable) -> bool:
+        return id in self._due
+
+    def _tick(self, when: float) -> int:
+        return math.ceil(when / self.resolution)
+
+    def _schedule(self, id: Hashable, tick: int, stale: bool) -> None:
+        # never schedule into a tick that's already been expired, or it'd be missed
+        if self._expired is not None:
+            tick = max(tick, self._expired + 1)
+        entry = self._due.get(id)
+        if entry is not None and entry[0] != tick:
+            self._discard(id, entry[0])
+        self._due[id] = (tick, stale)
+        self._slots.setdefault(tick, set()).add(id)
+
+    def _discard(self, id: Hashable, tick: int) -> None:
+        slot = self._slots[tick]
+        slot.discard(id)
+        if not slot:
+            del self._slots[tick]
+
+    def touch(self, id: Hashable, now: Optional[float] = None) -> None:
+        """Record that a drone has just been heard from."""
+        now = time.monotonic() if now is None else now
+        self._schedule(id, self._tick(now + self.stale_after), False)
+
+    def touch_many(self, ids: Iterable[Hashable], now: Optional[float] = None) -> None:
+        now = time.monotonic() if now is None else now
+        tick = self._tick(now + self.stale_after)
+        for id in ids:
+            self._schedule(id, tick, False)
+
+    def forget(self, id: Hashable) -> None:
+        entry = self._due.pop(id, None)
+        if entry is not None:
+            self._discard(id, entry[0])
+
+    def _due_ticks(self, until: int) -> Iterable[int]:
+        if self._expired is None or until - self._expired > len(self._slots):
+            # fallen far behind, so it's cheaper to look at the occupied slots directly
+            return sorted(tick for tick in self._slots if tick <= until)
+        return range(self._expired + 1, until + 1)
+
+    def expire(self, now: Optional[float] = None) -> Tuple[list, list]:
+        """Find the drones that have gone stale, and those that are dead, since the last call.
+
+        Stale drones stay tracked until they're dead or heard from again; dead ones are
+        forgotten.
+        """
+        now = time.monotonic() if now is None else now
+        until = math.floor(now / self.resolution)
+        stale, dead = [], []
+        for tick in self._due_ticks(until):
+            slot = self._slots.pop(tick, None)
+            if slot is None:
+                continue
+            for id in slot:
+                if self._due[id][1]:
+                    del self._due[id]
+                    dead.append(id)
+                else:
+                    stale.append(id)
+                    # the rest of the time until it's dead, after it went stale, but at
+                    # least in a tick that's yet to be expired
+                    later = max(
+                        tick + self._tick(self.evict_after - self.stale_after),
+                        until + 1,
+                    )
+                    self._due[id] = (later, True)
+                    self._slots.setdefault(later, set()).add(id)
+        self._expired = until if self._expired is None else max(self._expired, until)
+        return stale, dead
+
+    def clear(self) -> None:
+        self._slots.clear()
+        self._due.clear()
+        self._expired = None
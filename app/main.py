@@ -1,14 +1,75 @@
+from contextlib import asynccontextmanager
+from typing import Annotated, Hashable, Iterable, Optional, Tuple, Union
+import asyncio
+import json
 import random
 import os
+import threading
+import time
 
-from fastapi import FastAPI, HTTPException
+import numpy as np
+from fastapi import FastAPI, Header, HTTPException, Response
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, PositiveFloat, TypeAdapter
 
-from .area_resolution import TargetCircle
+from .area_resolution import TargetArea, TargetCircle, TargetPolygon, route_to_latlons
+from .coverage import COVERAGE, CellArea, ClaimedCoverage
+from .drone_store import DroneData, DroneStatus, DroneStatusBatch
+from .jobs import Job, JobRegistry, JobState
+from .journal import Journal
+from .liveness import LivenessTracker
+from .photos import photo_route
+from .metrics import CONTENT_TYPE, POINTS_BUCKETS, MetricsMiddleware, Registry
+from .preview import MEDIA_TYPE as PNG, PreviewRenderer, preview_key
+from .profiling import SamplingProfiler, SlowRequest
+from .projection import FrameAnchor, LocalFrame
+from .planning import (
+    AUTO,
+    PlannedRoute,
+    RouteCost,
+    get_pool,
+    plan_route,
+    route_cost,
+    routing_methods,
+    shutdown_pool,
+)
+from .replanning import Replanner
+from .scheduler import RouteScheduler
+from .spatial import GridIndex
+from .state import MEMORY, open_backend
+from .streaming import StatusFeed
+from .route_cache import RouteCache, RouteCacheStats, route_key
 from .types import DroneId, LatLon
+from . import wire
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    tasks = []
+    if JOURNAL is not None:
+        JOURNAL.recover(DRONES, ROUTES_QUEUE)
+        for id in DRONES:
+            DRONE_INDEX.insert(id, DRONES.position(id))
+        tasks.append(asyncio.create_task(JOURNAL.run()))
+    if STATE.shared:
+        tasks.append(asyncio.create_task(follow_shared_state()))
+    # drones restored from before we started get as long as any other to report in
+    LIVENESS.touch_many(DRONES)
+    tasks.append(asyncio.create_task(expire_drones_forever()))
+    yield
+    for task in tasks:
+        task.cancel()
+    if JOURNAL is not None:
+        JOURNAL.close()
+    STATE.close()
+    PREVIEWS.shutdown()
+    PROFILER.stop()
+    shutdown_pool()
+
 
 app = FastAPI(
+    lifespan=lifespan,
     title="Drone Manager",
     summary="Middle layer between frontend systems and manufacturer drone interfaces.",
     description="""Drone Manager is a service which interfaces between abstracted frontend systems which wish to instruct drones to photograph particular areas (and get regular updates), and the systems provided by drone manufacturers to allow remote instruction of drone flight controllers.
@@ -19,11 +80,15 @@ Endpoints are provided for the frontend systems to call to instruct the fleet an
 - `GET /drone_status*`
 - `POST /drone_dispatch*`
 
+Frontends can also subscribe to `GET /drone_status/stream` to be pushed changes instead of polling.
+
 Endpoints for drone controllers are:
 
 - `POST /drone_status*`
 - `GET /next_area`
 
+Metrics are exposed for prometheus to scrape at `GET /metrics`.
+
 See respective endpoints for full documentation.
     """,
 )
@@ -39,19 +104,148 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+METRICS = Registry()
+# off until switched on with `POST /debug/profiler`
+PROFILER = SamplingProfiler()
+app.add_middleware(
+    MetricsMiddleware,
+    requests=METRICS.histogram(
+        "dm_http_request_duration_seconds",
+        "Time taken to respond to HTTP requests, by endpoint.",
+        ("method", "path", "status"),
+    ),
+    on_request=PROFILER.request_finished,
+)
+ROUTE_SECONDS = METRICS.histogram(
+    "dm_route_generation_seconds",
+    "Time taken to generate routes, by routing method.",
+    ("method",),
+)
+ROUTE_POINTS = METRICS.histogram(
+    "dm_route_points",
+    "Number of points in generated routes, by routing method.",
+    ("method",),
+    buckets=POINTS_BUCKETS,
+)
+TELEMETRY_UPDATES = METRICS.counter(
+    "dm_telemetry_updates_total", "Drone status updates received."
+)
+TELEMETRY_CHANGES = METRICS.counter(
+    "dm_telemetry_changes_total",
+    "Drone status updates received that changed a drone's status.",
+)
+
+
+DRONE_STATUSES = [status.value for status in DroneStatus]
+DRONE_VISION = float(os.environ.get("DM_DRONE_VISION_RADIUS", 10.0))
+# most lines across an area that a vision radius may split it into
+MAX_SWEEP_LINES = 10_000
 
-class DroneData(BaseModel):
-    status: str
-    battery: int
-    lastUpdate: str
-    lastSeen: LatLon
+# size of the cells (in degrees) used to spatially index drones and queued areas
+SPATIAL_CELL_SIZE = float(os.environ.get("DM_SPATIAL_CELL_SIZE", 0.01))
 
+DRONE_INDEX: GridIndex[DroneId] = GridIndex(SPATIAL_CELL_SIZE)
+STATUS_FEED = StatusFeed()
+# how often to send a comment down idle status streams, so proxies don't drop them
+STREAM_KEEPALIVE = 15.0
 
-DRONE_STATUSES = ["idle", "flying", "unknown"]
-DRONES: dict[DroneId, DroneData] = dict()
-DRONE_VISION = os.environ.get("DM_DRONE_VISION_RADIUS", 10.0)
+# where drone statuses and queued areas are kept; a shared backend lets many workers run
+STATE = open_backend(
+    os.environ.get("DM_STATE_BACKEND", MEMORY),
+    RouteScheduler(
+        aging=float(os.environ.get("DM_QUEUE_AGING", 60.0)),
+        cell_size=SPATIAL_CELL_SIZE,
+        order=os.environ.get("DM_QUEUE_ORDER", "priority"),
+        tour_budget=float(os.environ.get("DM_TOUR_BUDGET", 0.01)),
+    ),
+    path=os.environ.get("DM_STATE_DB", ""),
+    poll_interval=float(os.environ.get("DM_STATE_POLL_INTERVAL", 0.05)),
+)
+DRONES = STATE.drones
+ROUTES_QUEUE = STATE.queue
+# what's assigned to drones and flown is only known to each worker, so with several workers
+# (which all hear from different drones) dropping out can't be told apart from going elsewhere
+REPLANNING = not STATE.shared
+# upper bound on how long a drone can long-poll `GET /next_area` for
+MAX_NEXT_AREA_WAIT = 30.0
+# how far (in metres) routes handed out with photo points may be simplified from what was planned
+SIMPLIFY_TOLERANCE = float(os.environ.get("DM_SIMPLIFY_TOLERANCE", 1.0))
+JOBS = JobRegistry()
+# whether to only plan routes over the parts of new areas that queued areas don't already cover
+COVERAGE_MERGE = os.environ.get("DM_COVERAGE_MERGE", "") not in ("", "0")
+if COVERAGE_MERGE and STATE.shared:
+    # each worker would only merge with the areas dispatched to it
+    raise ValueError("DM_COVERAGE_MERGE is only for the memory state backend")
+# coverage is tracked in metres, on a flat frame placed wherever the first area or drone is
+COVERAGE_ANCHOR = FrameAnchor()
+# claims on cells by queued areas lapse after this many seconds, so areas can be searched again
+PLANNED_COVERAGE = ClaimedCoverage(
+    DRONE_VISION,
+    COVERAGE_ANCHOR,
+    ttl=float(os.environ.get("DM_COVERAGE_TTL", 3600.0)),
+)
+# merged routes are planned on worker threads, one at a time so claims don't race
+PLANNED_COVERAGE_LOCK = threading.Lock()
+# what drones have actually flown over, so a drone dropping out only requeues what's left
+REPLANNER = Replanner(
+    cell_size=DRONE_VISION, vision=DRONE_VISION, anchor=COVERAGE_ANCHOR
+)
+# drones reporting less battery than this (in percent) are treated as having dropped out
+LOW_BATTERY = int(os.environ.get("DM_LOW_BATTERY", 20))
+# drones not heard from for this many seconds become `unknown`, and after this many are removed
+LIVENESS = LivenessTracker(
+    stale_after=float(os.environ.get("DM_DRONE_STALE_AFTER", 30.0)),
+    evict_after=float(os.environ.get("DM_DRONE_EVICT_AFTER", 3600.0)),
+)
+# where to keep drone statuses and queued areas so they survive restarts, if anywhere
+STATE_DIR = os.environ.get("DM_STATE_DIR")
+if STATE_DIR and STATE.shared:
+    raise ValueError("DM_STATE_DIR is only for the memory state backend")
+JOURNAL = (
+    Journal(
+        STATE_DIR,
+        flush_interval=float(os.environ.get("DM_STATE_FLUSH_INTERVAL", 0.05)),
+        snapshot_bytes=int(os.environ.get("DM_STATE_SNAPSHOT_BYTES", 8 << 20)),
+    )
+    if STATE_DIR
+    else None
+)
+ROUTE_CACHE = RouteCache(
+    max_entries=int(os.environ.get("DM_ROUTE_CACHE_ENTRIES", 256)),
+    max_points=int(os.environ.get("DM_ROUTE_CACHE_POINTS", 2_000_000)),
+)
+PREVIEWS = PreviewRenderer(
+    max_bytes=int(os.environ.get("DM_PREVIEW_CACHE_BYTES", 32 << 20))
+)
 
-ROUTES_QUEUE: list[list[LatLon]] = []
+
+async def _write_state(write, *args, **kwargs):
+    """Make a write to the state backend.
+
+    Writes to a shared backend can wait on other workers', so they're made on a worker thread
+    to keep the event loop free.
+    """
+    if STATE.shared:
+        return await asyncio.to_thread(write, *args, **kwargs)
+    return write(*args, **kwargs)
+
+
+def _oldest_queued_age() -> float:
+    oldest = ROUTES_QUEUE.oldest()
+    return time.monotonic() - oldest.enqueued if oldest is not None else 0.0
+
+
+METRICS.gauge("dm_drones", "Number of drones with a known status.", lambda: len(DRONES))
+METRICS.gauge(
+    "dm_queue_depth",
+    "Number of areas waiting to be searched.",
+    lambda: len(ROUTES_QUEUE),
+)
+METRICS.gauge(
+    "dm_queue_oldest_age_seconds",
+    "How long the area that's been waiting longest has waited.",
+    _oldest_queued_age,
+)
 
 
 @app.get("/", summary="Hello world sanity check.")
@@ -59,13 +253,124 @@ async def hello_world():
     return {"response": "Hello World"}
 
 
+# drones by id, with `None` for ones that have been removed
+DroneStatuses = dict[DroneId, Optional[DroneData]]
+STATUSES = TypeAdapter(DroneStatuses)
+
+
 @app.get(
     "/drone_status",
     summary="Get all known information about all drones in the field.",
-    description="Intended for frontend usage.",
+    description="""The response's `ETag` is the current status version; send it back as `If-None-Match` to get a `304 Not Modified` if nothing has changed.
+Pass a previously seen version as `since` to only get the drones that have changed after it, with `null` for those that have been removed.
+Removals are only remembered for so long, so if `since` is too old, every drone is returned instead, with the `X-Status-Snapshot` header set.
+Intended for frontend usage.""",
+    response_model=None,
+    responses={
+        200: {
+            "model": DroneStatuses,
+            "description": "The drones, or just those that have changed since `since`.",
+        },
+        304: {"description": "No drones have changed."},
+    },
+)
+async def get_drone_status(
+    since: Optional[int] = None,
+    if_none_match: Annotated[Optional[str], Header()] = None,
+) -> Response:
+    etag = f'"{STATUS_FEED.version}"'
+    headers = {"ETag": etag}
+    if if_none_match == etag:
+        return Response(status_code=304, headers=headers)
+
+    changed = None if since is None else STATUS_FEED.changed_since(since)
+    drones: DroneStatuses
+    if changed is None:
+        if since is not None:
+            headers["X-Status-Snapshot"] = "1"
+        drones = dict(DRONES.items())
+    else:
+        drones = {id: DRONES[id] if id in DRONES else None for id in changed}
+    return Response(
+        content=STATUSES.dump_json(drones),
+        media_type="application/json",
+        headers=headers,
+    )
+
+
+def _status_event(event: str, ids: Iterable[DroneId]) -> str:
+    data = {
+        id: DRONES[id].model_dump(mode="json") if id in DRONES else None for id in ids
+    }
+    return f"event: {event}\nid: {STATUS_FEED.version}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.get(
+    "/drone_status/stream",
+    summary="Stream updates to the status of drones, as server-sent events.",
+    description="""Starts with a `snapshot` event of every drone, then sends `delta` events containing only the drones that have changed (`null` for drones that have been removed).
+Each event's id is the status version, so a reconnecting client's `Last-Event-ID` resumes from a delta instead of a full snapshot, unless it's too old to know every drone removed since.
+Intended for frontend usage.""",
+    response_class=StreamingResponse,
+)
+async def stream_drone_status(
+    last_event_id: Annotated[Optional[str], Header()] = None,
+) -> StreamingResponse:
+    async def events():
+        subscription = STATUS_FEED.subscribe()
+        try:
+            changed = None
+            if last_event_id is not None and last_event_id.isdigit():
+                changed = STATUS_FEED.changed_since(int(last_event_id))
+            if changed is not None:
+                yield _status_event("delta", changed)
+            else:
+                yield _status_event("snapshot", DRONES)
+            while True:
+                try:
+                    changed = await asyncio.wait_for(
+                        subscription.next(), STREAM_KEEPALIVE
+                    )
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield _status_event("delta", changed)
+        finally:
+            STATUS_FEED.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"}
+    )
+
+
+@app.get(
+    "/drone_status/nearby",
+    summary="Get all known information about the drones within a radius of a point.",
+    description="""`radius` is in metres, the same as the radius of circular areas.
+Intended for frontend usage.""",
 )
-async def get_drone_status() -> dict[DroneId, DroneData]:
-    return DRONES
+async def get_drones_nearby(
+    lat: float, lon: float, radius: float
+) -> dict[DroneId, DroneData]:
+    circle = TargetCircle(lat=lat, lon=lon, radius=radius)
+    ids = DRONE_INDEX.in_bbox(*circle.bounds())
+    positions = np.array([DRONE_INDEX.position(id) for id in ids]).reshape(-1, 2)
+    inside = circle.contains(positions[:, 0], positions[:, 1])
+    return {id: DRONES[id] for id, keep in zip(ids, inside) if keep}
+
+
+@app.get(
+    "/drone_status/bbox",
+    summary="Get all known information about the drones within a lat/lon bounding box.",
+    description="Intended for frontend usage, eg. for the drones in a map viewport.",
+)
+async def get_drones_in_bbox(
+    min_lat: float, min_lon: float, max_lat: float, max_lon: float
+) -> dict[DroneId, DroneData]:
+    return {
+        id: DRONES[id]
+        for id in DRONE_INDEX.in_bbox((min_lat, min_lon), (max_lat, max_lon))
+    }
 
 
 @app.get(
@@ -80,15 +385,501 @@ async def get_individual_drone(id: DroneId) -> DroneData:
         raise HTTPException(status_code=404, detail="no drone with that id")
 
 
+def _check_vision(target: TargetArea, vision: float) -> None:
+    """Reject vision radii too small for the area, which would make for enormous routes."""
+    frame = LocalFrame(*target.centre())
+    (min_north, min_east), (max_north, max_east) = target.in_frame(frame).bounds()
+    if max(max_north - min_north, max_east - min_east) > vision * MAX_SWEEP_LINES:
+        raise HTTPException(
+            status_code=422,
+            detail=f"vision_radius must be at least 1/{MAX_SWEEP_LINES} of the area's width",
+        )
+
+
+def _check_in_range(target: TargetArea) -> None:
+    """Reject areas to merge that are too far away for the coverage grid to be accurate over."""
+    if COVERAGE_MERGE and not PLANNED_COVERAGE.in_range(target):
+        raise HTTPException(
+            status_code=422,
+            detail=f"area must be within {COVERAGE_ANCHOR.max_distance:g}m of where"
+            " coverage is tracked from",
+        )
+
+
+def _check_method(target: TargetArea, method: str) -> None:
+    methods = routing_methods(target)
+    if method not in methods:
+        raise HTTPException(
+            status_code=422, detail=f"method must be one of {', '.join(methods)}"
+        )
+
+
+async def _completed(planned: PlannedRoute) -> PlannedRoute:
+    return planned
+
+
+def _record_planned(planned: PlannedRoute) -> PlannedRoute:
+    ROUTE_SECONDS.observe(planned.seconds, planned.method)
+    ROUTE_POINTS.observe(planned.cost.points, planned.method)
+    return planned
+
+
+def _plan_merged(target: TargetArea) -> Tuple[PlannedRoute, CellArea]:
+    """Plan a route over just the parts of `target` that queued areas don't already cover.
+
+    Also returns the cells the route covers, which stay claimed until they lapse or are
+    released. Meant to be run on a worker thread, off the event loop.
+    """
+    start = time.perf_counter()
+    with PLANNED_COVERAGE_LOCK:
+        uncovered = PLANNED_COVERAGE.claim(target)
+    route = PLANNED_COVERAGE.route_cells(*uncovered)
+    planned = PlannedRoute(
+        route=route,
+        method=COVERAGE,
+        cost=route_cost(route),
+        candidates=dict(),
+        seconds=time.perf_counter() - start,
+    )
+    return _record_planned(planned), uncovered
+
+
+def _release_coverage(uncovered: CellArea) -> None:
+    with PLANNED_COVERAGE_LOCK:
+        PLANNED_COVERAGE.release(uncovered)
+
+
+def _finish_job(
+    job: Job, target: TargetArea, planned: PlannedRoute, seconds: float
+) -> None:
+    job.set_planned(target, planned.route)
+    job.state = JobState.done
+    job.method = planned.method
+    job.cost = planned.cost
+    job.seconds = seconds
+
+
+async def _plan_uncached(
+    key: Hashable, target: TargetArea, vision: float, method: str
+) -> PlannedRoute:
+    """Plan a route on the planning pool, and cache it."""
+    loop = asyncio.get_running_loop()
+    planned = await loop.run_in_executor(get_pool(), plan_route, target, vision, method)
+    return ROUTE_CACHE.put(key, _record_planned(planned))
+
+
+async def _dispatch(
+    target: TargetArea, vision_radius: float, priority: int, method: str
+) -> Job:
+    """Plan a route for `target` in the background, queueing it once it's ready."""
+    _check_vision(target, vision_radius)
+    _check_method(target, method)
+    _check_in_range(target)
+    job = JOBS.new()
+
+    if COVERAGE_MERGE:
+
+        async def plan_merged():
+            planned, uncovered = await asyncio.to_thread(_plan_merged, target)
+            try:
+                if len(planned.route):
+                    ROUTES_QUEUE.push(planned.route, priority, area=uncovered)
+            except Exception:
+                # nothing was queued over them, so let other areas have them
+                _release_coverage(uncovered)
+                raise
+            _finish_job(job, target, planned, planned.seconds)
+
+        JOBS.start(job, plan_merged())
+        return job
+
+    key = route_key(target, vision_radius, method)
+    planned = ROUTE_CACHE.get(key)
+    if planned is not None:
+        await _write_state(
+            ROUTES_QUEUE.push, planned.route, priority, target, vision_radius
+        )
+        _finish_job(job, target, planned, 0.0)
+        JOBS.finish(job)
+        return job
+
+    async def plan():
+        planned = await _plan_uncached(key, target, vision_radius, method)
+        await _write_state(
+            ROUTES_QUEUE.push, planned.route, priority, target, vision_radius
+        )
+        _finish_job(job, target, planned, planned.seconds)
+
+    JOBS.start(job, plan())
+    return job
+
+
 @app.post(
     "/drone_dispatch/circle",
+    status_code=202,
     summary="Add a circular area to the queue for drones to search.",
-    description="Intended for frontend usage.",
+    description="""The route is planned in the background, and only added to the queue once it's ready.
+Returns a job handle that can be checked with `GET /jobs/{id}`, which will include the cost of the route once it's planned.
+
+By default (`method=auto`) the shortest of the available routing methods is used; see `POST /plan/circle` to compare them.
+If the service is configured to merge overlapping areas, the route instead only covers the parts of the area that queued areas don't already, using the service's vision radius.
+Intended for frontend usage.""",
 )
 async def drone_dispatch_circle(
-    target: TargetCircle, vision_radius: float = DRONE_VISION
+    target: TargetCircle,
+    vision_radius: PositiveFloat = DRONE_VISION,
+    priority: int = 0,
+    method: str = AUTO,
+) -> Job:
+    return await _dispatch(target, vision_radius, priority, method)
+
+
+@app.post(
+    "/drone_dispatch/polygon",
+    status_code=202,
+    summary="Add a polygonal area, optionally with holes, to the queue for drones to search.",
+    description="""Vertices are lat/lon pairs, and each ring is implicitly closed; the holes are left out of the search.
+The polygon is split into cells that can each be swept back and forth, and is swept along whichever of its longest sides needs the fewest turns (`method=boustrophedon`, the only method for polygons).
+
+Otherwise behaves the same as `POST /drone_dispatch/circle`.
+Intended for frontend usage.""",
+)
+async def drone_dispatch_polygon(
+    target: TargetPolygon,
+    vision_radius: PositiveFloat = DRONE_VISION,
+    priority: int = 0,
+    method: str = AUTO,
+) -> Job:
+    return await _dispatch(target, vision_radius, priority, method)
+
+
+@app.get(
+    "/jobs/{id}",
+    summary="Get the state of a background route planning job, given its id.",
+    description="""Jobs are only known to the worker that the area was dispatched to, so when running several workers, this must be asked of the same one (eg. with sticky sessions).
+Intended for frontend usage.""",
+)
+async def get_job(id: str) -> Job:
+    job = JOBS.get(id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="no job with that id")
+    return job
+
+
+@app.get(
+    "/routes/{id}/preview.png",
+    summary="Get a picture of a dispatched area and the route planned over it.",
+    description="""`id` is the id of the job that planned the route, as returned when the area was dispatched.
+The area's outline and the route are drawn in metres around the area's centre.
+Previews are rendered in the background, and cached, so repeat requests are quick; once cached, the route is only kept as the picture, so it's gone if that's evicted from the cache.
+Like `GET /jobs/{id}`, this must be asked of the worker that the area was dispatched to.
+Intended for frontend usage.""",
+    response_class=Response,
+    responses={
+        200: {"content": {PNG: {}}},
+        404: {"description": "No route has been planned with that id."},
+        410: {"description": "The preview was rendered, but is no longer cached."},
+    },
+)
+async def get_route_preview(id: str) -> Response:
+    job = JOBS.get(id)
+    if job is not None and job.planned is not None:
+        key = preview_key(*job.planned)
+        png = await PREVIEWS.render(*job.planned)
+        if key in PREVIEWS:
+            job.set_preview(key)
+    elif job is not None and job.preview is not None:
+        cached = PREVIEWS.cached(job.preview)
+        if cached is None:
+            raise HTTPException(
+                status_code=410, detail="the preview of that route is no longer cached"
+            )
+        png = cached
+    else:
+        raise HTTPException(status_code=404, detail="no planned route with that id")
+    return Response(content=png, media_type=PNG)
+
+
+class RoutePlan(BaseModel):
+    method: str
+    cost: RouteCost
+    candidates: dict[str, RouteCost]
+    route: list[LatLon]
+
+
+@app.post(
+    "/plan/circle",
+    summary="Plan the route for a circular area, without queueing it.",
+    description="""Returns the route along with its length, number of turns and number of points.
+With `method=auto`, the same costs for every routing method that was considered are also returned.
+Intended for frontend usage.""",
+)
+async def plan_circle(
+    target: TargetCircle,
+    vision_radius: PositiveFloat = DRONE_VISION,
+    method: str = AUTO,
+) -> RoutePlan:
+    _check_vision(target, vision_radius)
+    _check_method(target, method)
+    key = route_key(target, vision_radius, method)
+    planned = ROUTE_CACHE.get(key)
+    if planned is None:
+        planned = await _plan_uncached(key, target, vision_radius, method)
+    return RoutePlan(
+        method=planned.method,
+        cost=planned.cost,
+        candidates=planned.candidates,
+        route=route_to_latlons(planned.route),
+    )
+
+
+class BatchDispatch(BaseModel):
+    areas: list[Union[TargetCircle, TargetPolygon]]
+
+
+class AreaTiming(BaseModel):
+    method: str
+    cost: RouteCost
+    seconds: float
+    cached: bool
+
+
+class BatchDispatchResult(BaseModel):
+    areas: list[AreaTiming]
+    seconds: float
+
+
+@app.post(
+    "/drone_dispatch/batch",
+    summary="Add many areas to the queue for drones to search, in one go.",
+    description="""Routes for the areas are generated in parallel, and are only added to the queue once all of them are ready.
+Per-area timings and route costs are returned in the same order as the areas were given.
+If the service is configured to merge overlapping areas, each area's route only covers what queued areas (including those earlier in the batch) don't already.
+Intended for frontend usage.""",
+)
+async def drone_dispatch_batch(
+    batch: BatchDispatch,
+    vision_radius: PositiveFloat = DRONE_VISION,
+    priority: int = 0,
+    method: str = AUTO,
+) -> BatchDispatchResult:
+    start = time.perf_counter()
+    for target in batch.areas:
+        _check_vision(target, vision_radius)
+        _check_method(target, method)
+        _check_in_range(target)
+
+    if COVERAGE_MERGE:
+        return await _dispatch_batch_merged(batch, priority, start)
+
+    keys = [route_key(target, vision_radius, method) for target in batch.areas]
+    cached = [ROUTE_CACHE.get(key) for key in keys]
+    planned: list[PlannedRoute] = await asyncio.gather(
+        *(
+            (
+                _plan_uncached(key, target, vision_radius, method)
+                if hit is None
+                else _completed(hit)
+            )
+            for key, target, hit in zip(keys, batch.areas, cached)
+        )
+    )
+
+    # queued in one go, so the whole batch is queued atomically
+    await _write_state(
+        ROUTES_QUEUE.extend,
+        [p.route for p in planned],
+        priority,
+        areas=batch.areas,
+        vision=vision_radius,
+    )
+    return BatchDispatchResult(
+        areas=[
+            AreaTiming(
+                method=p.method,
+                cost=p.cost,
+                seconds=0.0 if hit is not None else p.seconds,
+                cached=hit is not None,
+            )
+            for p, hit in zip(planned, cached)
+        ],
+        seconds=time.perf_counter() - start,
+    )
+
+
+async def _dispatch_batch_merged(
+    batch: BatchDispatch, priority: int, start: float
+) -> BatchDispatchResult:
+    """Plan and queue a batch with merged coverage, so later areas also merge with earlier ones."""
+    merged: list[Tuple[PlannedRoute, CellArea]] = []
+    try:
+        for target in batch.areas:
+            merged.append(await asyncio.to_thread(_plan_merged, target))
+        ROUTES_QUEUE.extend(
+            (planned.route for planned, _ in merged if len(planned.route)),
+            priority,
+            areas=[uncovered for planned, uncovered in merged if len(planned.route)],
+        )
+    except BaseException as error:
+        for _, uncovered in merged:
+            _release_coverage(uncovered)
+        if isinstance(error, ValueError):
+            # the first area placed the grid, too far from a later one
+            raise HTTPException(status_code=422, detail=str(error)) from error
+        raise
+    return BatchDispatchResult(
+        areas=[
+            AreaTiming(
+                method=planned.method,
+                cost=planned.cost,
+                seconds=planned.seconds,
+                cached=False,
+            )
+            for planned, _ in merged
+        ],
+        seconds=time.perf_counter() - start,
+    )
+
+
+@app.get(
+    "/route_cache",
+    summary="Get hit/miss counters and usage of the generated route cache.",
+    description="Intended for diagnostic usage.",
+)
+async def get_route_cache_stats() -> RouteCacheStats:
+    return ROUTE_CACHE.stats()
+
+
+def _dropped_out(id: DroneId) -> bool:
+    drone = DRONES[id]
+    return drone.status == DroneStatus.unknown or drone.battery < LOW_BATTERY
+
+
+def replan_dropouts(ids: Iterable[DroneId]) -> int:
+    """Requeue the unflown parts of the areas of any of the drones that have dropped out.
+
+    Returns how many routes were requeued.
+    """
+    requeued = 0
+    for id in ids:
+        if id not in REPLANNER or not _dropped_out(id):
+            continue
+        remainder = REPLANNER.drop(id)
+        if remainder is not None:
+            route, area, priority, vision = remainder
+            ROUTES_QUEUE.push(route, priority, area, vision)
+            requeued += 1
+    return requeued
+
+
+def _drone_changed(
+    id: DroneId, position: Optional[LatLon], version: Optional[int] = None
 ) -> None:
-    ROUTES_QUEUE.append(target.search_area(vision_radius))
+    """Keep the spatial index and status feed up to date with a drone that changed."""
+    if position is None:
+        DRONE_INDEX.remove(id)
+    else:
+        DRONE_INDEX.insert(id, position)
+    STATUS_FEED.publish(id, version, removed=position is None)
+
+
+async def follow_shared_state() -> None:
+    """Pick up changes to drones from every worker sharing the state backend, as they happen.
+
+    Changes are published to this worker's status feed at the shared backend's versions, so
+    the versions that clients see mean the same thing whichever worker they ask.
+    """
+    version = 0
+    while True:
+        purged = DRONES.purged()
+        latest, changed = DRONES.changed_since(version)
+        for id, position, changed_at in changed:
+            _drone_changed(id, position, changed_at)
+            # drones can report to any worker, so any change counts as hearing from them;
+            # that includes being marked `unknown`, which just puts off removing them a while
+            if position is not None:
+                LIVENESS.touch(id)
+        if version < purged:
+            # fallen far enough behind that some removals are gone, so look for them
+            for id in set(DRONE_INDEX) - set(DRONES):
+                _drone_changed(id, None, latest)
+        version = max(latest, purged)
+        await asyncio.sleep(STATE.poll_interval)
+
+
+async def ingest_drone_statuses(batch: DroneStatusBatch) -> list[DroneId]:
+    """Store status updates for many drones, keeping the spatial index and status feed up to date.
+
+    With a shared state backend, those are instead kept up to date by `follow_shared_state`,
+    for changes from every worker alike.
+    Reported positions of drones searching an area mark it as flown, and any drones that have
+    dropped out have the rest of their areas requeued (with a single worker).
+    Returns the ids of the drones that actually changed.
+    """
+    changed = await _write_state(DRONES.put_batch, batch)
+    LIVENESS.touch_many(batch.ids)
+    TELEMETRY_UPDATES.inc(amount=len(batch.ids))
+    TELEMETRY_CHANGES.inc(amount=len(changed))
+    if not STATE.shared:
+        for id in changed:
+            _drone_changed(id, DRONES.position(id))
+    if REPLANNING:
+        REPLANNER.observe(batch.ids, batch.lat, batch.lon)
+        replan_dropouts(changed)
+    return changed
+
+
+def _expire_in_state(
+    silent: dict[DroneId, DroneData], dead: list[DroneId]
+) -> Tuple[list[DroneId], list[DroneId]]:
+    changed = DRONES.put_batch(DroneStatusBatch.of(silent)) if silent else []
+    removed = [id for id in dead if id in DRONES]
+    for id in removed:
+        DRONES.remove(id)
+    return changed, removed
+
+
+async def expire_drones(
+    now: Optional[float] = None,
+) -> Tuple[list[DroneId], list[DroneId]]:
+    """Mark drones that have gone silent as `unknown`, and remove those silent for long enough.
+
+    Drones marked `unknown` have dropped out, so the rest of their areas are requeued (with a
+    single worker).
+    Returns the ids of the drones marked `unknown`, and of those removed.
+    """
+    stale, dead = LIVENESS.expire(now)
+    silent = {
+        id: DRONES[id].model_copy(update={"status": DroneStatus.unknown})
+        for id in stale
+        if id in DRONES
+    }
+    changed, removed = await _write_state(_expire_in_state, silent, dead)
+    if not STATE.shared:
+        for id in changed:
+            _drone_changed(id, DRONES.position(id))
+        for id in removed:
+            _drone_changed(id, None)
+    if REPLANNING:
+        replan_dropouts(changed)
+    return changed, removed
+
+
+async def expire_drones_forever() -> None:
+    while True:
+        await asyncio.sleep(LIVENESS.resolution)
+        await expire_drones()
+
+
+@app.post(
+    "/drone_status/batch",
+    summary="Update the known status of many drones at once.",
+    description="""Takes one list per field, with the nth entry of each being the nth drone's.
+This updates the internal cache of this service, and will be served with the `GET /drone_status` endpoints.
+Intended for backend usage.""",
+)
+async def update_drone_status_batch(batch: DroneStatusBatch) -> None:
+    await ingest_drone_statuses(batch)
     return
 
 
@@ -99,7 +890,7 @@ async def drone_dispatch_circle(
 Intended for backend usage.""",
 )
 async def update_drone_status(id: DroneId, drone: DroneData) -> None:
-    DRONES[id] = drone
+    await ingest_drone_statuses(DroneStatusBatch.of({id: drone}))
     return
 
 
@@ -109,7 +900,123 @@ async def update_drone_status(id: DroneId, drone: DroneData) -> None:
     "/next_area",
     summary="Retrieve the next sequence of points in the queue for a drone to photograph.",
     description="""**NOTE**: this sequence of points is the *minimal* routing path.
-The drone **must** self-instruct on when photographs are taken, eg. whenever it's out of range of the last photo taken, instead of just taking one at each node.""",
+The drone **must** self-instruct on when photographs are taken, eg. whenever it's out of range of the last photo taken, instead of just taking one at each node.
+Alternatively, pass `photos=true` to be told where to take them: the route is simplified (staying within `tolerance` metres of the planned one), and returned along with points spaced the vision radius it was dispatched with apart along it, starting at its start and ending at its end.
+
+Areas are handed out highest priority first, oldest first within a priority (or, if the service is configured to, in the order that minimises the transit between them, which may reverse them).
+If `drone_id` is given and that drone's position is known, it's instead given whichever queued area starts closest to it.
+Drones that give their `drone_id` have the area they're given tracked, so that if they drop out (their status becomes `unknown`, or their battery runs low) the part of it they didn't get to is queued again; this is only done when running a single worker.
+If the queue is empty, responds with `204 No Content`; pass `wait` to long-poll for up to that many seconds for an area to be queued instead.
+
+The route is JSON by default, but can be requested in a more compact form with the `Accept` header:
+
+- `application/x-route-f64`: packed little-endian float64 (lat, lon) pairs
+- `application/x-route-f32`: packed little-endian float32 (lat, lon) pairs
+- `application/x-route-polyline`: an encoded polyline, at 5 decimal places
+
+With `photos=true`, the JSON response is instead an object with `route` and `photos` lists, the packed encodings have the photo points straight after the route's, and the polyline encoding is one polyline for each separated by a newline.
+The number of points in each is given by the `X-Route-Points` and `X-Photo-Points` headers.""",
+    response_model=None,
+    responses={
+        200: {
+            "model": list[LatLon],
+            "description": "The route, as (lat, lon) points.",
+            "content": {
+                media_type: {}
+                for media_type in wire.MEDIA_TYPES
+                if media_type != wire.JSON
+            },
+        },
+        204: {"description": "No areas are waiting to be searched."},
+    },
+)
+async def get_next_drone_area(
+    wait: float = 0.0,
+    drone_id: Optional[DroneId] = None,
+    photos: bool = False,
+    tolerance: float = SIMPLIFY_TOLERANCE,
+    accept: Annotated[Optional[str], Header()] = None,
+) -> Response:
+    queued = await ROUTES_QUEUE.pop_wait(
+        min(max(wait, 0.0), MAX_NEXT_AREA_WAIT),
+        near=DRONES.position(drone_id) if drone_id is not None else None,
+    )
+    if queued is None:
+        return Response(status_code=204)
+    if REPLANNING and drone_id is not None and queued.area is not None:
+        REPLANNER.assign(drone_id, queued.area, queued.priority, queued.vision)
+    media_type = wire.negotiate(accept)
+    if photos:
+        # routes queued without one (like merged ones) use the service's own
+        vision = DRONE_VISION if queued.vision is None else queued.vision
+        route, triggers = photo_route(queued.route, vision, tolerance)
+        return Response(
+            content=wire.encode_photo_route(route, triggers, media_type),
+            media_type=media_type,
+            headers={
+                "X-Route-Points": str(len(route)),
+                "X-Photo-Points": str(len(triggers)),
+            },
+        )
+    return Response(
+        content=wire.encode_route(queued.route, media_type),
+        media_type=media_type,
+        headers={"X-Route-Points": str(len(queued.route))},
+    )
+
+
+@app.get(
+    "/metrics",
+    summary="Get metrics about the service, in the prometheus text format.",
+    description="Intended for monitoring usage.",
+    response_class=Response,
+    responses={200: {"content": {CONTENT_TYPE: {}}}},
+)
+async def get_metrics() -> Response:
+    return Response(content=METRICS.render(), media_type=CONTENT_TYPE)
+
+
+class ProfilerSettings(BaseModel):
+    enabled: bool
+    # seconds between samples of the event loop's stack
+    interval: PositiveFloat = 0.005
+    # requests taking at least this many seconds have their samples kept
+    slow: PositiveFloat = 0.5
+
+
+class ProfilerReport(ProfilerSettings):
+    slow_requests: list[SlowRequest]
+
+
+def _profiler_report() -> ProfilerReport:
+    return ProfilerReport(
+        enabled=PROFILER.running,
+        interval=PROFILER.interval,
+        slow=PROFILER.slow,
+        slow_requests=list(PROFILER.slow_requests),
+    )
+
+
+@app.get(
+    "/debug/profiler",
+    summary="Get the sampling profiler's settings, and the stacks sampled during slow requests.",
+    description="Intended for diagnostic usage.",
+)
+async def get_profiler() -> ProfilerReport:
+    return _profiler_report()
+
+
+@app.post(
+    "/debug/profiler",
+    summary="Switch the sampling profiler on or off.",
+    description="""While on, the event loop's stack is sampled every `interval` seconds, and the samples taken during requests taking longer than `slow` seconds are kept for `GET /debug/profiler`.
+Intended for diagnostic usage.""",
 )
-async def get_next_drone_area() -> list[LatLon]:
-    return ROUTES_QUEUE.pop()
+async def set_profiler(settings: ProfilerSettings) -> ProfilerReport:
+    PROFILER.stop()
+    PROFILER.interval = settings.interval
+    PROFILER.slow = settings.slow
+    if settings.enabled:
+        # sample this thread, since it's the one running the event loop
+        PROFILER.start()
+    return _profiler_report()
@@ -0,0 +1,241 @@
+from bisect import bisect_left
+from typing import Callable, Iterator, Optional, Sequence, Tuple, TypeVar
+import time
+
+# prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# upper bounds (in seconds) of the buckets for timings, from well under a millisecond up
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+POINTS_BUCKETS = (10, 100, 1_000, 10_000, 100_000, 1_000_000)
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        """Each (name, formatted labels, value) to expose."""
+        return iter(())
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(
+            f"{name}{labels} {_format_value(value)}"
+            for name, labels, value in self.samples()
+        )
+        return "\n".join(lines)
+
+
+# whichever kind of metric is being registered
+M = TypeVar("M", bound=Metric)
+
+
+class Counter(Metric):
+    """Running total, per combination of label values."""
+
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: dict[Labels, float] = dict()
+        self.clear()
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def clear(self) -> None:
+        self._values.clear()
+        if not self.labels:
+            # there's only one series, so it might as well show up from the start
+            self._values[()] = 0
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        for labels, value in self._values.items():
+            yield self.name, _format_labels(self.labels, labels), value
+
+
+class Gauge(Metric):
+    """Value that's read from the rest of the service whenever metrics are collected.
+
+    Nothing is tracked in between, so it costs nothing until it's scraped.
+    """
+
+    type = "gauge"
+
+    def __init__(self, name: str, help: str, read: Callable[[], float]):
+        super().__init__(name, help)
+        self.read = read
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        yield self.name, "", self.read()
+
+
+class Histogram(Metric):
+    """Counts of observations falling into buckets, per combination of label values."""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        # non-cumulative counts per bucket (with one more for +Inf), and the sum
+        self._series: dict[Labels, Tuple[list[int], list[float]]] = dict()
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+        counts, total = series
+        counts[bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return sum(series[0]) if series is not None else 0
+
+    def clear(self) -> None:
+        self._series.clear()
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        names = (*self.labels, "le")
+        for labels, (counts, total) in self._series.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                yield (
+                    f"{self.name}_bucket",
+                    _format_labels(names, (*labels, _format_value(bound))),
+                    cumulative,
+                )
+            formatted = _format_labels(self.labels, labels)
+            yield f"{self.name}_sum", formatted, total[0]
+            yield f"{self.name}_count", formatted, cumulative
+
+
+class Registry:
+    """Collection of metrics, rendered together in the prometheus text format."""
+
+    def __init__(self):
+        self._metrics: dict[str, Metric] = dict()
+
+    def register(self, metric: M) -> M:
+        if metric.name in self._metrics:
+            raise ValueError(f"metric {metric.name!r} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, read: Callable[[], float]) -> Gauge:
+        return self.register(Gauge(name, help, read))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def clear(self) -> None:
+        """Reset every counter and histogram."""
+        for metric in self._metrics.values():
+            if isinstance(metric, (Counter, Histogram)):
+                metric.clear()
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request into a histogram.
+
+    Requests are labelled with the path template of the endpoint they matched (or
+    `unmatched`), rather than the raw path, so ids in paths don't make new series.
+    `on_request` is also called with each request's path, start time and duration.
+    """
+
+    def __init__(
+        self,
+        app,
+        requests: Histogram,
+        on_request: Optional[Callable[[str, float, float], None]] = None,
+    ):
+        self.app = app
+        self.requests = requests
+        self.on_request = on_request
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            seconds = time.perf_counter() - start
+            # the router leaves the route it matched in the scope
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            self.requests.observe(seconds, scope["method"], path, str(status))
+            if self.on_request is not None:
+                self.on_request(path, start, seconds)
@@ -0,0 +1,85 @@
+from typing import Tuple
+
+import numpy as np
+
+from .projection import LocalFrame
+from .types import Route
+
+
+def simplify(route: Route, tolerance: float) -> Route:
+    """Drop the points of a route that it never strays more than `tolerance` from without.
+
+    This is Douglas-Peucker: the point furthest from the segment joining two kept points is
+    kept if it's further than `tolerance` from it, and both halves are then simplified the
+    same way. Distances are to the segment rather than the line through it, so routes that
+    double back on themselves keep their turns.
+    The distances for each segment are found in one vectorized pass over its points.
+    """
+    if len(route) < 3 or tolerance <= 0:
+        return route
+
+    keep = np.zeros(len(route), dtype=np.bool_)
+    keep[[0, -1]] = True
+    stack = [(0, len(route) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        start, end = route[first], route[last]
+        between = route[first + 1 : last]
+        segment = end - start
+        length_sq = segment @ segment
+        if length_sq > 0:
+            along = np.clip((between - start) @ segment / length_sq, 0.0, 1.0)
+            offsets = between - (start + along[:, None] * segment)
+        else:
+            offsets = between - start
+        distances = np.hypot(offsets[:, 0], offsets[:, 1])
+        furthest = int(np.argmax(distances))
+        if distances[furthest] > tolerance:
+            split = first + 1 + furthest
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+    return route[keep]
+
+
+def trigger_points(route: Route, spacing: float) -> Route:
+    """Points every `spacing` along a route, starting at its start and ending at its end.
+
+    Found in one pass over the cumulative length of the route: each distance to take a photo at
+    is located in it, and interpolated along the segment it falls in.
+    """
+    if len(route) < 2:
+        return route.copy()
+    lengths = np.hypot(*np.diff(route, axis=0).T)
+    cumulative = np.concatenate(([0.0], np.cumsum(lengths)))
+    total = cumulative[-1]
+    if total == 0 or spacing <= 0:
+        return route[:1].copy()
+
+    distances = np.arange(0.0, total, spacing)
+    # there's always one at the very end, unless the last spaced one is nearly there anyway
+    if total - distances[-1] > spacing * 1e-6:
+        distances = np.append(distances, total)
+    segment = np.clip(
+        np.searchsorted(cumulative, distances, side="right") - 1, 0, len(lengths) - 1
+    )
+    with np.errstate(invalid="ignore", divide="ignore"):
+        fraction = (distances - cumulative[segment]) / lengths[segment]
+    # zero length segments are never landed in part way, so can be treated as their start
+    fraction = np.nan_to_num(fraction, nan=0.0, posinf=0.0)
+    return route[segment] + fraction[:, None] * (route[segment + 1] - route[segment])
+
+
+def photo_route(route: Route, spacing: float, tolerance: float) -> Tuple[Route, Route]:
+    """Simplify a lat/lon route, and find where along it to take photos.
+
+    `spacing` and `tolerance` are in metres. Returns the simplified route, and the points to
+    take photos at, both as lat/lon.
+    """
+    if len(route) == 0:
+        return route, route
+    frame = LocalFrame(route[0, 0], route[0, 1])
+    local = simplify(frame.to_local(route), tolerance)
+    return frame.to_latlon(local), frame.to_latlon(trigger_points(local, spacing))
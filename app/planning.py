@@ -0,0 +1,133 @@
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import NamedTuple, Optional
+import os
+import time
+
+import numpy as np
+from pydantic import BaseModel
+
+from .area_resolution import TargetArea
+from .projection import LocalFrame
+from .types import Route
+
+PLANNING_WORKERS = int(os.environ.get("DM_PLANNING_WORKERS", os.cpu_count() or 1))
+
+# let the planner pick whichever method gives the cheapest route
+AUTO = "auto"
+# a back and forth sweep, in whichever direction needs the fewest turns
+BOUSTROPHEDON = "boustrophedon"
+
+# heading changes smaller than this (in radians) don't count as turns
+TURN_TOLERANCE = 1e-6
+
+_pool: Optional[Executor] = None
+
+
+def get_pool() -> Executor:
+    """Get the shared pool that routes are generated on, starting it on first use."""
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=PLANNING_WORKERS)
+    return _pool
+
+
+def shutdown_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
+
+
+class RouteCost(BaseModel):
+    """How expensive a route is to fly."""
+
+    length: float
+    turns: int
+    points: int
+
+
+class PlannedRoute(NamedTuple):
+    route: Route
+    method: str
+    cost: RouteCost
+    # costs of every method that was considered, when the method was picked automatically
+    candidates: dict[str, RouteCost]
+    seconds: float
+
+
+def route_cost(route: Route) -> RouteCost:
+    """Total length and number of turns of a route."""
+    legs = np.diff(route, axis=0)
+    lengths = np.hypot(legs[:, 0], legs[:, 1])
+
+    # ignore zero length legs, since they don't have a heading
+    headings = np.arctan2(legs[lengths > 0, 1], legs[lengths > 0, 0])
+    # wrap heading changes into [-pi, pi)
+    changes = (np.diff(headings) + np.pi) % (2 * np.pi) - np.pi
+    return RouteCost(
+        length=float(lengths.sum()),
+        turns=int(np.count_nonzero(np.fabs(changes) > TURN_TOLERANCE)),
+        points=len(route),
+    )
+
+
+def routing_methods(target: TargetArea) -> list[str]:
+    """Names of the methods that can be used to route `target`."""
+    return [AUTO, *target.routing_methods, BOUSTROPHEDON]
+
+
+def boustrophedon(target: TargetArea, vision: float) -> Route:
+    """Sweep `target` in whichever of its candidate directions needs the fewest turns."""
+    best: Optional[Route] = None
+    best_cost: Optional[tuple] = None
+    for angle in target.sweep_angles():
+        route = target.sweep_route(vision, angle)
+        cost = route_cost(route)
+        if best_cost is None or (cost.turns, cost.length) < best_cost:
+            best, best_cost = route, (cost.turns, cost.length)
+    return best if best is not None else np.empty((0, 2))
+
+
+def _route_by(target: TargetArea, vision: float, method: str) -> Route:
+    if method == BOUSTROPHEDON:
+        return boustrophedon(target, vision)
+    if method not in target.routing_methods:
+        raise ValueError(f"unknown routing method {method!r}")
+    return getattr(target, method + "_array")(vision)
+
+
+def plan_route(target: TargetArea, vision: float, method: str = AUTO) -> PlannedRoute:
+    """Generate the route for `target`, along with its cost and how long it took in seconds.
+
+    The area is planned in a local frame around its centre, so `vision` (and any distances the
+    area has, like a circle's radius) are in metres, as is the route's cost.
+    With `method` as `AUTO`, every routing method is tried and the shortest route is used.
+    This runs inside the planning pool, so it must stay a picklable module-level function.
+    """
+    start = time.perf_counter()
+    frame = LocalFrame(*target.centre())
+    target = target.in_frame(frame)
+
+    if method != AUTO:
+        route = _route_by(target, vision, method)
+        cost = route_cost(route)
+        candidates = dict()
+    else:
+        routes = {
+            name: _route_by(target, vision, name)
+            for name in routing_methods(target)[1:]
+        }
+        candidates = {name: route_cost(route) for name, route in routes.items()}
+        method = min(
+            candidates,
+            key=lambda name: (candidates[name].length, candidates[name].turns),
+        )
+        route, cost = routes[method], candidates[method]
+
+    return PlannedRoute(
+        route=frame.to_latlon(route),
+        method=method,
+        cost=cost,
+        candidates=candidates,
+        seconds=time.perf_counter() - start,
+    )
@@ -0,0 +1,135 @@
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Optional
+import asyncio
+import hashlib
+import io
+import os
+
+from .area_resolution import TargetArea
+from .projection import LocalFrame
+from .types import Route
+
+MEDIA_TYPE = "image/png"
+PREVIEW_WORKERS = int(os.environ.get("DM_PREVIEW_WORKERS", 1))
+
+# size of previews, in pixels across and down
+SIZE = 640
+DPI = 100
+
+
+def preview_key(target: TargetArea, route: Route) -> str:
+    """Hash of everything that goes into a preview, so identical ones share a cache entry."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(type(target).__name__.encode())
+    digest.update(target.model_dump_json().encode())
+    digest.update(route.astype("<f8", copy=False).tobytes())
+    return digest.hexdigest()
+
+
+def render_preview(target: TargetArea, route: Route) -> bytes:
+    """Draw an area's outline, and the route over it, as a PNG.
+
+    Both are drawn in metres east and north of the area's centre, so they aren't stretched.
+    matplotlib is only imported here, so only processes that actually draw anything pay for
+    importing it; and only its object oriented API is used, so there's no global figure state.
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    frame = LocalFrame(*target.centre())
+    figure = Figure(figsize=(SIZE / DPI, SIZE / DPI), dpi=DPI)
+    FigureCanvasAgg(figure)
+    axes = figure.add_subplot()
+    # rows are (north, east), and east goes along the x axis
+    for ring in target.in_frame(frame).outline():
+        axes.plot(ring[:, 1], ring[:, 0], color="black", linewidth=1.5)
+    path = frame.to_local(route)
+    axes.plot(path[:, 1], path[:, 0], color="tab:blue", linewidth=0.8)
+    if len(path):
+        axes.plot(path[0, 1], path[0, 0], "o", color="tab:green", label="start")
+        axes.plot(path[-1, 1], path[-1, 0], "s", color="tab:red", label="end")
+        axes.legend(loc="upper right")
+    axes.set_aspect("equal")
+    axes.set_xlabel("east (m)")
+    axes.set_ylabel("north (m)")
+    figure.tight_layout()
+
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format="png")
+    return buffer.getvalue()
+
+
+class PreviewRenderer:
+    """Renders route previews on a pool of worker processes, caching the results.
+
+    The pool is only started when the first preview is asked for.
+    Rendered previews are kept, least recently used first out, up to `max_bytes` in total.
+    Concurrent requests for the same preview share a single render.
+    """
+
+    def __init__(self, workers: int = PREVIEW_WORKERS, max_bytes: int = 32 << 20):
+        self.workers = workers
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._bytes = 0
+        self._cache: OrderedDict[str, bytes] = OrderedDict()
+        self._rendering: dict[str, asyncio.Future] = dict()
+        self._pool: Optional[Executor] = None
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._cache
+
+    def cached(self, key: str) -> Optional[bytes]:
+        """Get a preview by its key, if it's still cached."""
+        png = self._cache.get(key)
+        if png is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+        return png
+
+    def _put(self, key: str, png: bytes) -> None:
+        if len(png) > self.max_bytes:
+            return
+        self._cache[key] = png
+        self._bytes += len(png)
+        while self._bytes > self.max_bytes:
+            _, evicted = self._cache.popitem(last=False)
+            self._bytes -= len(evicted)
+
+    async def render(self, target: TargetArea, route: Route) -> bytes:
+        """Get the preview of a route over an area, rendering it if it isn't cached."""
+        key = preview_key(target, route)
+        png = self.cached(key)
+        if png is not None:
+            return png
+        self.misses += 1
+
+        rendering = self._rendering.get(key)
+        if rendering is None:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            loop = asyncio.get_running_loop()
+            rendering = loop.run_in_executor(self._pool, render_preview, target, route)
+            self._rendering[key] = rendering
+            rendering.add_done_callback(lambda done: self._rendered(key, done))
+        # a client giving up mustn't cancel the render for everyone else waiting on it
+        return await asyncio.shield(rendering)
+
+    def _rendered(self, key: str, done: asyncio.Future) -> None:
+        del self._rendering[key]
+        if not done.cancelled() and done.exception() is None:
+            self._put(key, done.result())
+
+    def clear(self) -> None:
+        self._cache.clear()
+        self._bytes = 0
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,104 @@
+from collections import Counter, deque
+from types import CodeType, FrameType
+from typing import Optional, Tuple
+import sys
+import threading
+import time
+
+from pydantic import BaseModel
+
+# deepest stack to record, from the innermost frame out
+MAX_DEPTH = 64
+
+
+class SlowRequest(BaseModel):
+    path: str
+    seconds: float
+    # how many samples were taken in each stack, as `outermost;...;innermost` frames
+    stacks: dict[str, int]
+
+
+def _stack(frame: Optional[FrameType]) -> tuple:
+    """Cheap record of a stack, as (code, line) pairs; only rendered when needed."""
+    stack: list[Tuple[CodeType, int]] = []
+    while frame is not None and len(stack) < MAX_DEPTH:
+        stack.append((frame.f_code, frame.f_lineno))
+        frame = frame.f_back
+    return tuple(reversed(stack))
+
+
+def _render(stack: tuple) -> str:
+    return ";".join(
+        f"{code.co_name} ({code.co_filename}:{line})" for code, line in stack
+    )
+
+
+class SamplingProfiler:
+    """Samples the stack of one thread on a background thread, to see what slow requests did.
+
+    While running, the target thread's stack is recorded every `interval` seconds into a
+    short rolling window. When a request that took longer than `slow` seconds finishes, the
+    samples taken while it was running are kept (up to the last `keep` such requests).
+    Requests served concurrently on the same event loop share samples, so a slow request's
+    stacks can include time spent on others.
+    It's off by default, and costs nothing until started.
+    """
+
+    def __init__(self, interval: float = 0.005, slow: float = 0.5, keep: int = 32):
+        self.interval = interval
+        self.slow = slow
+        self.slow_requests: deque[SlowRequest] = deque(maxlen=keep)
+        self._samples: deque[tuple[float, tuple]] = deque()
+        self._target: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self, target: Optional[int] = None) -> None:
+        """Start sampling `target` (a thread ident), by default the calling thread."""
+        self.stop()
+        self._target = target if target is not None else threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run,
+            args=(self._target,),
+            name="sampling-profiler",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self._samples.clear()
+
+    def _run(self, target: int) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(target)
+            now = time.perf_counter()
+            self._samples.append((now, _stack(frame)))
+            # only keep samples as far back as the slowest request anyone would wait for
+            while self._samples and self._samples[0][0] < now - max(self.slow, 1) * 10:
+                self._samples.popleft()
+
+    def request_finished(self, path: str, start: float, seconds: float) -> None:
+        """Keep the samples taken during a request, if it was slow."""
+        if not self.running or seconds < self.slow:
+            return
+        end = start + seconds
+        stacks = Counter(
+            stack for when, stack in list(self._samples) if start <= when <= end
+        )
+        self.slow_requests.append(
+            SlowRequest(
+                path=path,
+                seconds=seconds,
+                stacks={_render(stack): count for stack, count in stacks.items()},
+            )
+        )
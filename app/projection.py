@@ -0,0 +1,90 @@
+from typing import Optional
+import math
+
+import numpy as np
+
+from .types import Route
+
+# mean radius of the earth, in metres
+EARTH_RADIUS = 6_371_008.8
+METRES_PER_DEGREE = EARTH_RADIUS * math.pi / 180
+# stops longitudes blowing up right at the poles
+MIN_COS_LAT = 1e-6
+# furthest (in metres) from where an anchor was placed that its frame is still used
+MAX_ANCHOR_DISTANCE = 50_000.0
+
+
+def wrap_longitude(lons: np.ndarray) -> np.ndarray:
+    """Wrap longitudes (or differences between them) into [-180, 180)."""
+    return (lons + 180.0) % 360.0 - 180.0
+
+
+class LocalFrame:
+    """Flat east/north frame in metres, tangent to the earth at an origin.
+
+    Points keep the (lat, lon) column order as (north, east), so the planar routing code works
+    the same on either. The scale of each axis is worked out once, up front, so converting a
+    whole route either way is a single multiply and add.
+    It's accurate to well under a percent within a few tens of kilometres of the origin.
+    """
+
+    def __init__(self, lat: float, lon: float):
+        self.origin = np.array([lat, lon], dtype=np.float64)
+        self.scale = np.array(
+            [
+                METRES_PER_DEGREE,
+                METRES_PER_DEGREE * max(math.cos(math.radians(lat)), MIN_COS_LAT),
+            ]
+        )
+
+    def to_local(self, points: np.ndarray) -> Route:
+        """Convert (n, 2) lat/lon points into (north, east) metres from the origin."""
+        offsets = np.asarray(points, dtype=np.float64) - self.origin
+        offsets[..., 1] = wrap_longitude(offsets[..., 1])
+        return offsets * self.scale
+
+    def to_latlon(self, points: np.ndarray) -> Route:
+        """Convert (n, 2) (north, east) points in metres back into lat/lon."""
+        latlons = np.asarray(points, dtype=np.float64) / self.scale + self.origin
+        latlons[..., 1] = wrap_longitude(latlons[..., 1])
+        return latlons
+
+
+class FrameAnchor:
+    """A `LocalFrame` that's only placed once it's first needed, wherever that is.
+
+    Everything sharing an anchor agrees on the frame, so flat grids in it line up.
+    Since the frame is only accurate near where it was placed, points more than `max_distance`
+    metres from there are out of its range, and shouldn't be put in it.
+    """
+
+    def __init__(self, max_distance: float = MAX_ANCHOR_DISTANCE):
+        self.max_distance = max_distance
+        self.frame: Optional[LocalFrame] = None
+
+    def at(self, lat: float, lon: float) -> LocalFrame:
+        """The frame, placing it at `lat`, `lon` if it hasn't been placed yet.
+
+        Raises ValueError if it has been placed, too far away for the point to be in range.
+        """
+        if self.frame is None:
+            self.frame = LocalFrame(lat, lon)
+        elif not self.in_range(np.array([lat]), np.array([lon]))[0]:
+            raise ValueError(
+                f"({lat}, {lon}) is over {self.max_distance:g}m from where the frame was"
+                " anchored"
+            )
+        return self.frame
+
+    def in_range(self, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+        """Vectorized test of which points are in range (all of them, until it's placed)."""
+        lats, lons = np.broadcast_arrays(
+            np.asarray(lats, dtype=np.float64), np.asarray(lons, dtype=np.float64)
+        )
+        if self.frame is None:
+            return np.ones(lats.shape, dtype=np.bool_)
+        local = self.frame.to_local(np.stack((lats, lons), axis=-1))
+        return np.hypot(local[..., 0], local[..., 1]) <= self.max_distance
+
+    def clear(self) -> None:
+        self.frame = None
@@ -0,0 +1,116 @@
+from typing import NamedTuple, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from .area_resolution import TargetArea
+from .coverage import CellArea, CoverageGrid
+from .projection import FrameAnchor
+from .types import DroneId, Route
+
+
+class Assignment(NamedTuple):
+    area: CellArea
+    priority: int
+    # which cells of the area have been flown since it was assigned
+    flown: np.ndarray
+    # vision radius the drone's route was planned with, if it's known
+    vision: Optional[float]
+
+
+class Replanner:
+    """Tracks what drones have actually flown over, to requeue what's left when one drops out.
+
+    Each reported position of a drone with an area assigned marks the cells of its area within
+    the vision radius as flown. Those are only kept while the area is assigned, and are gone
+    once the drone finishes it, is sent somewhere else, or drops out.
+    A drone that drops out mid-route has its assigned area's unflown cells turned straight
+    into a new route, rather than planning the whole original area again.
+    Areas given as cells must be from a grid with the same cell size and anchor.
+    """
+
+    def __init__(
+        self, cell_size: float, vision: float, anchor: Optional[FrameAnchor] = None
+    ):
+        self.vision = vision
+        # never has anything marked, just lays areas and positions out in cells
+        self.grid = CoverageGrid(cell_size, anchor)
+        self._assignments: dict[DroneId, Assignment] = dict()
+
+    def __len__(self) -> int:
+        return len(self._assignments)
+
+    def __contains__(self, id: object) -> bool:
+        return id in self._assignments
+
+    def clear(self) -> None:
+        self._assignments.clear()
+
+    def assign(
+        self,
+        id: DroneId,
+        area: Union[TargetArea, CellArea],
+        priority: int = 0,
+        vision: Optional[float] = None,
+    ) -> None:
+        """Record that a drone has been sent to search `area`, replacing what it had before.
+
+        Areas out of range of the grid's anchor can't be tracked, so just unassign the drone.
+        """
+        if not isinstance(area, CellArea):
+            if not self.grid.in_range(area):
+                self._assignments.pop(id, None)
+                return
+            area = CellArea(*self.grid.rasterize(area))
+        flown = np.zeros(area.mask.shape, dtype=np.bool_)
+        self._assignments[id] = Assignment(area, priority, flown, vision)
+
+    def observe(
+        self, ids: Sequence[DroneId], lats: Sequence[float], lons: Sequence[float]
+    ) -> None:
+        """Mark the parts of their areas seen from each drone's position as flown.
+
+        Drones without an area assigned are ignored. Drones that have now flown all of their
+        areas have finished them, so are unassigned.
+        """
+        assigned = [n for n, id in enumerate(ids) if id in self._assignments]
+        if not assigned:
+            return
+        points, rows, cols = self.grid.cells_near(
+            np.asarray(lats, dtype=np.float64)[assigned],
+            np.asarray(lons, dtype=np.float64)[assigned],
+            self.vision,
+        )
+        # cells near each drone's position(s), in the order the drones were assigned above
+        bounds = np.searchsorted(points, np.arange(len(assigned) + 1))
+        for n, start, end in zip(assigned, bounds[:-1], bounds[1:]):
+            id = ids[n]
+            assignment = self._assignments.get(id)
+            if assignment is None:
+                # already finished, from an earlier position in the same batch
+                continue
+            area, _, flown, _ = assignment
+            i = rows[start:end] - area.origin[0]
+            j = cols[start:end] - area.origin[1]
+            inside = (i >= 0) & (i < flown.shape[0]) & (j >= 0) & (j < flown.shape[1])
+            flown[i[inside], j[inside]] = True
+            if not (area.mask & ~flown).any():
+                del self._assignments[id]
+
+    def drop(
+        self, id: DroneId
+    ) -> Optional[Tuple[Route, CellArea, int, Optional[float]]]:
+        """Unassign a drone, returning a route over the part of its area not flown yet.
+
+        The route comes with the part of the area it covers, and the priority and vision
+        radius the area was assigned with.
+
+        Returns None if the drone had nothing assigned, or it's all been flown.
+        """
+        assignment = self._assignments.pop(id, None)
+        if assignment is None:
+            return None
+        area, priority, flown, vision = assignment
+        remainder = CellArea(area.origin, area.mask & ~flown)
+        if not remainder.mask.any():
+            return None
+        return self.grid.route_cells(*remainder), remainder, priority, vision
@@ -0,0 +1,124 @@
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+import threading
+
+from pydantic import BaseModel
+
+from .area_resolution import TargetArea
+from .planning import AUTO, PlannedRoute, plan_route
+
+# number of decimal places that coordinates, radii and vision are rounded to
+# when building cache keys, so near-identical areas share a route
+KEY_PRECISION = 6
+
+
+def _normalize(value: Any) -> Hashable:
+    """Turn a (possibly nested) model field into something hashable and rounded."""
+    if isinstance(value, float):
+        # `+ 0.0` folds -0.0 into 0.0
+        return round(value, KEY_PRECISION) + 0.0
+    if isinstance(value, (list, tuple)):
+        return tuple(_normalize(v) for v in value)
+    if isinstance(value, dict):
+        return tuple((k, _normalize(v)) for k, v in sorted(value.items()))
+    return value
+
+
+def route_key(target: TargetArea, vision: float, method: str) -> Hashable:
+    """Build the cache key for a route: (shape, *geometry, vision, method)."""
+    return (
+        type(target).__name__,
+        _normalize(target.model_dump()),
+        _normalize(float(vision)),
+        method,
+    )
+
+
+class RouteCacheStats(BaseModel):
+    hits: int
+    misses: int
+    evictions: int
+    entries: int
+    points: int
+    max_entries: int
+    max_points: int
+
+
+class RouteCache:
+    """Bounded LRU cache of planned routes.
+
+    Routes are evicted least recently used first, whenever either the number of cached routes
+    or the total number of points across them goes over its limit.
+    Cached routes are shared between callers, so they are made read-only.
+    """
+
+    def __init__(self, max_entries: int = 256, max_points: int = 2_000_000):
+        self.max_entries = max_entries
+        self.max_points = max_points
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._points = 0
+        self._routes: OrderedDict[Hashable, PlannedRoute] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._routes)
+
+    def get(self, key: Hashable) -> Optional[PlannedRoute]:
+        """Get a cached route, counting the hit or miss."""
+        with self._lock:
+            route = self._routes.get(key)
+            if route is None:
+                self.misses += 1
+                return None
+            self._routes.move_to_end(key)
+            self.hits += 1
+            return route
+
+    def put(self, key: Hashable, planned: PlannedRoute) -> PlannedRoute:
+        """Cache a route, making it read-only since it'll be shared."""
+        planned.route.setflags(write=False)
+        with self._lock:
+            old = self._routes.pop(key, None)
+            if old is not None:
+                self._points -= len(old.route)
+            # don't bother caching a route that would evict everything else
+            if len(planned.route) > self.max_points:
+                return planned
+            self._routes[key] = planned
+            self._points += len(planned.route)
+            self._evict()
+        return planned
+
+    def _evict(self) -> None:
+        while len(self._routes) > self.max_entries or self._points > self.max_points:
+            _, planned = self._routes.popitem(last=False)
+            self._points -= len(planned.route)
+            self.evictions += 1
+
+    def route(
+        self, target: TargetArea, vision: float, method: str = AUTO
+    ) -> PlannedRoute:
+        """Get the route for `target` using the given routing method, planning it on a miss."""
+        key = route_key(target, vision, method)
+        planned = self.get(key)
+        if planned is None:
+            planned = self.put(key, plan_route(target, vision, method))
+        return planned
+
+    def clear(self) -> None:
+        with self._lock:
+            self._routes.clear()
+            self._points = 0
+
+    def stats(self) -> RouteCacheStats:
+        return RouteCacheStats(
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+            entries=len(self._routes),
+            points=self._points,
+            max_entries=self.max_entries,
+            max_points=self.max_points,
+        )
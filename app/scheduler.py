@@ -0,0 +1,293 @@
+from typing import TYPE_CHECKING, Any, Iterable, Iterator, Optional
+import asyncio
+import heapq
+import itertools
+import time
+
+from .spatial import GridIndex
+from .tour import TourPlanner
+from .types import LatLon, Route
+
+if TYPE_CHECKING:
+    from .journal import Journal
+
+# orders that routes can be handed out in, when a drone doesn't ask for the closest one
+PRIORITY = "priority"
+TOUR = "tour"
+
+
+class QueuedRoute:
+    """A route waiting in the scheduler for a drone to pick it up."""
+
+    __slots__ = (
+        "id",
+        "route",
+        "priority",
+        "enqueued",
+        "key",
+        "removed",
+        "area",
+        "vision",
+    )
+
+    def __init__(
+        self,
+        id: int,
+        route: Route,
+        priority: int,
+        enqueued: float,
+        key,
+        area: Any,
+        vision: Optional[float] = None,
+    ):
+        self.id = id
+        self.route = route
+        self.priority = priority
+        self.enqueued = enqueued
+        self.key = key
+        self.removed = False
+        # whatever the route was planned to cover, for callers that want it later
+        self.area = area
+        # vision radius the route was planned with, if it's known
+        self.vision = vision
+
+    def start(self) -> LatLon:
+        return self.route[0, 0], self.route[0, 1]
+
+    def end(self) -> LatLon:
+        return self.route[-1, 0], self.route[-1, 1]
+
+    def __lt__(self, other: "QueuedRoute") -> bool:
+        return self.key < other.key
+
+
+class RouteScheduler:
+    """Priority queue of routes waiting to be flown.
+
+    Higher priorities are handed out first, and routes of the same priority are handed out in
+    the order they were queued.
+    Waiting routes age so they don't starve: every `aging` seconds spent in the queue is worth
+    one priority level.
+    Since every route ages at the same rate, this is the same as ordering by enqueue time
+    brought forward by `priority * aging`, so the heap never needs re-keying.
+
+    The start points of waiting routes are also kept in a spatial index, so a drone can instead
+    be handed whichever route starts closest to it.
+    Routes taken that way are only marked as removed in the heap, and skipped when they reach
+    the top of it.
+
+    With `order` as `TOUR`, routes are instead handed out in the order (and direction) that
+    minimises the transit between them, ignoring priority.
+    The tour is improved for up to `tour_budget` seconds whenever routes are added.
+
+    If `journal` is set, it's told about every route that's queued or taken out of the queue.
+    """
+
+    def __init__(
+        self,
+        aging: float = 60.0,
+        cell_size: float = 0.01,
+        order: str = PRIORITY,
+        tour_budget: float = 0.01,
+    ):
+        if order not in (PRIORITY, TOUR):
+            raise ValueError(f"unknown queue order {order!r}")
+        self.aging = aging
+        self.order = order
+        self.tour_budget = tour_budget
+        self._tour: TourPlanner[int] = TourPlanner()
+        self._heap: list[QueuedRoute] = []
+        self._live: dict[int, QueuedRoute] = dict()
+        self._starts: GridIndex[int] = GridIndex(cell_size)
+        self._ids = itertools.count()
+        self._waiters: list[asyncio.Future] = []
+        self.journal: Optional["Journal"] = None
+
+    def __len__(self) -> int:
+        return len(self._live)
+
+    def __iter__(self) -> Iterator[QueuedRoute]:
+        """Every waiting route, oldest first."""
+        # ids go up as routes are queued, and dicts keep insertion order
+        return iter(self._live.values())
+
+    def push(
+        self,
+        route: Route,
+        priority: int = 0,
+        area: Any = None,
+        vision: Optional[float] = None,
+    ) -> QueuedRoute:
+        """Queue a route, waking up one drone that's waiting for one."""
+        queued = self._push(route, priority, area, vision)
+        if self.order == TOUR and len(route):
+            self._tour.add(
+                queued.id, queued.start(), queued.end(), budget=self.tour_budget
+            )
+        self._wake()
+        return queued
+
+    def _push(
+        self,
+        route: Route,
+        priority: int,
+        area: Any,
+        vision: Optional[float],
+        enqueued: Optional[float] = None,
+    ) -> QueuedRoute:
+        now = time.monotonic() if enqueued is None else enqueued
+        id = next(self._ids)
+        queued = QueuedRoute(
+            id=id,
+            route=route,
+            priority=priority,
+            enqueued=now,
+            # tie-break on the id, so equal keys stay first in first out
+            key=(now - priority * self.aging, id),
+            area=area,
+            vision=vision,
+        )
+        heapq.heappush(self._heap, queued)
+        self._live[id] = queued
+        if len(route):
+            self._starts.insert(id, queued.start())
+        if self.journal is not None:
+            self.journal.route_queued(queued)
+        return queued
+
+    def restore(
+        self, routes: Iterable[tuple[Route, int, float, Any, Optional[float]]]
+    ) -> None:
+        """Queue routes that were already waiting.
+
+        Routes are given as (route, priority, seconds waited, area, vision).
+
+        They keep their place in the queue, as long as they're given oldest first.
+        """
+        now = time.monotonic()
+        for route, priority, waited, area, vision in routes:
+            queued = self._push(route, priority, area, vision, enqueued=now - waited)
+            if self.order == TOUR and len(route):
+                self._tour.add(queued.id, queued.start(), queued.end())
+        if self.order == TOUR:
+            self._tour.rebuild(self.tour_budget)
+        self._wake()
+
+    def extend(
+        self,
+        routes: Iterable[Route],
+        priority: int = 0,
+        areas: Optional[Iterable[Any]] = None,
+        vision: Optional[float] = None,
+    ) -> list[QueuedRoute]:
+        """Queue many routes at once, optimising the tour once for all of them."""
+        routes = list(routes)
+        areas = [None] * len(routes) if areas is None else areas
+        queued = [
+            self._push(route, priority, area, vision)
+            for route, area in zip(routes, areas)
+        ]
+        if self.order == TOUR:
+            added = [q for q in queued if len(q.route)]
+            if len(added) > len(self._tour):
+                # mostly new routes, so it's worth starting the tour again
+                for q in added:
+                    self._tour.add(q.id, q.start(), q.end())
+                self._tour.rebuild(self.tour_budget)
+            else:
+                for q in added:
+                    self._tour.add(q.id, q.start(), q.end())
+                self._tour.improve(self.tour_budget)
+        for _ in queued:
+            self._wake()
+        return queued
+
+    def _drop_removed(self) -> None:
+        while self._heap and self._heap[0].removed:
+            heapq.heappop(self._heap)
+
+    def peek(self) -> Optional[QueuedRoute]:
+        self._drop_removed()
+        return self._heap[0] if self._heap else None
+
+    def oldest(self) -> Optional[QueuedRoute]:
+        """The route that's been waiting the longest."""
+        return next(iter(self), None)
+
+    def remove(self, queued: QueuedRoute) -> None:
+        """Take a specific route out of the queue."""
+        if self._live.pop(queued.id, None) is None:
+            return
+        queued.removed = True
+        if self.journal is not None:
+            self.journal.route_removed(queued)
+        self._starts.remove(queued.id)
+        self._tour.remove(queued.id)
+        self._drop_removed()
+        # don't let routes taken out of the middle of the heap pile up
+        if len(self._heap) > 2 * len(self._live) + 64:
+            self._heap = [queued for queued in self._heap if not queued.removed]
+            heapq.heapify(self._heap)
+
+    def pop(self, near: Optional[LatLon] = None) -> Optional[QueuedRoute]:
+        """Take the next route to be flown, or None if there isn't one.
+
+        If `near` is given, take the route that starts closest to it instead.
+        """
+        if near is not None:
+            id = self._starts.nearest(near)
+            if id is not None:
+                queued = self._live[id]
+                self.remove(queued)
+                return queued
+
+        head = self._tour.head() if self.order == TOUR else None
+        if head is not None:
+            id, flipped = head
+            queued = self._live[id]
+            self.remove(queued)
+            if flipped:
+                queued.route = queued.route[::-1]
+            return queued
+
+        top = self.peek()
+        if top is not None:
+            self.remove(top)
+        return top
+
+    async def pop_wait(
+        self, timeout: float, near: Optional[LatLon] = None
+    ) -> Optional[QueuedRoute]:
+        """Take the next route to be flown, waiting up to `timeout` seconds for one to be queued."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            queued = self.pop(near)
+            remaining = deadline - loop.time()
+            if queued is not None or remaining <= 0:
+                return queued
+
+            waiter = loop.create_future()
+            self._waiters.append(waiter)
+            try:
+                await asyncio.wait_for(waiter, remaining)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+
+    def _wake(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.pop(0)
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+
+    def clear(self) -> None:
+        if self.journal is not None:
+            self.journal.queue_cleared()
+        self._heap.clear()
+        self._live.clear()
+        self._starts.clear()
+        self._tour.clear()
@@ -0,0 +1,157 @@
+from typing import Generic, Hashable, Iterable, Iterator, Optional, Tuple, TypeVar
+import math
+
+from .types import LatLon
+
+Cell = Tuple[int, int]
+Key = TypeVar("Key", bound=Hashable)
+
+
+class GridIndex(Generic[Key]):
+    """Uniform grid spatial index over lat/lon points, keyed by arbitrary ids.
+
+    Inserting, moving and removing a point are O(1).
+    Lookups only visit the cells near the query point, so their cost depends on how many points
+    are nearby rather than on how many are indexed.
+    """
+
+    def __init__(self, cell_size: float):
+        self.cell_size = cell_size
+        self._cells: dict[Cell, dict[Key, LatLon]] = dict()
+        self._positions: dict[Key, Tuple[LatLon, Cell]] = dict()
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __contains__(self, key: Key) -> bool:
+        return key in self._positions
+
+    def __iter__(self) -> Iterator[Key]:
+        return iter(self._positions)
+
+    def _cell(self, point: LatLon) -> Cell:
+        return (
+            math.floor(point[0] / self.cell_size),
+            math.floor(point[1] / self.cell_size),
+        )
+
+    def position(self, key: Key) -> Optional[LatLon]:
+        entry = self._positions.get(key)
+        return None if entry is None else entry[0]
+
+    def insert(self, key: Key, point: LatLon) -> None:
+        """Add a point to the index, or move it if it's already there."""
+        cell = self._cell(point)
+        entry = self._positions.get(key)
+        if entry is not None and entry[1] != cell:
+            self._discard(key, entry[1])
+        self._positions[key] = (point, cell)
+        self._cells.setdefault(cell, dict())[key] = point
+
+    def remove(self, key: Key) -> None:
+        entry = self._positions.pop(key, None)
+        if entry is not None:
+            self._discard(key, entry[1])
+
+    def _discard(self, key: Key, cell: Cell) -> None:
+        bucket = self._cells[cell]
+        del bucket[key]
+        if not bucket:
+            del self._cells[cell]
+
+    def clear(self) -> None:
+        self._cells.clear()
+        self._positions.clear()
+
+    def _ring(self, centre: Cell, radius: int) -> Iterator[Cell]:
+        """The cells at exactly `radius` cells (chebyshev distance) from `centre`."""
+        ci, cj = centre
+        if radius == 0:
+            yield centre
+            return
+        for j in range(cj - radius, cj + radius + 1):
+            yield ci - radius, j
+            yield ci + radius, j
+        for i in range(ci - radius + 1, ci + radius):
+            yield i, cj - radius
+            yield i, cj + radius
+
+    def nearest(self, point: LatLon) -> Optional[Key]:
+        """Find the key of the indexed point closest to `point`, or None if the index is empty."""
+        if not self._positions:
+            return None
+
+        best: Optional[Key] = None
+        best_dist = math.inf
+
+        def consider(bucket: dict[Key, LatLon]):
+            nonlocal best, best_dist
+            for key, (lat, lon) in bucket.items():
+                dist = math.hypot(lat - point[0], lon - point[1])
+                if dist < best_dist:
+                    best, best_dist = key, dist
+
+        centre = self._cell(point)
+        radius = 0
+        while True:
+            # every point we haven't looked at yet is outside the square of rings we've
+            # searched, so once we've got something closer than its edge we're done
+            if best is not None:
+                low_i, low_j = centre[0] - radius + 1, centre[1] - radius + 1
+                high_i, high_j = centre[0] + radius, centre[1] + radius
+                margin = self.cell_size * min(
+                    point[0] / self.cell_size - low_i,
+                    high_i - point[0] / self.cell_size,
+                    point[1] / self.cell_size - low_j,
+                    high_j - point[1] / self.cell_size,
+                )
+                if best_dist <= margin:
+                    return best
+            # when the rings get bigger than the occupied part of the grid,
+            # it's cheaper to look at every occupied cell directly
+            if (2 * radius + 1) ** 2 > len(self._cells):
+                for occupied in self._cells.values():
+                    consider(occupied)
+                return best
+            for cell in self._ring(centre, radius):
+                bucket = self._cells.get(cell)
+                if bucket is not None:
+                    consider(bucket)
+            radius += 1
+
+    def _buckets_between(self, low: Cell, high: Cell) -> Iterable[dict[Key, LatLon]]:
+        """The non-empty cells within an inclusive range of cells."""
+        area = (high[0] - low[0] + 1) * (high[1] - low[1] + 1)
+        if area > len(self._cells):
+            # cheaper to filter the occupied cells than to look up every cell in range
+            return (
+                bucket
+                for (i, j), bucket in self._cells.items()
+                if low[0] <= i <= high[0] and low[1] <= j <= high[1]
+            )
+        return (
+            self._cells[(i, j)]
+            for i in range(low[0], high[0] + 1)
+            for j in range(low[1], high[1] + 1)
+            if (i, j) in self._cells
+        )
+
+    def in_bbox(self, low: LatLon, high: LatLon) -> list[Key]:
+        """Find the keys of every point within a lat/lon bounding box (inclusive)."""
+        return [
+            key
+            for bucket in self._buckets_between(self._cell(low), self._cell(high))
+            for key, (lat, lon) in bucket.items()
+            if low[0] <= lat <= high[0] and low[1] <= lon <= high[1]
+        ]
+
+    def within(self, point: LatLon, radius: float) -> list[Key]:
+        """Find the keys of every point within `radius` of `point`."""
+        low = self._cell((point[0] - radius, point[1] - radius))
+        high = self._cell((point[0] + radius, point[1] + radius))
+        return [
+            key
+            for bucket in self._buckets_between(low, high)
+            for key, (lat, lon) in bucket.items()
+            if math.hypot(lat - point[0], lon - point[1]) <= radius
+        ]
@@ -0,0 +1,547 @@
+from collections.abc import ItemsView, Mapping
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Iterable, Iterator, Optional, Tuple, cast
+import asyncio
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from .drone_store import (
+    CODE_BY_STATUS,
+    STATUS_BY_CODE,
+    DroneData,
+    DroneStatusBatch,
+    DroneStore,
+    to_timestamp,
+)
+from .journal import pack_area, unpack_area
+from .scheduler import PRIORITY, QueuedRoute, RouteScheduler
+from .types import DroneId, LatLon, Route
+
+# available state backends
+MEMORY = "memory"
+SQLITE = "sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+INSERT OR IGNORE INTO meta VALUES ('version', 0);
+-- tombstones of drones removed at or before this version have been purged
+INSERT OR IGNORE INTO meta VALUES ('purged', 0);
+CREATE TABLE IF NOT EXISTS drones (
+    id TEXT PRIMARY KEY,
+    lat REAL NOT NULL,
+    lon REAL NOT NULL,
+    battery INTEGER NOT NULL,
+    status INTEGER NOT NULL,
+    last_update REAL NOT NULL,
+    -- the status version this drone last changed at
+    version INTEGER NOT NULL,
+    -- removed drones are kept as tombstones, so other workers find out they've gone
+    present INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS drones_version ON drones (version);
+CREATE TABLE IF NOT EXISTS routes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    -- enqueue time brought forward by the priority, as in `RouteScheduler`
+    key REAL NOT NULL,
+    priority INTEGER NOT NULL,
+    enqueued REAL NOT NULL,
+    start_lat REAL,
+    start_lon REAL,
+    points BLOB NOT NULL,
+    area BLOB NOT NULL,
+    -- vision radius the route was planned with, if it's known
+    vision REAL
+);
+CREATE INDEX IF NOT EXISTS routes_key ON routes (key, id);
+CREATE INDEX IF NOT EXISTS routes_start ON routes (start_lat, start_lon);
+"""
+
+ROUTE_COLUMNS = "id, priority, enqueued, points, area, vision"
+
+# half widths (in degrees) of the boxes searched for the route starting nearest a point, in turn
+NEAR_BOXES = (0.01, 0.1, 1.0, 10.0)
+
+
+class MemoryBackend:
+    """State kept in this process only: the default, for running a single worker.
+
+    Nothing is shared, so there are never changes from other workers to pick up.
+    """
+
+    shared = False
+
+    def __init__(self, queue: RouteScheduler):
+        self.drones = DroneStore()
+        self.queue = queue
+
+    def close(self) -> None:
+        pass
+
+
+class SQLiteBackend:
+    """State kept in an SQLite database, shared by every worker that opens the same file.
+
+    The database is in WAL mode, so readers never block, and writes are short transactions
+    that take the write lock up front (`BEGIN IMMEDIATE`), so they're serialised across
+    workers instead of failing part way through. Waiting for the write lock can block for up
+    to `busy_timeout` seconds, so writes shouldn't be made on the event loop.
+    Each worker should open its own backend. Writes go through a single connection, so its
+    transactions can be run from any thread, but only one at a time; reads go through a
+    connection of each thread's own, so they only see committed writes, and never wait
+    behind a transaction that's waiting for the write lock.
+    Tombstones of removed drones are purged once they're `tombstone_versions` versions old,
+    long after every worker has seen them.
+    """
+
+    shared = True
+
+    def __init__(
+        self,
+        path: str,
+        aging: float = 60.0,
+        poll_interval: float = 0.05,
+        busy_timeout: float = 5.0,
+        tombstone_versions: int = 100_000,
+    ):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self.poll_interval = poll_interval
+        self.tombstone_versions = tombstone_versions
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._readers: list[sqlite3.Connection] = []
+        self._readers_lock = threading.Lock()
+        self.db = self._connect()
+        self.db.execute("PRAGMA journal_mode = WAL")
+        # in WAL mode this still can't corrupt the database, only lose the last commits
+        self.db.execute("PRAGMA synchronous = NORMAL")
+        with self.transaction():
+            for statement in SCHEMA.split(";"):
+                if statement.strip():
+                    self.db.execute(statement)
+            # databases from before routes kept their vision radius
+            columns = [row[1] for row in self.db.execute("PRAGMA table_info(routes)")]
+            if "vision" not in columns:
+                self.db.execute("ALTER TABLE routes ADD COLUMN vision REAL")
+        self.drones = SharedDroneStore(self)
+        self.queue = SharedRouteQueue(self, aging, poll_interval)
+
+    def _connect(self) -> sqlite3.Connection:
+        # autocommit, so transactions are only ever the ones started explicitly; and usable
+        # from any thread, so it can be closed from whichever thread closes the backend
+        return sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+
+    def reader(self) -> sqlite3.Connection:
+        """This thread's connection for reading with, outside of transactions."""
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = self._connect()
+            db.execute("PRAGMA query_only = 1")
+            with self._readers_lock:
+                self._readers.append(db)
+        return db
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.db
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+            self.db.execute("COMMIT")
+
+    def close(self) -> None:
+        with self._readers_lock:
+            for db in self._readers:
+                db.close()
+            self._readers.clear()
+        with self._lock:
+            self.db.close()
+
+
+def open_backend(
+    kind: str, queue: RouteScheduler, path: str = "", poll_interval: float = 0.05
+):
+    """Open a state backend by name, giving the memory backend `queue` to use."""
+    if kind == MEMORY:
+        return MemoryBackend(queue)
+    if kind == SQLITE:
+        if queue.order != PRIORITY:
+            raise ValueError("the sqlite state backend only supports priority order")
+        if not path:
+            raise ValueError("the sqlite state backend needs a database path")
+        return SQLiteBackend(path, aging=queue.aging, poll_interval=poll_interval)
+    raise ValueError(f"unknown state backend {kind!r}")
+
+
+class SharedDroneStore(Mapping):
+    """Drone statuses in an `SQLiteBackend`, with the same interface as `DroneStore`.
+
+    Every write that changes anything bumps a shared version, which the drones it changed are
+    tagged with, so each worker can follow what every other worker has written.
+    """
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        return self.backend.reader()
+
+    def __init__(self, backend: SQLiteBackend):
+        self.backend = backend
+
+    def __len__(self) -> int:
+        return self.db.execute("SELECT count(*) FROM drones WHERE present").fetchone()[
+            0
+        ]
+
+    def __iter__(self) -> Iterator[DroneId]:
+        rows = self.db.execute("SELECT id FROM drones WHERE present").fetchall()
+        return (id for (id,) in rows)
+
+    def __contains__(self, id: object) -> bool:
+        row = self.db.execute(
+            "SELECT 1 FROM drones WHERE id = ? AND present", (id,)
+        ).fetchone()
+        return row is not None
+
+    def __getitem__(self, id: DroneId) -> DroneData:
+        row = self.db.execute(
+            "SELECT lat, lon, battery, status, last_update FROM drones"
+            " WHERE id = ? AND present",
+            (id,),
+        ).fetchone()
+        if row is None:
+            raise KeyError(id)
+        return _drone(*row)
+
+    def items(self) -> ItemsView[DroneId, DroneData]:
+        """Every drone, read in one query."""
+        rows = self.db.execute(
+            "SELECT id, lat, lon, battery, status, last_update FROM drones WHERE present"
+        ).fetchall()
+        return {id: _drone(*row) for id, *row in rows}.items()
+
+    def position(self, id: DroneId) -> Optional[LatLon]:
+        return self.db.execute(
+            "SELECT lat, lon FROM drones WHERE id = ? AND present", (id,)
+        ).fetchone()
+
+    def _bump(self, db: sqlite3.Connection) -> int:
+        db.execute("UPDATE meta SET value = value + 1 WHERE name = 'version'")
+        return db.execute("SELECT value FROM meta WHERE name = 'version'").fetchone()[0]
+
+    def version(self) -> int:
+        """The version of the last change that any worker has made."""
+        return self.db.execute(
+            "SELECT value FROM meta WHERE name = 'version'"
+        ).fetchone()[0]
+
+    def put(self, id: DroneId, drone: DroneData) -> bool:
+        """Store a drone's status, returning whether anything changed."""
+        return bool(self.put_batch(DroneStatusBatch.of({id: drone})))
+
+    def put_batch(self, batch: DroneStatusBatch) -> list[DroneId]:
+        """Store many drones' statuses at once, returning the ids of the ones that changed.
+
+        If a drone appears more than once, the last update wins.
+        """
+        # keep only the last update for each drone
+        last = {id: i for i, id in enumerate(batch.ids)}
+        with self.backend.transaction() as db:
+            version = self._bump(db)
+            db.executemany(
+                """INSERT INTO drones VALUES (?, ?, ?, ?, ?, ?, ?, 1)
+                ON CONFLICT (id) DO UPDATE SET
+                    lat = excluded.lat,
+                    lon = excluded.lon,
+                    battery = excluded.battery,
+                    status = excluded.status,
+                    last_update = excluded.last_update,
+                    version = excluded.version,
+                    present = 1
+                WHERE NOT (
+                    drones.present
+                    AND drones.lat = excluded.lat
+                    AND drones.lon = excluded.lon
+                    AND drones.battery = excluded.battery
+                    AND drones.status = excluded.status
+                    AND drones.last_update = excluded.last_update
+                )""",
+                (
+                    (
+                        id,
+                        float(batch.lat[i]),
+                        float(batch.lon[i]),
+                        int(batch.battery[i]),
+                        CODE_BY_STATUS[batch.status[i]],
+                        to_timestamp(batch.lastUpdate[i]),
+                        version,
+                    )
+                    for id, i in last.items()
+                ),
+            )
+            changed = [
+                id
+                for (id,) in db.execute(
+                    "SELECT id FROM drones WHERE version = ?", (version,)
+                )
+            ]
+            if not changed:
+                # don't bump the version when nothing changed
+                db.execute("UPDATE meta SET value = value - 1 WHERE name = 'version'")
+        return changed
+
+    def changed_since(
+        self, version: int
+    ) -> Tuple[int, list[Tuple[DroneId, Optional[LatLon], int]]]:
+        """Get the drones that changed after `version`, oldest change first.
+
+        Returns the latest version, and the (id, position or None if removed, version) of each.
+        """
+        rows = self.db.execute(
+            "SELECT id, lat, lon, present, version FROM drones"
+            " WHERE version > ? ORDER BY version",
+            (version,),
+        ).fetchall()
+        latest = rows[-1][-1] if rows else version
+        return latest, [
+            (id, (lat, lon) if present else None, changed)
+            for id, lat, lon, present, changed in rows
+        ]
+
+    def purged(self) -> int:
+        """The version that tombstones up to have been purged, so can't be followed from."""
+        return self.db.execute(
+            "SELECT value FROM meta WHERE name = 'purged'"
+        ).fetchone()[0]
+
+    def _purge(self, db: sqlite3.Connection, version: int) -> None:
+        """Purge the tombstones that have been kept long enough, as of `version`."""
+        horizon = version - self.backend.tombstone_versions
+        if horizon <= 0:
+            return
+        db.execute("DELETE FROM drones WHERE version <= ? AND NOT present", (horizon,))
+        db.execute(
+            "UPDATE meta SET value = max(value, ?) WHERE name = 'purged'", (horizon,)
+        )
+
+    def remove(self, id: DroneId) -> None:
+        with self.backend.transaction() as db:
+            version = self._bump(db)
+            db.execute(
+                "UPDATE drones SET present = 0, version = ? WHERE id = ? AND present",
+                (version, id),
+            )
+            self._purge(db, version)
+
+    def clear(self) -> None:
+        with self.backend.transaction() as db:
+            version = self._bump(db)
+            db.execute(
+                "UPDATE drones SET present = 0, version = ? WHERE present", (version,)
+            )
+            self._purge(db, version)
+
+
+def _drone(
+    lat: float, lon: float, battery: int, status: int, last_update: float
+) -> DroneData:
+    return DroneData(
+        status=STATUS_BY_CODE[status],
+        battery=battery,
+        lastUpdate=datetime.fromtimestamp(last_update, timezone.utc),
+        lastSeen=(lat, lon),
+    )
+
+
+class SharedRouteQueue:
+    """Routes waiting to be flown in an `SQLiteBackend`, like a priority ordered `RouteScheduler`.
+
+    Routes are ordered the same way, with waiting routes aging by one priority level every
+    `aging` seconds.
+    Taking a route finds one with a plain read, so an empty queue can be polled without
+    taking the write lock, then deletes it, and only whichever worker actually deleted it
+    gets it, so no two workers can ever take the same one.
+    There's no way to be woken by other workers queueing routes, so waiting for one polls
+    every `poll_interval` seconds.
+    """
+
+    order = PRIORITY
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        return self.backend.reader()
+
+    def __init__(
+        self, backend: SQLiteBackend, aging: float = 60.0, poll_interval: float = 0.05
+    ):
+        self.backend = backend
+        self.aging = aging
+        self.poll_interval = poll_interval
+
+    def __len__(self) -> int:
+        return self.db.execute("SELECT count(*) FROM routes").fetchone()[0]
+
+    def __iter__(self) -> Iterator[QueuedRoute]:
+        """Every waiting route, oldest first."""
+        rows = self.db.execute(
+            f"SELECT {ROUTE_COLUMNS} FROM routes ORDER BY enqueued, id"
+        ).fetchall()
+        return (_queued(*row) for row in rows)
+
+    def push(
+        self,
+        route: Route,
+        priority: int = 0,
+        area: Any = None,
+        vision: Optional[float] = None,
+    ) -> QueuedRoute:
+        """Queue a route for any worker to hand out."""
+        return self.extend([route], priority, [area], vision)[0]
+
+    def extend(
+        self,
+        routes: Iterable[Route],
+        priority: int = 0,
+        areas: Optional[Iterable[Any]] = None,
+        vision: Optional[float] = None,
+    ) -> list[QueuedRoute]:
+        """Queue many routes at once, in one transaction."""
+        routes = list(routes)
+        areas = [None] * len(routes) if areas is None else areas
+        now = time.time()
+        queued = []
+        with self.backend.transaction() as db:
+            for route, area in zip(routes, areas):
+                start = (float(route[0, 0]), float(route[0, 1])) if len(route) else None
+                cursor = db.execute(
+                    "INSERT INTO routes"
+                    " (key, priority, enqueued, start_lat, start_lon, points, area,"
+                    " vision)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        now - priority * self.aging,
+                        priority,
+                        now,
+                        *(start or (None, None)),
+                        np.asarray(route, dtype="<f8").tobytes(),
+                        pack_area(area),
+                        vision,
+                    ),
+                )
+                queued.append(
+                    QueuedRoute(
+                        # always set after an insert
+                        id=cast(int, cursor.lastrowid),
+                        route=route,
+                        priority=priority,
+                        enqueued=time.monotonic(),
+                        key=None,
+                        area=area,
+                        vision=vision,
+                    )
+                )
+        return queued
+
+    def oldest(self) -> Optional[QueuedRoute]:
+        """The route that's been waiting the longest."""
+        row = self.db.execute(
+            f"SELECT {ROUTE_COLUMNS} FROM routes ORDER BY enqueued, id LIMIT 1"
+        ).fetchone()
+        return None if row is None else _queued(*row)
+
+    def pop(self, near: Optional[LatLon] = None) -> Optional[QueuedRoute]:
+        """Take the next route to be flown, or None if there isn't one.
+
+        If `near` is given, take the route that starts closest to it instead.
+        """
+        while True:
+            row = None if near is None else self._nearest(near)
+            if row is None:
+                row = self.db.execute(
+                    f"SELECT {ROUTE_COLUMNS} FROM routes ORDER BY key, id LIMIT 1"
+                ).fetchone()
+            if row is None:
+                return None
+            # only take the write lock once there's something to take
+            with self.backend.transaction() as db:
+                taken = db.execute(
+                    "DELETE FROM routes WHERE id = ?", (row[0],)
+                ).rowcount
+            if taken:
+                return _queued(*row)
+            # another worker took it first, so look again
+
+    def _nearest(self, near: LatLon) -> Optional[tuple]:
+        """Find the route starting closest to `near`, searching boxes around it in turn.
+
+        Each box is looked up on the index of starts, and the closest start in it is the
+        closest of all if it's no further away than the edge of the box.
+        """
+        order = (
+            " ORDER BY (start_lat - :lat) * (start_lat - :lat)"
+            " + (start_lon - :lon) * (start_lon - :lon), key, id LIMIT 1"
+        )
+        for half in NEAR_BOXES:
+            row = self.db.execute(
+                f"SELECT {ROUTE_COLUMNS}, (start_lat - :lat) * (start_lat - :lat)"
+                " + (start_lon - :lon) * (start_lon - :lon) FROM routes"
+                " WHERE start_lat BETWEEN :lat - :half AND :lat + :half"
+                " AND start_lon BETWEEN :lon - :half AND :lon + :half" + order,
+                dict(lat=near[0], lon=near[1], half=half),
+            ).fetchone()
+            if row is not None and row[-1] <= half * half:
+                return row[:-1]
+        # only routes with any points have a start
+        return self.db.execute(
+            f"SELECT {ROUTE_COLUMNS} FROM routes WHERE start_lat IS NOT NULL" + order,
+            dict(lat=near[0], lon=near[1]),
+        ).fetchone()
+
+    async def pop_wait(
+        self, timeout: float, near: Optional[LatLon] = None
+    ) -> Optional[QueuedRoute]:
+        """Take the next route to be flown, waiting up to `timeout` seconds for one to be queued."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            # taking a route waits on other workers' writes, so keep it off the event loop
+            queued = await asyncio.to_thread(self.pop, near)
+            remaining = deadline - loop.time()
+            if queued is not None or remaining <= 0:
+                return queued
+            await asyncio.sleep(min(self.poll_interval, remaining))
+
+    def clear(self) -> None:
+        with self.backend.transaction() as db:
+            db.execute("DELETE FROM routes")
+
+
+def _queued(
+    id: int,
+    priority: int,
+    enqueued: float,
+    points: bytes,
+    area: bytes,
+    vision: Optional[float],
+) -> QueuedRoute:
+    return QueuedRoute(
+        id=id,
+        route=np.frombuffer(points, dtype="<f8").reshape(-1, 2).copy(),
+        priority=priority,
+        # as if it had been queued in this process
+        enqueued=time.monotonic() - (time.time() - enqueued),
+        key=None,
+        area=unpack_area(area),
+        vision=vision,
+    )
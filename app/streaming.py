@@ -0,0 +1,106 @@
+from collections import OrderedDict
+from typing import Optional
+import asyncio
+
+from .types import DroneId
+
+
+class Subscription:
+    """One client's view of a `StatusFeed`.
+
+    Only the ids of changed drones are kept until the client takes them, so a slow client holds
+    at most one pending entry per drone no matter how far behind it falls, and is sent the
+    drone's latest status when it catches up.
+    """
+
+    def __init__(self):
+        self.pending: dict[DroneId, None] = dict()
+        self._ready = asyncio.Event()
+
+    def offer(self, id: DroneId) -> None:
+        self.pending[id] = None
+        self._ready.set()
+
+    async def next(self) -> list[DroneId]:
+        """Wait for, and take, the ids of the drones that have changed since the last call."""
+        await self._ready.wait()
+        self._ready.clear()
+        changed, self.pending = self.pending, dict()
+        return list(changed)
+
+
+class StatusFeed:
+    """Versioned change feed over the drone status store.
+
+    Every published update bumps the version, and is pushed to every subscription.
+    The version each drone last changed at is tracked, so pollers can ask for just the drones
+    that changed since a version they've already seen.
+    Only the last `max_removed` removed drones are remembered, so the history doesn't grow
+    forever; changes from before the oldest forgotten removal can't be asked for.
+    """
+
+    def __init__(self, max_removed: int = 10_000):
+        self.version = 0
+        self.max_removed = max_removed
+        # the versions from after which changes can be asked for
+        self.horizon = 0
+        # drone ids, ordered from least to most recently changed
+        self._changed: OrderedDict[DroneId, int] = OrderedDict()
+        # the ones of those that have been removed, in the same order
+        self._removed: OrderedDict[DroneId, int] = OrderedDict()
+        self._subscriptions: set[Subscription] = set()
+
+    def publish(
+        self, id: DroneId, version: Optional[int] = None, removed: bool = False
+    ) -> int:
+        """Record that a drone changed, or was removed.
+
+        Normally this bumps the version, but a version can be given instead when following
+        changes that have already been versioned elsewhere; it mustn't go backwards.
+        """
+        self.version = self.version + 1 if version is None else version
+        self._changed[id] = self.version
+        self._changed.move_to_end(id)
+        if removed:
+            self._removed[id] = self.version
+            self._removed.move_to_end(id)
+            while len(self._removed) > self.max_removed:
+                forgotten, at = self._removed.popitem(last=False)
+                del self._changed[forgotten]
+                self.horizon = max(self.horizon, at)
+        else:
+            self._removed.pop(id, None)
+        for subscription in self._subscriptions:
+            subscription.offer(id)
+        return self.version
+
+    def changed_since(self, version: int) -> Optional[list[DroneId]]:
+        """Get the ids of the drones that changed after `version`, in O(changed).
+
+        Returns None if `version` is from before the horizon, when some of the drones removed
+        since may have been forgotten.
+        """
+        if version < self.horizon:
+            return None
+        changed = []
+        for id in reversed(self._changed):
+            if self._changed[id] <= version:
+                break
+            changed.append(id)
+        return changed
+
+    def last_changed(self, id: DroneId) -> Optional[int]:
+        return self._changed.get(id)
+
+    def subscribe(self) -> Subscription:
+        subscription = Subscription()
+        self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self._subscriptions.discard(subscription)
+
+    def clear(self) -> None:
+        self._changed.clear()
+        self._removed.clear()
+        self.horizon = 0
@@ -0,0 +1,237 @@
+from typing import Generic, Hashable, Optional, Tuple, TypeVar
+import time
+
+import numpy as np
+
+from .types import LatLon
+
+# improvements smaller than this aren't worth making
+EPSILON = 1e-9
+# longest run of routes that or-opt will try moving at once
+MAX_SEGMENT = 3
+
+
+def _dist(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return np.hypot(a[..., 0] - b[..., 0], a[..., 1] - b[..., 1])
+
+
+Key = TypeVar("Key", bound=Hashable)
+
+
+class TourPlanner(Generic[Key]):
+    """Orders a set of routes to minimise the transit distance flown between them.
+
+    Each route is flown from its start to its end, or reversed from its end to its start,
+    whichever makes for a shorter tour.
+    The tour is built with a nearest neighbour construction, then improved with 2-opt and
+    or-opt moves until no move helps or the time budget runs out.
+    Routes added later are inserted wherever they're cheapest and then locally improved,
+    rather than replanning the whole tour.
+    """
+
+    def __init__(self):
+        self._order: list[Key] = []
+        self._flipped: dict[Key, bool] = dict()
+        self._ends: dict[Key, Tuple[LatLon, LatLon]] = dict()
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def __contains__(self, id: Key) -> bool:
+        return id in self._ends
+
+    def order(self) -> list[Tuple[Key, bool]]:
+        """Ids of the routes in the order to fly them, and whether each is reversed."""
+        return [(id, self._flipped[id]) for id in self._order]
+
+    def head(self) -> Optional[Tuple[Key, bool]]:
+        if not self._order:
+            return None
+        id = self._order[0]
+        return id, self._flipped[id]
+
+    def _arrays(self, order: list[Key]) -> Tuple[np.ndarray, np.ndarray]:
+        """The entry and exit points of each route in `order`, taking reversal into account."""
+        if not order:
+            return np.empty((0, 2)), np.empty((0, 2))
+        ends = np.array([self._ends[id] for id in order], dtype=np.float64)
+        flipped = np.array([self._flipped[id] for id in order], dtype=np.bool_)
+        entries = np.where(flipped[:, None], ends[:, 1], ends[:, 0])
+        exits = np.where(flipped[:, None], ends[:, 0], ends[:, 1])
+        return entries, exits
+
+    def cost(self) -> float:
+        """Total transit distance between the routes in the tour."""
+        entries, exits = self._arrays(self._order)
+        return float(_dist(exits[:-1], entries[1:]).sum())
+
+    def add(self, id: Key, start: LatLon, end: LatLon, budget: float = 0.0) -> None:
+        """Insert a route wherever (and whichever way round) it adds the least transit."""
+        self._ends[id] = (start, end)
+        self._flipped[id] = False
+        if not self._order:
+            self._order.append(id)
+            return
+
+        entries, exits = self._arrays(self._order)
+        position, flipped = self._best_insertion(
+            entries, exits, np.array(start), np.array(end)
+        )
+        self._flipped[id] = flipped
+        self._order.insert(position, id)
+        if budget > 0:
+            self.improve(budget)
+
+    def remove(self, id: Key) -> None:
+        if self._ends.pop(id, None) is None:
+            return
+        del self._flipped[id]
+        self._order.remove(id)
+
+    def clear(self) -> None:
+        self._order.clear()
+        self._flipped.clear()
+        self._ends.clear()
+
+    def _best_insertion(
+        self, entries: np.ndarray, exits: np.ndarray, start: np.ndarray, end: np.ndarray
+    ) -> Tuple[int, bool]:
+        """Find the cheapest position (and orientation) to insert a route into a tour.
+
+        Position `p` means inserting before the route currently at `p`.
+        """
+        m = len(entries)
+        best: Tuple[float, int, bool] = (np.inf, 0, False)
+        for flipped, (entry, exit) in ((False, (start, end)), (True, (end, start))):
+            cost = np.zeros(m + 1)
+            # joining on after the route before, and before the route after
+            cost[1:] += _dist(exits, entry)
+            cost[:-1] += _dist(exit, entries)
+            # minus the leg that used to join them
+            cost[1:-1] -= _dist(exits[:-1], entries[1:])
+            p = int(np.argmin(cost))
+            if cost[p] < best[0]:
+                best = (float(cost[p]), p, flipped)
+        return best[1], best[2]
+
+    def rebuild(self, budget: float = 0.0, start: Optional[LatLon] = None) -> None:
+        """Rebuild the whole tour from scratch, nearest neighbour first, then improve it."""
+        remaining = list(self._ends)
+        if not remaining:
+            return
+        ends = np.array([self._ends[id] for id in remaining], dtype=np.float64)
+        left = np.ones(len(remaining), dtype=np.bool_)
+        here = np.array(start) if start is not None else ends[0, 0]
+
+        order = []
+        for _ in range(len(remaining)):
+            to_start = np.where(left, _dist(ends[:, 0], here), np.inf)
+            to_end = np.where(left, _dist(ends[:, 1], here), np.inf)
+            i_start, i_end = int(np.argmin(to_start)), int(np.argmin(to_end))
+            # fly whichever route we can get into most quickly, from whichever end is closer
+            if to_start[i_start] <= to_end[i_end]:
+                i, flipped = i_start, False
+            else:
+                i, flipped = i_end, True
+            left[i] = False
+            order.append(remaining[i])
+            self._flipped[remaining[i]] = flipped
+            here = ends[i, 0] if flipped else ends[i, 1]
+
+        self._order = order
+        if budget > 0:
+            self.improve(budget)
+
+    def improve(self, budget: float) -> None:
+        """Apply 2-opt and or-opt moves until none help, or `budget` seconds pass."""
+        deadline = time.perf_counter() + budget
+        improved = True
+        while improved and time.perf_counter() < deadline:
+            improved = self._two_opt(deadline)
+            improved = self._or_opt(deadline) or improved
+
+    def _two_opt(self, deadline: float) -> bool:
+        """Reverse runs of the tour (reversing each route in them) wherever that's shorter."""
+        n = len(self._order)
+        improved = False
+        for i in range(n):
+            if time.perf_counter() >= deadline:
+                break
+            entries, exits = self._arrays(self._order)
+            j = np.arange(i, n)
+            delta = np.zeros(len(j))
+            if i > 0:
+                # before -> i becomes before -> (reversed) j
+                delta += _dist(exits[i - 1], exits[j]) - _dist(exits[i - 1], entries[i])
+            has_after = j < n - 1
+            after = j[has_after] + 1
+            # j -> after becomes (reversed) i -> after
+            delta[has_after] += _dist(entries[i], entries[after]) - _dist(
+                exits[j[has_after]], entries[after]
+            )
+            best = int(np.argmin(delta))
+            if delta[best] < -EPSILON:
+                end = i + best
+                segment = self._order[i : end + 1]
+                for id in segment:
+                    self._flipped[id] = not self._flipped[id]
+                self._order[i : end + 1] = segment[::-1]
+                improved = True
+        return improved
+
+    def _or_opt(self, deadline: float) -> bool:
+        """Move short runs of routes (either way round) to wherever they fit best."""
+        improved = False
+        for length in range(1, MAX_SEGMENT + 1):
+            i = 0
+            while i + length <= len(self._order):
+                if time.perf_counter() >= deadline:
+                    return improved
+                if self._move_segment(i, length):
+                    improved = True
+                else:
+                    i += 1
+        return improved
+
+    def _move_segment(self, i: int, length: int) -> bool:
+        n = len(self._order)
+        entries, exits = self._arrays(self._order)
+        end = i + length - 1
+
+        # how much shorter the tour gets just by taking the segment out
+        gain = 0.0
+        if i > 0:
+            gain += float(_dist(exits[i - 1], entries[i]))
+        if end < n - 1:
+            gain += float(_dist(exits[end], entries[end + 1]))
+        if i > 0 and end < n - 1:
+            gain -= float(_dist(exits[i - 1], entries[end + 1]))
+
+        rest = self._order[:i] + self._order[end + 1 :]
+        rest_entries = np.concatenate((entries[:i], entries[end + 1 :]))
+        rest_exits = np.concatenate((exits[:i], exits[end + 1 :]))
+        position, flipped = self._best_insertion(
+            rest_entries, rest_exits, entries[i], exits[end]
+        )
+
+        # work out what inserting costs, to compare against the gain
+        segment_entry, segment_exit = (
+            (exits[end], entries[i]) if flipped else (entries[i], exits[end])
+        )
+        cost = 0.0
+        if position > 0:
+            cost += float(_dist(rest_exits[position - 1], segment_entry))
+        if position < len(rest):
+            cost += float(_dist(segment_exit, rest_entries[position]))
+        if 0 < position < len(rest):
+            cost -= float(_dist(rest_exits[position - 1], rest_entries[position]))
+        if cost - gain >= -EPSILON:
+            return False
+
+        segment = self._order[i : end + 1]
+        if flipped:
+            for id in segment:
+                self._flipped[id] = not self._flipped[id]
+            segment = segment[::-1]
+        self._order = rest[:position] + segment + rest[position:]
+        return True
@@ -1,4 +1,9 @@
 from typing import Tuple
 
+import numpy as np
+import numpy.typing as npt
+
 DroneId = str
 LatLon = Tuple[float, float]
+# an (n, 2) array of lat/lon rows, the vectorized equivalent of `list[LatLon]`
+Route = npt.NDArray[np.float64]
@@ -0,0 +1,135 @@
+from typing import Optional, Tuple
+import json
+
+import numpy as np
+
+from .types import Route
+
+JSON = "application/json"
+# packed little-endian (lat, lon) pairs
+FLOAT64 = "application/x-route-f64"
+FLOAT32 = "application/x-route-f32"
+# google encoded polyline format, at 5 decimal places
+POLYLINE = "application/x-route-polyline"
+
+MEDIA_TYPES = (JSON, FLOAT64, FLOAT32, POLYLINE)
+
+POLYLINE_PRECISION = 1e5
+
+
+def negotiate(accept: Optional[str]) -> str:
+    """Pick the route encoding to respond with, given an `Accept` header.
+
+    Falls back to JSON if nothing acceptable is supported.
+    """
+    if not accept:
+        return JSON
+
+    best, best_q = JSON, 0.0
+    for part in accept.split(","):
+        media_type, *params = (p.strip() for p in part.split(";"))
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if media_type in MEDIA_TYPES and q > best_q:
+            best, best_q = media_type, q
+    return best
+
+
+def encode_polyline(route: Route) -> bytes:
+    """Encode a route as a polyline, without any per-point python objects."""
+    if len(route) == 0:
+        return b""
+
+    # delta encode the fixed-point coordinates, zig-zagging the sign into the low bit
+    fixed = np.rint(route * POLYLINE_PRECISION).astype(np.int64)
+    deltas = np.diff(fixed, axis=0, prepend=[[0, 0]]).reshape(-1)
+    values = ((deltas << 1) ^ (deltas >> 63)).astype(np.uint64)
+
+    # split every value into as many 5 bit chunks as it needs, least significant first
+    shifts = np.arange(13, dtype=np.uint64) * np.uint64(5)
+    shifted = values[:, None] >> shifts
+    chunks = shifted & np.uint64(31)
+    lengths = np.maximum(1, np.count_nonzero(shifted, axis=1))
+
+    # every chunk but the last of each value gets the continuation bit
+    used = np.arange(len(shifts)) < lengths[:, None]
+    more = np.arange(len(shifts)) < (lengths - 1)[:, None]
+    chars = chunks + np.where(more, 0x20, 0).astype(np.uint64) + np.uint64(63)
+    return chars[used].astype(np.uint8).tobytes()
+
+
+def decode_polyline(encoded: bytes) -> Route:
+    """Decode a polyline back into a route."""
+    values = []
+    value = shift = 0
+    for byte in encoded:
+        chunk = byte - 63
+        value |= (chunk & 0x1F) << shift
+        shift += 5
+        if not chunk & 0x20:
+            values.append(~(value >> 1) if value & 1 else value >> 1)
+            value = shift = 0
+    fixed = np.cumsum(np.array(values, dtype=np.int64).reshape(-1, 2), axis=0)
+    return fixed / POLYLINE_PRECISION
+
+
+def encode_route(route: Route, media_type: str) -> bytes:
+    if media_type == FLOAT64:
+        return route.astype("<f8", copy=False).tobytes()
+    if media_type == FLOAT32:
+        return route.astype("<f4").tobytes()
+    if media_type == POLYLINE:
+        return encode_polyline(route)
+    return json.dumps(route.tolist(), separators=(",", ":")).encode()
+
+
+def decode_route(body: bytes, media_type: str) -> Route:
+    if media_type == FLOAT64:
+        return np.frombuffer(body, dtype="<f8").reshape(-1, 2)
+    if media_type == FLOAT32:
+        return np.frombuffer(body, dtype="<f4").astype(np.float64).reshape(-1, 2)
+    if media_type == POLYLINE:
+        return decode_polyline(body)
+    return np.array(json.loads(body), dtype=np.float64).reshape(-1, 2)
+
+
+# separates the route from the photo points when both are encoded as polylines
+POLYLINE_SEPARATOR = b"\n"
+
+
+def encode_photo_route(route: Route, photos: Route, media_type: str) -> bytes:
+    """Encode a route along with the points to take photos at.
+
+    JSON is an object of both; the packed encodings are the route's points then the photo
+    points, back to back; polylines are one for each, separated by a newline.
+    """
+    if media_type == POLYLINE:
+        return encode_polyline(route) + POLYLINE_SEPARATOR + encode_polyline(photos)
+    if media_type in (FLOAT64, FLOAT32):
+        return encode_route(np.concatenate((route, photos)), media_type)
+    return json.dumps(
+        {"route": route.tolist(), "photos": photos.tolist()}, separators=(",", ":")
+    ).encode()
+
+
+def decode_photo_route(
+    body: bytes, media_type: str, points: int
+) -> Tuple[Route, Route]:
+    """Decode a route and its photo points, given how many points the route has."""
+    if media_type == POLYLINE:
+        route, _, photos = body.partition(POLYLINE_SEPARATOR)
+        return decode_polyline(route), decode_polyline(photos)
+    if media_type in (FLOAT64, FLOAT32):
+        both = decode_route(body, media_type)
+        return both[:points], both[points:]
+    data = json.loads(body)
+    return (
+        np.array(data["route"], dtype=np.float64).reshape(-1, 2),
+        np.array(data["photos"], dtype=np.float64).reshape(-1, 2),
+    )
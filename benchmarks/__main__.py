@@ -0,0 +1,78 @@
+"""Run the benchmarks, optionally saving the results as JSON and comparing against older ones.
+
+python3 -m benchmarks --output bench.json --compare old_bench.json
+"""
+
+from datetime import datetime, timezone
+import argparse
+import json
+import platform
+
+import numpy as np
+
+from . import api, recovery, routing
+
+
+def compare(results: dict[str, dict], baseline: dict[str, dict]) -> None:
+    """Print how the median latency of every benchmark in both runs has changed."""
+    print(f"\n{'benchmark':40} {'old p50':>11} {'new p50':>11} {'change':>8}")
+    for name, stats in results.items():
+        old = baseline.get(name)
+        if old is None or not old.get("p50_ms"):
+            continue
+        change = stats["p50_ms"] / old["p50_ms"] - 1
+        print(
+            f"{name:40} {old['p50_ms']:9.3f}ms {stats['p50_ms']:9.3f}ms {change:+8.1%}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python3 -m benchmarks")
+    parser.add_argument("--output", help="file to save the results to, as JSON")
+    parser.add_argument("--compare", help="results from an earlier run to compare to")
+    parser.add_argument(
+        "--only",
+        choices=("routing", "api", "recovery"),
+        help="only run one set of benchmarks",
+    )
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=0.2,
+        help="seconds to spend timing each routing benchmark",
+    )
+    parser.add_argument(
+        "--duration", type=float, default=3.0, help="seconds to load test the API for"
+    )
+    parser.add_argument("--drones", type=int, default=50)
+    parser.add_argument("--frontends", type=int, default=5)
+    args = parser.parse_args()
+
+    results = dict()
+    if args.only in (None, "routing"):
+        results.update(routing.run(args.budget))
+    if args.only in (None, "api"):
+        results.update(api.run(args.drones, args.frontends, args.duration))
+    if args.only in (None, "recovery"):
+        results.update(recovery.run())
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(
+                {
+                    "created": datetime.now(timezone.utc).isoformat(),
+                    "python": platform.python_version(),
+                    "numpy": np.__version__,
+                    "machine": platform.machine(),
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f)["results"])
+
+
+if __name__ == "__main__":
+    main()
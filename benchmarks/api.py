@@ -0,0 +1,117 @@
+from collections import defaultdict
+import asyncio
+import random
+import time
+
+from app import main
+
+from .asgi import ASGIClient
+from .stats import summarise
+
+
+def reset() -> None:
+    """Clear out all of the service's state, so runs don't affect each other."""
+    main.DRONES.clear()
+    main.ROUTES_QUEUE.clear()
+    main.ROUTE_CACHE.clear()
+    main.JOBS.clear()
+    main.DRONE_INDEX.clear()
+    main.STATUS_FEED.clear()
+    main.PLANNED_COVERAGE.clear()
+    main.REPLANNER.clear()
+
+
+class Timings:
+    def __init__(self):
+        self.seconds: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+
+    async def time(self, name: str, request) -> bytes:
+        # without a network in between, nothing else would get a turn until a client's done
+        await asyncio.sleep(0)
+        start = time.perf_counter()
+        status, _, body = await request
+        self.seconds[name].append(time.perf_counter() - start)
+        if status >= 400:
+            self.errors[name] += 1
+        return body
+
+
+async def drone(client: ASGIClient, timings: Timings, id: str, until: float) -> None:
+    """Fly around reporting status, and asking for areas to search."""
+    rng = random.Random(id)
+    lat, lon = 51.5 + rng.uniform(-0.05, 0.05), -0.1 + rng.uniform(-0.05, 0.05)
+    while time.perf_counter() < until:
+        lat += rng.uniform(-1e-4, 1e-4)
+        lon += rng.uniform(-1e-4, 1e-4)
+        status = {
+            "status": "flying",
+            "battery": 90,
+            "lastUpdate": "2024-01-01T00:00:00Z",
+            "lastSeen": [lat, lon],
+        }
+        await timings.time(
+            "POST /drone_status/{id}",
+            client.post(f"/drone_status/{id}", json_body=status),
+        )
+        await timings.time(
+            "GET /next_area",
+            client.get("/next_area", params={"drone_id": id}),
+        )
+
+
+async def frontend(client: ASGIClient, timings: Timings, seed: int, until: float):
+    """Poll every drone's status, and dispatch areas for them to search."""
+    rng = random.Random(seed)
+    while time.perf_counter() < until:
+        await timings.time("GET /drone_status", client.get("/drone_status"))
+        area = {
+            "lat": 51.5 + rng.uniform(-0.05, 0.05),
+            "lon": -0.1 + rng.uniform(-0.05, 0.05),
+            "radius": rng.choice((100.0, 500.0, 2000.0)),
+        }
+        await timings.time(
+            "POST /drone_dispatch/circle",
+            client.post("/drone_dispatch/circle", json_body=area),
+        )
+
+
+async def load(drones: int, frontends: int, duration: float) -> dict[str, dict]:
+    reset()
+    client = ASGIClient(main.app)
+    timings = Timings()
+    start = time.perf_counter()
+    until = start + duration
+    await asyncio.gather(
+        *(drone(client, timings, f"drone-{i}", until) for i in range(drones)),
+        *(frontend(client, timings, i, until) for i in range(frontends)),
+    )
+    elapsed = time.perf_counter() - start
+
+    results = {
+        name: {**summarise(seconds, elapsed), "errors": timings.errors[name]}
+        for name, seconds in timings.seconds.items()
+    }
+    everything = [s for seconds in timings.seconds.values() for s in seconds]
+    results["total"] = {
+        **summarise(everything, elapsed),
+        "errors": sum(timings.errors.values()),
+    }
+    return results
+
+
+def run(drones: int = 50, frontends: int = 5, duration: float = 3.0) -> dict[str, dict]:
+    """Load test the endpoints drones and frontends hit most, with concurrent clients."""
+    try:
+        results = asyncio.run(load(drones, frontends, duration))
+    finally:
+        main.shutdown_pool()
+        reset()
+    named = {f"api/{name}": stats for name, stats in results.items()}
+    for name, stats in named.items():
+        print(
+            f"{name:40} p50 {stats['p50_ms']:9.3f}ms  p99 {stats['p99_ms']:9.3f}ms"
+            f"  {stats['throughput_per_s']:9.1f}/s",
+            flush=True,
+        )
+    return named
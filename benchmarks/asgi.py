@@ -0,0 +1,77 @@
+from typing import Optional, Tuple
+from urllib.parse import urlencode
+import json
+
+# (status, headers, body)
+Response = Tuple[int, dict[str, str], bytes]
+
+
+class ASGIClient:
+    """Minimal in-process client, calling an ASGI app directly without any networking.
+
+    Only supports what the benchmarks need: single request/response HTTP calls, with JSON or
+    raw bodies.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        params: Optional[dict] = None,
+        json_body=None,
+        headers: Optional[dict[str, str]] = None,
+    ) -> Response:
+        body = b"" if json_body is None else json.dumps(json_body).encode()
+        raw_headers = [
+            (k.lower().encode(), v.encode()) for k, v in (headers or {}).items()
+        ]
+        if json_body is not None:
+            raw_headers.append((b"content-type", b"application/json"))
+        raw_headers.append((b"content-length", str(len(body)).encode()))
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": urlencode(params or {}).encode(),
+            "root_path": "",
+            "headers": raw_headers,
+            "client": ("127.0.0.1", 0),
+            "server": ("127.0.0.1", 80),
+        }
+
+        sent = False
+
+        async def receive():
+            nonlocal sent
+            if sent:
+                return {"type": "http.disconnect"}
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        status, response_headers, chunks = 500, dict(), []
+
+        async def send(message):
+            nonlocal status, response_headers
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                response_headers = {
+                    k.decode(): v.decode() for k, v in message.get("headers", [])
+                }
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.app(scope, receive, send)
+        return status, response_headers, b"".join(chunks)
+
+    async def get(self, path: str, **kwargs) -> Response:
+        return await self.request("GET", path, **kwargs)
+
+    async def post(self, path: str, **kwargs) -> Response:
+        return await self.request("POST", path, **kwargs)
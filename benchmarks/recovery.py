@@ -0,0 +1,71 @@
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from app.drone_store import DroneStatus, DroneStatusBatch, DroneStore
+from app.journal import Journal
+from app.scheduler import RouteScheduler
+
+DRONES = 10_000
+ROUTES = 200
+POINTS_PER_ROUTE = 250
+# telemetry batches journalled_drones after the snapshot, which recovery has to replay
+BATCHES = 50
+
+
+def _batch(rng: np.random.Generator, ids: list[str]) -> DroneStatusBatch:
+    return DroneStatusBatch(
+        ids=ids,
+        status=[DroneStatus.flying] * len(ids),
+        battery=rng.integers(0, 100, len(ids)).tolist(),
+        lastUpdate=[datetime.fromtimestamp(0, timezone.utc)] * len(ids),
+        lat=rng.uniform(51, 52, len(ids)).tolist(),
+        lon=rng.uniform(-1, 0, len(ids)).tolist(),
+    )
+
+
+def run() -> dict[str, dict]:
+    """Time recovering a fleet and queue from a snapshot, plus a log of changes since."""
+    rng = np.random.default_rng(0)
+    ids = [f"drone-{i}" for i in range(DRONES)]
+    with tempfile.TemporaryDirectory() as directory:
+        journal = Journal(directory)
+        recovered = Journal(directory)
+        try:
+            journalled_drones, journalled_queue = DroneStore(), RouteScheduler()
+            journal.recover(journalled_drones, journalled_queue)
+            for _ in range(ROUTES):
+                journalled_queue.push(rng.uniform(0, 1, (POINTS_PER_ROUTE, 2)))
+            journalled_drones.put_batch(_batch(rng, ids))
+            # snapshot halfway, so there's both to replay
+            journal._write_snapshot(journal._snapshot())
+            for _ in range(BATCHES):
+                journalled_drones.put_batch(_batch(rng, ids[: DRONES // 10]))
+            for _ in range(ROUTES):
+                journalled_queue.push(rng.uniform(0, 1, (POINTS_PER_ROUTE, 2)))
+            journal.flush()
+
+            start = time.perf_counter()
+            drones, queue = DroneStore(), RouteScheduler()
+            recovered.recover(drones, queue)
+            seconds = time.perf_counter() - start
+        finally:
+            journal.close()
+            recovered.close()
+
+    result = {
+        "seconds": seconds,
+        # a single run, but named like the others so it can be compared
+        "p50_ms": seconds * 1000,
+        "drones": len(drones),
+        "routes": len(queue),
+        "waypoints": sum(len(queued.route) for queued in queue),
+    }
+    print(
+        f"{'recovery':40} {seconds * 1000:9.3f}ms  {result['waypoints']} waypoints"
+        f"  {result['drones']} drones",
+        flush=True,
+    )
+    return {"recovery": result}
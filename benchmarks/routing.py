@@ -0,0 +1,53 @@
+import time
+import tracemalloc
+
+from app.area_resolution import TargetCircle
+from app.planning import plan_route, routing_methods
+
+from .stats import summarise
+
+VISION = 10.0
+# circle radius / vision radius, which is what the size of a route scales with
+RATIOS = (10, 100, 1_000, 10_000)
+
+
+def bench_method(target: TargetCircle, method: str, budget: float) -> dict:
+    """Time planning `target` with `method` repeatedly for about `budget` seconds."""
+    # untimed warm up
+    planned = plan_route(target, VISION, method)
+
+    seconds: list[float] = []
+    start = time.perf_counter()
+    while not seconds or time.perf_counter() - start < budget:
+        t = time.perf_counter()
+        plan_route(target, VISION, method)
+        seconds.append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - start
+
+    # traced separately, since tracing slows everything down
+    tracemalloc.start()
+    plan_route(target, VISION, method)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        **summarise(seconds, elapsed),
+        "points": planned.cost.points,
+        "peak_memory_bytes": peak,
+    }
+
+
+def run(budget: float = 0.2) -> dict[str, dict]:
+    """Benchmark every routing method over circles of each radius/vision ratio."""
+    results = dict()
+    for ratio in RATIOS:
+        target = TargetCircle(lat=51.5, lon=-0.1, radius=VISION * ratio)
+        for method in routing_methods(target):
+            name = f"plan/{method}/ratio={ratio}"
+            results[name] = bench_method(target, method, budget)
+            print(
+                f"{name:40} p50 {results[name]['p50_ms']:9.3f}ms"
+                f"  peak {results[name]['peak_memory_bytes'] / 1e6:8.2f}MB",
+                flush=True,
+            )
+    return results
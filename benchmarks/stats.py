@@ -0,0 +1,19 @@
+from typing import Sequence
+
+import numpy as np
+
+
+def summarise(seconds: Sequence[float], elapsed: float) -> dict[str, float]:
+    """Latency percentiles (in milliseconds) and throughput (per second) of timed calls.
+
+    `elapsed` is the wall time the calls were made over, which is less than their sum when
+    they were concurrent.
+    """
+    samples = np.asarray(seconds) * 1000
+    return {
+        "count": len(samples),
+        "p50_ms": float(np.percentile(samples, 50)),
+        "p99_ms": float(np.percentile(samples, 99)),
+        "max_ms": float(samples.max()),
+        "throughput_per_s": len(samples) / elapsed if elapsed > 0 else 0.0,
+    }
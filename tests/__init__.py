@@ -5,3 +5,21 @@ import sys
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 from . import test_area_resolution
+from . import test_route_cache
+from . import test_main
+from . import test_scheduler
+from . import test_spatial
+from . import test_streaming
+from . import test_drone_store
+from . import test_wire
+from . import test_planning
+from . import test_tour
+from . import test_coverage
+from . import test_replanning
+from . import test_projection
+from . import test_metrics
+from . import test_journal
+from . import test_state
+from . import test_photos
+from . import test_liveness
+from . import test_preview
@@ -1,6 +1,8 @@
 import unittest
 import math
-from app.area_resolution import TargetCircle
+import numpy as np
+from app.area_resolution import TargetCircle, TargetPolygon, route_to_latlons
+from app.projection import LocalFrame
 from app.types import LatLon
 
 from typing import Callable
@@ -355,3 +357,106 @@ class TestCircleRoutingMethod3(TestCircleRouting):
                 (1900.01, -524.4997998398399),
             ],
         )
+
+
+class TestCircleRoutingArrays(unittest.TestCase):
+    """The vectorized routing methods should agree with their list counterparts."""
+
+    def test_array_matches_list(self):
+        circle = TargetCircle(lat=-10.0, lon=2.0, radius=1.0)
+        for method in ("path_method1", "path_method2", "path_method3"):
+            route = getattr(circle, method + "_array")(0.1)
+            self.assertEqual(route.shape[1], 2)
+            self.assertEqual(route_to_latlons(route), getattr(circle, method)(0.1))
+
+    def test_search_area(self):
+        circle = TargetCircle(lat=51.5, lon=-1.0, radius=200.0)
+        frame = LocalFrame(circle.lat, circle.lon)
+        route = np.asarray(circle.search_area(10.0))
+        # planned in metres around the centre, and converted back to lat/lon
+        expected = frame.to_latlon(circle.in_frame(frame).path_method3_array(10.0))
+        np.testing.assert_allclose(route, expected)
+        # some points are right on the edge, so allow for rounding
+        edge = circle.model_copy(update={"radius": circle.radius + 1e-6})
+        self.assertTrue(edge.contains(route[:, 0], route[:, 1]).all())
+        self.assertLess(np.fabs(route - circle.centre()).max(), 0.01)
+
+
+class TestPolygonRouting(unittest.TestCase):
+    square = TargetPolygon(
+        exterior=[(0.0, 0.0), (0.0, 10.0), (10.0, 10.0), (10.0, 0.0)],
+        holes=[[(4.0, 4.0), (4.0, 6.0), (6.0, 6.0), (6.0, 4.0)]],
+    )
+
+    def test_contains_leaves_out_holes(self):
+        lats, lons = np.meshgrid(np.arange(0.5, 10), np.arange(0.5, 10), indexing="ij")
+        inside = self.square.contains(lats, lons)
+        self.assertEqual(inside.sum(), 96)
+        self.assertFalse(inside[4:6, 4:6].any())
+        self.assertFalse(self.square.contains(np.array([-1.0]), np.array([5.0])).any())
+
+    def test_sweep_avoids_hole(self):
+        route = self.square.sweep_route(1.0, 0.0)
+        # every line is crossed once, except the ones split by the hole which are crossed twice
+        self.assertEqual(len(route), 2 * 10 + 2 * 2)
+        # each pair of points is one line, which should stay inside
+        middle = (route[0::2] + route[1::2]) / 2
+        self.assertTrue(self.square.contains(middle[:, 0], middle[:, 1]).all())
+
+    def test_search_route_in_metres(self):
+        # roughly 110m north to south by 70m east to west, swept with 10m of vision
+        field = TargetPolygon(
+            exterior=[(51.5, -1.0), (51.5, -0.999), (51.501, -0.999), (51.501, -1.0)]
+        )
+        route = field.search_route(10.0)
+        # lines along the longer sides, 7 of them to cross the 70m
+        self.assertEqual(len(route), 2 * 7)
+        middle = (route[0::2] + route[1::2]) / 2
+        self.assertTrue(field.contains(middle[:, 0], middle[:, 1]).all())
+
+    def test_concave_cells(self):
+        # a "C" shape, whose arms need sweeping separately
+        shape = TargetPolygon(
+            exterior=[
+                (0.0, 0.0),
+                (0.0, 10.0),
+                (10.0, 10.0),
+                (10.0, 7.0),
+                (3.0, 7.0),
+                (3.0, 3.0),
+                (10.0, 3.0),
+                (10.0, 0.0),
+            ]
+        )
+        route = shape.sweep_route(1.0, 0.0)
+        self.assertEqual(len(route), 2 * 3 + 2 * 7 * 2)
+        # every line of the arms is swept without crossing the gap between them
+        lines = np.fabs(route[0::2, 1] - route[1::2, 1])
+        self.assertEqual(sorted(lines.tolist()), [3.0] * 14 + [10.0] * 3)
+        # and each arm is finished before moving on to the other
+        arms = np.sign(route[route[:, 0] > 3, 1] - 5)
+        self.assertEqual(np.count_nonzero(np.diff(arms)), 1)
+
+    def test_sweep_angles_follow_sides(self):
+        diamond = TargetPolygon(
+            exterior=[(0.0, 0.0), (1.0, 1.0), (0.0, 2.0), (-1.0, 1.0)]
+        )
+        self.assertEqual(
+            sorted(diamond.sweep_angles()),
+            [math.pi / 4, 3 * math.pi / 4],
+        )
+
+    def test_rotated_sweep_stays_inside(self):
+        angles = np.linspace(0, 2 * np.pi, 500, endpoint=False)
+        radii = 1 + 0.3 * np.sin(7 * angles)
+        star = TargetPolygon(
+            exterior=np.column_stack(
+                (radii * np.cos(angles), radii * np.sin(angles))
+            ).tolist()
+        )
+        for angle in star.sweep_angles():
+            route = star.sweep_route(0.05, angle)
+            self.assertGreater(len(route), 0)
+            # points are on the boundary, so nudge them towards the middle of their line
+            middle = (route[0::2] + route[1::2]) / 2
+            self.assertTrue(star.contains(middle[:, 0], middle[:, 1]).all())
@@ -0,0 +1,100 @@
+import math
+import unittest
+import numpy as np
+from app.area_resolution import LocalCircle, TargetCircle
+from app.coverage import TILE, CellArea, ClaimedCoverage, CoverageGrid
+from app.projection import FrameAnchor
+
+
+class TestCoverageGrid(unittest.TestCase):
+    def test_claim_subtracts_covered(self):
+        grid = CoverageGrid(cell_size=1.0)
+        circle = LocalCircle(lat=0.0, lon=0.0, radius=20.0)
+        _, first = grid.claim(circle)
+        self.assertGreater(first.sum(), 0)
+        # the same area again has nothing new
+        _, again = grid.claim(circle)
+        self.assertEqual(again.sum(), 0)
+        # a half overlapping one only has its new half
+        _, overlapping = grid.claim(LocalCircle(lat=0.0, lon=20.0, radius=20.0))
+        self.assertLess(overlapping.sum(), first.sum())
+        self.assertEqual(grid.cells_covered(), first.sum() + overlapping.sum())
+
+    def test_sparse_tiles(self):
+        grid = CoverageGrid(cell_size=1.0)
+        grid.claim(LocalCircle(lat=0.0, lon=0.0, radius=2.0))
+        grid.claim(LocalCircle(lat=1e6, lon=1e6, radius=2.0))
+        # two small areas far apart shouldn't allocate everything in between
+        self.assertLessEqual(len(grid), 8)
+
+    def test_route_cells(self):
+        grid = CoverageGrid(cell_size=2.0)
+        mask = np.array(
+            [
+                [1, 1, 0, 1],
+                [0, 1, 1, 0],
+                [0, 0, 1, 0],
+            ],
+            dtype=np.bool_,
+        )
+        route = grid.route_cells((TILE, -1), mask)
+        cells = route / 2.0 - 0.5 - np.array([TILE, -1])
+        self.assertEqual(
+            cells.tolist(),
+            [[0, 0], [0, 1], [0, 3], [1, 2], [1, 1], [2, 2]],
+        )
+
+    def test_mark_points(self):
+        grid = CoverageGrid(cell_size=1.0)
+        grid.mark_points(np.array([0.0, 1000.0]), np.array([0.0, 1000.0]), 2.0)
+        # cells with centres within 2 of each point: 12 around a cell corner
+        self.assertEqual(grid.cells_covered(), 24)
+        origin, mask = grid.rasterize(LocalCircle(lat=0.0, lon=0.0, radius=2.0))
+        self.assertFalse(grid.uncovered(CellArea(origin, mask)).mask.any())
+
+    def test_anchored(self):
+        grid = CoverageGrid(cell_size=10.0, anchor=FrameAnchor())
+        circle = TargetCircle(lat=60.0, lon=10.0, radius=200.0)
+        _, mask = grid.claim(circle)
+        # cells are 10m across, however far apart degrees of longitude are
+        self.assertAlmostEqual(mask.sum() * 100.0 / (math.pi * 200.0**2), 1.0, places=1)
+        route = grid.route_cells(
+            *grid.claim(TargetCircle(lat=60.0, lon=10.0, radius=300.0))
+        )
+        self.assertTrue(
+            TargetCircle(lat=60.0, lon=10.0, radius=300.0).contains(*route.T).all()
+        )
+        self.assertFalse(circle.contains(*route.T).any())
+
+        # points are lat/lon, with a radius in metres
+        grid.clear()
+        grid.mark_points(np.array([60.0]), np.array([10.0]), 200.0)
+        self.assertFalse(grid.uncovered(CellArea(*grid.rasterize(circle))).mask.any())
+
+    def test_out_of_range(self):
+        grid = CoverageGrid(cell_size=10.0, anchor=FrameAnchor(max_distance=10_000.0))
+        grid.claim(TargetCircle(lat=60.0, lon=10.0, radius=200.0))
+        far = TargetCircle(lat=61.0, lon=10.0, radius=200.0)
+        self.assertFalse(grid.in_range(far))
+        with self.assertRaises(ValueError):
+            grid.claim(far)
+        # positions out of range are left out, rather than marked somewhere distorted
+        points, _, _ = grid.cells_near(
+            np.array([61.0, 60.0]), np.array([10.0, 10.01]), 20.0
+        )
+        self.assertGreater(len(points), 0)
+        self.assertTrue((points == 1).all())
+        covered = grid.cells_covered()
+        grid.mark_points(np.array([61.0]), np.array([10.0]), 20.0)
+        self.assertEqual(grid.cells_covered(), covered)
+
+    def test_claims_lapse(self):
+        grid = ClaimedCoverage(cell_size=1.0, ttl=10.0)
+        first = grid.claim(LocalCircle(lat=0.0, lon=0.0, radius=5.0), now=0.0)
+        second = grid.claim(LocalCircle(lat=0.0, lon=5.0, radius=5.0), now=5.0)
+        self.assertEqual(grid.cells_covered(), first.mask.sum() + second.mask.sum())
+        # releasing one leaves the other's cells alone
+        grid.release(second)
+        self.assertEqual(grid.cells_covered(), first.mask.sum())
+        grid.expire(now=10.0)
+        self.assertEqual((grid.cells_covered(), len(grid)), (0, 0))
@@ -0,0 +1,63 @@
+from datetime import datetime, timezone
+import unittest
+from app.drone_store import DroneData, DroneStatus, DroneStatusBatch, DroneStore
+
+
+def drone(battery: int, lat: float = 0.0) -> DroneData:
+    return DroneData(
+        status=DroneStatus.flying,
+        battery=battery,
+        lastUpdate=datetime(2024, 3, 1, 12, tzinfo=timezone.utc),
+        lastSeen=(lat, 1.0),
+    )
+
+
+class TestDroneStore(unittest.TestCase):
+    def test_round_trip(self):
+        store = DroneStore()
+        self.assertTrue(store.put("a", drone(50, lat=3.0)))
+        self.assertEqual(store["a"], drone(50, lat=3.0))
+        self.assertEqual(store["a"].status, DroneStatus.flying)
+        self.assertEqual(
+            store["a"].lastUpdate, datetime(2024, 3, 1, 12, tzinfo=timezone.utc)
+        )
+        # same again isn't a change
+        self.assertFalse(store.put("a", drone(50, lat=3.0)))
+
+    def test_batch_grows_and_dedupes(self):
+        store = DroneStore(capacity=2)
+        ids = [str(i) for i in range(10)] + ["3"]
+        batch = DroneStatusBatch(
+            ids=ids,
+            status=["idle"] * 11,
+            battery=list(range(11)),
+            lastUpdate=[0] * 11,
+            lat=[0.0] * 11,
+            lon=[0.0] * 11,
+        )
+        self.assertEqual(store.put_batch(batch), ids[:10])
+        self.assertEqual(len(store), 10)
+        # the last update for a drone wins
+        self.assertEqual(store["3"].battery, 10)
+        self.assertEqual(store["9"].battery, 9)
+
+    def test_remove_reuses_row(self):
+        store = DroneStore()
+        store.put("a", drone(1))
+        store.put("b", drone(2))
+        store.remove("a")
+        self.assertNotIn("a", store)
+        store.put("c", drone(3))
+        self.assertEqual(store.row("c"), 0)
+        self.assertEqual({id: d.battery for id, d in store.items()}, {"b": 2, "c": 3})
+
+    def test_batch_lengths_checked(self):
+        with self.assertRaises(ValueError):
+            DroneStatusBatch(
+                ids=["a", "b"],
+                status=["idle"],
+                battery=[1, 2],
+                lastUpdate=[0, 0],
+                lat=[0.0, 0.0],
+                lon=[0.0, 0.0],
+            )
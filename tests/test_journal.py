@@ -0,0 +1,108 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from datetime import datetime, timezone
+import numpy as np
+from app.area_resolution import TargetCircle
+from app.coverage import CellArea
+from app.drone_store import DroneData, DroneStatus, DroneStore
+from app.journal import LOG_NAME, Journal
+from app.scheduler import RouteScheduler
+
+
+def drone(lat: float, battery: int = 50) -> DroneData:
+    return DroneData(
+        status=DroneStatus.flying,
+        battery=battery,
+        lastUpdate=datetime(2024, 1, 1, tzinfo=timezone.utc),
+        lastSeen=(lat, 0.0),
+    )
+
+
+class TestJournal(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def recover(self, **kwargs):
+        journal = Journal(self.directory.name, **kwargs)
+        # only once the test's done, since until then they're left open as if they crashed
+        self.addCleanup(journal.close)
+        drones, queue = DroneStore(), RouteScheduler()
+        journal.recover(drones, queue)
+        return journal, drones, queue
+
+    def test_replay_log(self):
+        journal, drones, queue = self.recover()
+        drones.put("a", drone(1.0))
+        drones.put("b", drone(2.0))
+        drones.put("a", drone(3.0, battery=10))
+        drones.put("c", drone(4.0))
+        drones.remove("c")
+        circle = TargetCircle(lat=0.0, lon=0.0, radius=1.0)
+        low = queue.push(np.array([[0.0, 0.0], [1.0, 1.0]]), area=circle)
+        cells = CellArea((3, -2), np.array([[True, False, True], [False, True, True]]))
+        queue.push(np.array([[2.0, 2.0]]), priority=5, area=cells, vision=15.0)
+        taken = queue.push(np.array([[5.0, 5.0]]))
+        queue.remove(taken)
+        journal.flush()
+        # crash without closing, so this has to come from the log
+
+        _, drones, queue = self.recover()
+        self.assertEqual(set(drones), {"a", "b"})
+        self.assertEqual(drones["a"], drone(3.0, battery=10))
+        self.assertEqual(len(queue), 2)
+        high = queue.pop()
+        self.assertEqual((high.priority, high.vision), (5, 15.0))
+        self.assertEqual(high.route.tolist(), [[2.0, 2.0]])
+        self.assertEqual(high.area.origin, (3, -2))
+        self.assertEqual(high.area.mask.tolist(), cells.mask.tolist())
+        restored = queue.pop()
+        self.assertEqual(restored.route.tolist(), low.route.tolist())
+        self.assertEqual(restored.area, circle)
+        self.assertIsNone(restored.vision)
+        # still waiting as long as it was before
+        self.assertAlmostEqual(restored.enqueued, low.enqueued, delta=0.01)
+
+    def test_unflushed_changes_are_lost(self):
+        journal, drones, _ = self.recover()
+        drones.put("a", drone(1.0))
+        journal.flush()
+        drones.put("b", drone(2.0))
+        _, drones, _ = self.recover()
+        self.assertEqual(set(drones), {"a"})
+
+    def test_torn_log(self):
+        journal, drones, _ = self.recover()
+        drones.put("a", drone(1.0))
+        drones.put("b", drone(2.0))
+        journal.flush()
+        # chop the last record in half, as if the process died writing it
+        path = os.path.join(self.directory.name, LOG_NAME)
+        os.truncate(path, os.path.getsize(path) - 10)
+
+        _, drones, _ = self.recover()
+        self.assertEqual(set(drones), {"a"})
+
+    def test_snapshot_compacts_log(self):
+        journal, drones, queue = self.recover(flush_interval=0.01, snapshot_bytes=1)
+        path = os.path.join(self.directory.name, LOG_NAME)
+
+        async def run():
+            flusher = asyncio.create_task(journal.run())
+            for i in range(20):
+                drones.put("a", drone(float(i)))
+                queue.push(np.array([[float(i), 0.0]]))
+                await asyncio.sleep(0.005)
+            flusher.cancel()
+
+        asyncio.run(run())
+        self.assertLess(os.path.getsize(path), 2000)
+        journal.close()
+        self.assertEqual(os.path.getsize(path), 0)
+
+        _, drones, queue = self.recover()
+        self.assertEqual(drones["a"], drone(19.0))
+        self.assertEqual(len(queue), 20)
+        self.assertEqual(queue.pop().route.tolist(), [[0.0, 0.0]])
@@ -0,0 +1,57 @@
+import unittest
+from app.liveness import LivenessTracker
+
+
+class TestLivenessTracker(unittest.TestCase):
+    def test_stale_then_dead(self):
+        tracker = LivenessTracker(stale_after=10.0, evict_after=30.0)
+        tracker.touch("a", now=0.0)
+        tracker.touch("b", now=5.0)
+        self.assertEqual(tracker.expire(now=9.9), ([], []))
+        self.assertEqual(tracker.expire(now=10.0), (["a"], []))
+        # only reported once
+        self.assertEqual(tracker.expire(now=12.0), ([], []))
+        self.assertEqual(tracker.expire(now=15.0), (["b"], []))
+        self.assertEqual(tracker.expire(now=30.0), ([], ["a"]))
+        self.assertNotIn("a", tracker)
+        self.assertEqual(tracker.expire(now=100.0), ([], ["b"]))
+        self.assertEqual(len(tracker), 0)
+
+    def test_touch_resets(self):
+        tracker = LivenessTracker(stale_after=10.0, evict_after=20.0)
+        tracker.touch("a", now=0.0)
+        tracker.touch("a", now=8.0)
+        self.assertEqual(tracker.expire(now=12.0), ([], []))
+        self.assertEqual(tracker.expire(now=18.0), (["a"], []))
+        # heard from again after going stale
+        tracker.touch_many(["a"], now=19.0)
+        self.assertEqual(tracker.expire(now=28.0), ([], []))
+        self.assertEqual(tracker.expire(now=29.0), (["a"], []))
+
+    def test_never_early(self):
+        tracker = LivenessTracker(stale_after=1.5, evict_after=1.5, resolution=1.0)
+        tracker.touch("a", now=0.2)
+        self.assertEqual(tracker.expire(now=1.9), ([], []))
+        # rounded up to the next whole tick
+        self.assertEqual(tracker.expire(now=2.0), (["a"], []))
+        self.assertEqual(tracker.expire(now=3.0), ([], ["a"]))
+
+    def test_falling_behind(self):
+        tracker = LivenessTracker(stale_after=10.0, evict_after=20.0)
+        tracker.expire(now=0.0)
+        tracker.touch_many(["a", "b"], now=0.0)
+        tracker.touch("c", now=1e6)
+        # a long way past both deadlines at once: stale now, dead next time
+        self.assertEqual(sorted(tracker.expire(now=1e5)[0]), ["a", "b"])
+        self.assertEqual(sorted(tracker.expire(now=1e5 + 1)[1]), ["a", "b"])
+        self.assertIn("c", tracker)
+
+    def test_forget(self):
+        tracker = LivenessTracker(stale_after=10.0, evict_after=20.0)
+        tracker.touch("a", now=0.0)
+        tracker.forget("a")
+        self.assertEqual(tracker.expire(now=100.0), ([], []))
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            LivenessTracker(stale_after=10.0, evict_after=5.0)
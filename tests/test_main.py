@@ -0,0 +1,504 @@
+import asyncio
+import json
+import unittest
+from datetime import datetime, timezone
+from unittest import mock
+import numpy as np
+from app import main
+from app import wire
+from app.area_resolution import TargetCircle, TargetPolygon, route_to_latlons
+from app.projection import METRES_PER_DEGREE, LocalFrame
+
+
+async def request(method: str, path: str, query: str = "", body=None) -> int:
+    """Send a request through the whole app, including its validation, returning the status."""
+    scope = {
+        "type": "http",
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "root_path": "",
+        "query_string": query.encode(),
+        "headers": [(b"content-type", b"application/json")],
+        "server": ("test", 80),
+        "client": ("test", 1234),
+    }
+    messages = [{"type": "http.request", "body": json.dumps(body).encode()}]
+    statuses = []
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+
+    await main.app(scope, receive, send)
+    return statuses[0]
+
+
+class TestEndpoints(unittest.TestCase):
+    """Call the endpoint functions directly, resetting the service state around each test."""
+
+    def setUp(self):
+        main.DRONES.clear()
+        main.ROUTES_QUEUE.clear()
+        main.ROUTE_CACHE.clear()
+        main.JOBS.clear()
+        main.DRONE_INDEX.clear()
+        main.STATUS_FEED.clear()
+        main.REPLANNER.clear()
+        main.PLANNED_COVERAGE.clear()
+        main.COVERAGE_ANCHOR.clear()
+        main.METRICS.clear()
+        main.LIVENESS.clear()
+
+    def tearDown(self):
+        main.shutdown_pool()
+
+    def test_dispatch_batch(self):
+        circles = [TargetCircle(lat=float(i), lon=0.0, radius=20.0) for i in range(4)]
+        # pre-cache one of them
+        main.ROUTE_CACHE.route(circles[2], 5.0)
+
+        result = asyncio.run(
+            main.drone_dispatch_batch(main.BatchDispatch(areas=circles), 5.0)
+        )
+        self.assertEqual([a.cached for a in result.areas], [False, False, True, False])
+        self.assertEqual(len(main.ROUTES_QUEUE), 4)
+        for circle, timing in zip(circles, result.areas):
+            route = main.ROUTES_QUEUE.pop().route
+            expected = main.plan_route(circle, 5.0).route
+            self.assertEqual(route.tolist(), expected.tolist())
+            self.assertEqual(timing.cost.points, len(route))
+
+    def test_invalid_vision_radius(self):
+        circle = {"lat": 51.5, "lon": -1.0, "radius": 100.0}
+        huge = {"lat": 51.5, "lon": -1.0, "radius": 1e6}
+        for path, body in [
+            ("/plan/circle", circle),
+            ("/drone_dispatch/circle", circle),
+            ("/drone_dispatch/batch", {"areas": [circle]}),
+            (
+                "/drone_dispatch/polygon",
+                {"exterior": [[51.5, -1.0], [51.5, -0.99], [51.51, -1.0]]},
+            ),
+        ]:
+            with self.subTest(path=path):
+                for vision in ("0", "-5"):
+                    status = asyncio.run(
+                        request("POST", path, f"vision_radius={vision}", body)
+                    )
+                    self.assertEqual(status, 422)
+        # far too small for the size of the area
+        status = asyncio.run(request("POST", "/plan/circle", "vision_radius=1", huge))
+        self.assertEqual(status, 422)
+        self.assertEqual(len(main.ROUTES_QUEUE), 0)
+
+    def test_dispatch_circle_job(self):
+        circle = TargetCircle(lat=1.0, lon=2.0, radius=20.0)
+
+        async def dispatch():
+            job = await main.drone_dispatch_circle(circle, 5.0)
+            self.assertEqual(job.state, main.JobState.pending)
+            self.assertEqual(len(main.ROUTES_QUEUE), 0)
+            await main.JOBS.wait(job.id)
+            return await main.get_job(job.id)
+
+        job = asyncio.run(dispatch())
+        self.assertEqual(job.state, main.JobState.done)
+        self.assertEqual(job.method, "boustrophedon")
+        self.assertEqual(job.cost, main.plan_route(circle, 5.0).cost)
+        self.assertEqual(len(main.ROUTES_QUEUE), 1)
+
+        # the second dispatch is a cache hit, so it's done straight away
+        job = asyncio.run(main.drone_dispatch_circle(circle, 5.0))
+        self.assertEqual(job.state, main.JobState.done)
+        self.assertEqual(len(main.ROUTES_QUEUE), 2)
+
+    def test_next_area_empty(self):
+        response = asyncio.run(main.get_next_drone_area())
+        self.assertEqual(response.status_code, 204)
+
+    def test_next_area_long_poll(self):
+        circle = TargetCircle(lat=1.0, lon=2.0, radius=20.0)
+
+        async def poll():
+            waiting = asyncio.create_task(main.get_next_drone_area(wait=5.0))
+            await asyncio.sleep(0.01)
+            self.assertFalse(waiting.done())
+            main.ROUTES_QUEUE.push(circle.search_route(5.0))
+            return await waiting
+
+        response = asyncio.run(poll())
+        self.assertEqual(json.loads(response.body), circle.search_route(5.0).tolist())
+
+    def test_next_area_nearest_drone(self):
+        circles = [TargetCircle(lat=float(i), lon=0.0, radius=100.0) for i in range(3)]
+        for circle in circles:
+            main.ROUTES_QUEUE.push(circle.search_route(50.0))
+        drone = main.DroneData(
+            status="idle", battery=100, lastUpdate=0, lastSeen=(1.95, 0.0)
+        )
+        asyncio.run(main.update_drone_status("drone", drone))
+
+        response = asyncio.run(main.get_next_drone_area(drone_id="drone"))
+        self.assertEqual(
+            json.loads(response.body), circles[2].search_route(50.0).tolist()
+        )
+        # unknown drones just get the next area in the queue
+        response = asyncio.run(main.get_next_drone_area(drone_id="nope"))
+        self.assertEqual(
+            json.loads(response.body), circles[0].search_route(50.0).tolist()
+        )
+
+    def test_drone_spatial_queries(self):
+        for i in range(5):
+            drone = main.DroneData(
+                status="flying", battery=50, lastUpdate=0, lastSeen=(float(i), 0.0)
+            )
+            asyncio.run(main.update_drone_status(str(i), drone))
+        # move one of them out of the way
+        moved = main.DroneData(
+            status="flying", battery=50, lastUpdate=0, lastSeen=(0.0, 10.0)
+        )
+        asyncio.run(main.update_drone_status("2", moved))
+
+        # radii are in metres
+        radius = 1.01 * METRES_PER_DEGREE
+        nearby = asyncio.run(main.get_drones_nearby(lat=2.0, lon=0.0, radius=radius))
+        self.assertEqual(set(nearby), {"1", "3"})
+        bbox = asyncio.run(main.get_drones_in_bbox(-1.0, -1.0, 1.5, 11.0))
+        self.assertEqual(set(bbox), {"0", "1", "2"})
+
+    def test_drone_status_since_and_etag(self):
+        def drone(battery: int):
+            return main.DroneData(
+                status=main.DroneStatus.idle,
+                battery=battery,
+                lastUpdate=datetime(2024, 1, 1, tzinfo=timezone.utc),
+                lastSeen=(0.0, 0.0),
+            )
+
+        asyncio.run(main.update_drone_status("a", drone(10)))
+        response = asyncio.run(main.get_drone_status())
+        self.assertEqual(
+            json.loads(response.body), {"a": drone(10).model_dump(mode="json")}
+        )
+        etag = response.headers["ETag"]
+        version = int(etag.strip('"'))
+
+        # writing the same data again isn't a change
+        asyncio.run(main.update_drone_status("a", drone(10)))
+        unchanged = asyncio.run(main.get_drone_status(if_none_match=etag))
+        self.assertEqual(unchanged.status_code, 304)
+
+        asyncio.run(main.update_drone_status("b", drone(20)))
+        changed = asyncio.run(main.get_drone_status(since=version))
+        self.assertEqual(set(json.loads(changed.body)), {"b"})
+
+        # removed drones are included, as null
+        main.DRONES.remove("a")
+        main._drone_changed("a", None)
+        changed = asyncio.run(main.get_drone_status(since=version))
+        self.assertEqual(
+            json.loads(changed.body),
+            {"a": None, "b": main.DRONES["b"].model_dump(mode="json")},
+        )
+        self.assertNotIn("X-Status-Snapshot", changed.headers)
+
+        # too far back to know what's been removed, so everything is sent
+        with mock.patch.object(main.STATUS_FEED, "horizon", version + 1):
+            snapshot = asyncio.run(main.get_drone_status(since=version))
+        self.assertEqual(set(json.loads(snapshot.body)), {"b"})
+        self.assertEqual(snapshot.headers["X-Status-Snapshot"], "1")
+
+    def test_next_area_compact(self):
+        route = TargetCircle(lat=51.5, lon=-1.0, radius=1000.0).search_route(100.0)
+        for media_type in wire.MEDIA_TYPES:
+            main.ROUTES_QUEUE.push(route)
+            response = asyncio.run(main.get_next_drone_area(accept=media_type))
+            self.assertEqual(response.media_type, media_type)
+            decoded = wire.decode_route(response.body, media_type)
+            self.assertTrue((abs(decoded - route) < 1e-5).all())
+
+    def test_next_area_photos(self):
+        circle = TargetCircle(lat=51.5, lon=-1.0, radius=200.0)
+        route = main.plan_route(circle, main.DRONE_VISION).route
+        main.ROUTES_QUEUE.push(route)
+        response = asyncio.run(
+            main.get_next_drone_area(photos=True, tolerance=1.0, accept=wire.FLOAT64)
+        )
+        points = int(response.headers["X-Route-Points"])
+        simplified, photos = wire.decode_photo_route(
+            response.body, wire.FLOAT64, points
+        )
+        self.assertEqual(len(photos), int(response.headers["X-Photo-Points"]))
+        self.assertLessEqual(len(simplified), len(route))
+        self.assertTrue((photos[[0, -1]] == simplified[[0, -1]]).all())
+        # spaced a vision radius apart along the route, so no further apart in a line
+        local = LocalFrame(*route[0]).to_local(photos)
+        gaps = ((local[1:] - local[:-1]) ** 2).sum(axis=1) ** 0.5
+        self.assertLess(gaps.max(), main.DRONE_VISION + 1e-6)
+        self.assertAlmostEqual(float(np.median(gaps)), main.DRONE_VISION, places=3)
+
+    def test_next_area_photos_dispatch_vision(self):
+        circle = TargetCircle(lat=51.5, lon=-1.0, radius=200.0)
+
+        async def dispatch():
+            job = await main.drone_dispatch_circle(circle, 10.0)
+            await main.JOBS.wait(job.id)
+            return await main.get_next_drone_area(
+                photos=True, tolerance=1.0, accept=wire.FLOAT64
+            )
+
+        response = asyncio.run(dispatch())
+        points = int(response.headers["X-Route-Points"])
+        _, photos = wire.decode_photo_route(response.body, wire.FLOAT64, points)
+        # spaced the vision radius it was dispatched with, not the service's
+        local = LocalFrame(*photos[0]).to_local(photos)
+        gaps = ((local[1:] - local[:-1]) ** 2).sum(axis=1) ** 0.5
+        self.assertAlmostEqual(float(np.median(gaps)), 10.0, places=3)
+
+    def test_route_preview(self):
+        circle = TargetCircle(lat=51.5, lon=-1.0, radius=100.0)
+
+        async def dispatch_and_preview():
+            job = await main.drone_dispatch_circle(circle, 10.0)
+            await main.JOBS.wait(job.id)
+            return job, await main.get_route_preview(job.id)
+
+        try:
+            job, response = asyncio.run(dispatch_and_preview())
+        finally:
+            main.PREVIEWS.shutdown()
+        self.assertEqual(response.media_type, "image/png")
+        self.assertTrue(response.body.startswith(b"\x89PNG"))
+        # once it's cached, the job only keeps the picture
+        self.assertIsNone(job.planned)
+        again = asyncio.run(main.get_route_preview(job.id))
+        self.assertEqual(again.body, response.body)
+        main.PREVIEWS.clear()
+        with self.assertRaises(main.HTTPException) as gone:
+            asyncio.run(main.get_route_preview(job.id))
+        self.assertEqual(gone.exception.status_code, 410)
+        with self.assertRaises(main.HTTPException):
+            asyncio.run(main.get_route_preview("nope"))
+
+    def test_plan_circle(self):
+        circle = TargetCircle(lat=1.0, lon=2.0, radius=20.0)
+        plan = asyncio.run(main.plan_circle(circle, 5.0))
+        self.assertEqual(
+            set(plan.candidates),
+            {"path_method1", "path_method2", "path_method3", "boustrophedon"},
+        )
+        self.assertEqual(
+            plan.cost.length, min(c.length for c in plan.candidates.values())
+        )
+        plan = asyncio.run(main.plan_circle(circle, 5.0, method="path_method3"))
+        # planned in metres around the centre, then converted back to lat/lon
+        frame = LocalFrame(*circle.centre())
+        local = circle.in_frame(frame).path_method3_array(5.0)
+        self.assertEqual(plan.route, route_to_latlons(frame.to_latlon(local)))
+        self.assertAlmostEqual(plan.route[0][0], 1.0 - 20.0 / METRES_PER_DEGREE)
+        self.assertEqual(plan.candidates, {})
+        with self.assertRaises(main.HTTPException):
+            asyncio.run(main.plan_circle(circle, 5.0, method="nope"))
+
+    def test_dispatch_merges_coverage(self):
+        main.COVERAGE_MERGE = True
+
+        async def dispatch(circle: TargetCircle):
+            job = await main.drone_dispatch_circle(circle, 10.0)
+            return await main.JOBS.wait(job.id)
+
+        try:
+            circle = TargetCircle(lat=51.75, lon=-1.25, radius=500.0)
+            first = asyncio.run(dispatch(circle))
+            self.assertEqual(first.method, "coverage")
+            self.assertEqual(len(main.ROUTES_QUEUE), 1)
+            route = main.ROUTES_QUEUE.pop().route
+            self.assertTrue(circle.contains(route[:, 0], route[:, 1]).all())
+            # the route reaches right across the circle, in metres rather than degrees
+            across = np.ptp(LocalFrame(51.75, -1.25).to_local(route), axis=0)
+            self.assertTrue((across > 950).all())
+
+            # fully covered already, so nothing new to fly
+            again = asyncio.run(dispatch(circle))
+            self.assertEqual(again.cost.points, 0)
+            self.assertEqual(len(main.ROUTES_QUEUE), 0)
+
+            # half way across to the east
+            east = -1.25 + 500.0 / LocalFrame(51.75, -1.25).scale[1]
+            shifted = TargetCircle(lat=51.75, lon=east, radius=500.0)
+            overlap = asyncio.run(dispatch(shifted))
+            self.assertLess(overlap.cost.length, first.cost.length)
+            route = main.ROUTES_QUEUE.pop().route
+            self.assertTrue(shifted.contains(route[:, 0], route[:, 1]).all())
+            self.assertFalse(circle.contains(route[:, 0], route[:, 1]).any())
+
+            # once the claims lapse, the area can be searched again
+            main.PLANNED_COVERAGE.expire(now=float("inf"))
+            self.assertEqual(asyncio.run(dispatch(circle)).cost, first.cost)
+        finally:
+            main.COVERAGE_MERGE = False
+
+    def test_dispatch_batch_merges_coverage(self):
+        main.COVERAGE_MERGE = True
+        try:
+            circle = TargetCircle(lat=51.75, lon=-1.25, radius=300.0)
+            batch = main.BatchDispatch(areas=[circle, circle])
+            result = asyncio.run(main.drone_dispatch_batch(batch, 10.0))
+            self.assertEqual([a.method for a in result.areas], ["coverage"] * 2)
+            # the second is all covered by the first
+            self.assertGreater(result.areas[0].cost.points, 0)
+            self.assertEqual(result.areas[1].cost.points, 0)
+            self.assertEqual(len(main.ROUTES_QUEUE), 1)
+        finally:
+            main.COVERAGE_MERGE = False
+
+    def test_merge_out_of_range(self):
+        main.COVERAGE_MERGE = True
+        try:
+            near = TargetCircle(lat=51.75, lon=-1.25, radius=300.0)
+            far = TargetCircle(lat=55.0, lon=-1.25, radius=300.0)
+            with self.assertRaises(main.HTTPException) as rejected:
+                asyncio.run(
+                    main.drone_dispatch_batch(
+                        main.BatchDispatch(areas=[near, far]), 10.0
+                    )
+                )
+            self.assertEqual(rejected.exception.status_code, 422)
+            # the first placed the grid, but gave its cells back
+            self.assertEqual(main.PLANNED_COVERAGE.cells_covered(), 0)
+            self.assertEqual(len(main.ROUTES_QUEUE), 0)
+            with self.assertRaises(main.HTTPException) as rejected:
+                asyncio.run(main.drone_dispatch_circle(far, 10.0))
+            self.assertEqual(rejected.exception.status_code, 422)
+        finally:
+            main.COVERAGE_MERGE = False
+
+    def test_failed_merge_releases_coverage(self):
+        main.COVERAGE_MERGE = True
+        circle = TargetCircle(lat=51.75, lon=-1.25, radius=300.0)
+
+        async def dispatch():
+            job = await main.drone_dispatch_circle(circle, 10.0)
+            return await main.JOBS.wait(job.id)
+
+        try:
+            with mock.patch.object(
+                main.ROUTES_QUEUE, "push", side_effect=RuntimeError("full")
+            ):
+                self.assertEqual(asyncio.run(dispatch()).state, main.JobState.failed)
+            self.assertEqual(main.PLANNED_COVERAGE.cells_covered(), 0)
+            self.assertGreater(asyncio.run(dispatch()).cost.points, 0)
+        finally:
+            main.COVERAGE_MERGE = False
+
+    def test_dropout_requeues_remainder(self):
+        circle = TargetCircle(lat=51.75, lon=-1.25, radius=200.0)
+        frame = LocalFrame(51.75, -1.25)
+        main.ROUTES_QUEUE.push(np.array([circle.centre()]), area=circle)
+        asyncio.run(main.get_next_drone_area(drone_id="drone"))
+        self.assertEqual(len(main.ROUTES_QUEUE), 0)
+
+        # fly over the southern half, then drop out
+        north, east = np.meshgrid(np.arange(-200, 1, 10), np.arange(-200, 201, 10))
+        flown = frame.to_latlon(np.column_stack((north.ravel(), east.ravel())))
+        for lat, lon in flown.tolist():
+            drone = main.DroneData(
+                status="flying", battery=80, lastUpdate=0, lastSeen=(lat, lon)
+            )
+            asyncio.run(main.update_drone_status("drone", drone))
+        lost = main.DroneData(
+            status="unknown", battery=80, lastUpdate=0, lastSeen=circle.centre()
+        )
+        asyncio.run(main.update_drone_status("drone", lost))
+
+        self.assertEqual(len(main.ROUTES_QUEUE), 1)
+        remainder = main.ROUTES_QUEUE.pop().route
+        self.assertTrue(circle.contains(remainder[:, 0], remainder[:, 1]).all())
+        self.assertTrue((frame.to_local(remainder)[:, 0] > 0).all())
+        self.assertNotIn("drone", main.REPLANNER)
+
+    def test_silent_drones_expire(self):
+        circle = TargetCircle(lat=0.0, lon=0.0, radius=100.0)
+        main.ROUTES_QUEUE.push(circle.search_route(10.0), area=circle)
+        drone = main.DroneData(
+            status="flying", battery=80, lastUpdate=0, lastSeen=(0.0, 0.0)
+        )
+        with mock.patch("time.monotonic", return_value=0.0):
+            asyncio.run(main.update_drone_status("drone", drone))
+            asyncio.run(main.get_next_drone_area(drone_id="drone"))
+        stale_at = main.LIVENESS.stale_after
+        evict_at = main.LIVENESS.evict_after
+
+        self.assertEqual(asyncio.run(main.expire_drones(now=stale_at - 1)), ([], []))
+        version = main.STATUS_FEED.version
+        self.assertEqual(asyncio.run(main.expire_drones(now=stale_at)), (["drone"], []))
+        self.assertEqual(main.DRONES["drone"].status, "unknown")
+        self.assertEqual(main.STATUS_FEED.changed_since(version), ["drone"])
+        # dropping out requeues the area it was given
+        self.assertEqual(len(main.ROUTES_QUEUE), 1)
+
+        self.assertEqual(asyncio.run(main.expire_drones(now=evict_at)), ([], ["drone"]))
+        self.assertNotIn("drone", main.DRONES)
+        self.assertEqual(asyncio.run(main.get_drones_nearby(0.0, 0.0, 1.0)), {})
+
+    def test_dispatch_polygon(self):
+        polygon = TargetPolygon(
+            exterior=[(0.0, 0.0), (0.0, 0.01), (0.01, 0.01), (0.01, 0.0)],
+            holes=[[(0.004, 0.004), (0.004, 0.006), (0.006, 0.006), (0.006, 0.004)]],
+        )
+
+        async def dispatch():
+            job = await main.drone_dispatch_polygon(polygon, 10.0)
+            await main.JOBS.wait(job.id)
+            return await main.get_job(job.id)
+
+        job = asyncio.run(dispatch())
+        self.assertEqual(job.state, main.JobState.done)
+        self.assertEqual(job.method, "boustrophedon")
+        self.assertEqual(len(main.ROUTES_QUEUE), 1)
+        with self.assertRaises(main.HTTPException):
+            asyncio.run(main.drone_dispatch_polygon(polygon, method="path_method1"))
+
+        # polygons and circles can be mixed in a batch
+        batch = main.BatchDispatch.model_validate(
+            {
+                "areas": [
+                    {"lat": 0.0, "lon": 0.0, "radius": 20.0},
+                    polygon.model_dump(),
+                ]
+            }
+        )
+        self.assertIsInstance(batch.areas[1], TargetPolygon)
+        result = asyncio.run(main.drone_dispatch_batch(batch, 10.0))
+        self.assertEqual(result.areas[1].method, "boustrophedon")
+        self.assertTrue(result.areas[1].cached)
+
+    def test_metrics(self):
+        main.ROUTES_QUEUE.push(
+            TargetCircle(lat=0.0, lon=0.0, radius=100.0).search_route(50.0)
+        )
+        drone = main.DroneData(
+            status="idle", battery=100, lastUpdate=0, lastSeen=(1.0, 2.0)
+        )
+        asyncio.run(main.update_drone_status("drone", drone))
+        asyncio.run(main.update_drone_status("drone", drone))
+        asyncio.run(main.plan_circle(TargetCircle(lat=0.0, lon=0.0, radius=50.0), 5.0))
+
+        response = asyncio.run(main.get_metrics())
+        self.assertTrue(response.media_type.startswith("text/plain"))
+        lines = response.body.decode().splitlines()
+        self.assertIn("dm_drones 1", lines)
+        self.assertIn("dm_queue_depth 1", lines)
+        self.assertIn("dm_telemetry_updates_total 2", lines)
+        self.assertIn("dm_telemetry_changes_total 1", lines)
+        self.assertIn(
+            'dm_route_generation_seconds_count{method="boustrophedon"} 1', lines
+        )
+        age = next(l for l in lines if l.startswith("dm_queue_oldest_age_seconds "))
+        self.assertGreater(float(age.split()[1]), 0.0)
@@ -0,0 +1,99 @@
+import asyncio
+import time
+import unittest
+from app.metrics import Histogram, MetricsMiddleware, Registry
+from app.profiling import SamplingProfiler
+
+
+class FakeRoute:
+    path = "/things/{id}"
+
+
+async def fake_app(scope, receive, send):
+    """Stands in for the router, which leaves the matched route in the scope."""
+    if scope["path"].startswith("/things/"):
+        scope["route"] = FakeRoute()
+        status = 200
+    else:
+        status = 404
+    await send({"type": "http.response.start", "status": status, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+def request(app, path: str) -> None:
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        pass
+
+    asyncio.run(app({"type": "http", "method": "GET", "path": path}, receive, send))
+
+
+class TestRegistry(unittest.TestCase):
+    def test_render(self):
+        registry = Registry()
+        counter = registry.counter("things_total", "Things.", ("kind",))
+        counter.inc("a")
+        counter.inc("a", amount=2)
+        counter.inc('say "hi"')
+        registry.counter("unlabelled_total", "Unlabelled.")
+        registry.gauge("answer", "The answer.", lambda: 42)
+        histogram = registry.histogram("took", "Took.", buckets=(1.0, 2.0))
+        for value in (0.5, 1.0, 1.5, 3.0):
+            histogram.observe(value)
+
+        lines = registry.render().splitlines()
+        self.assertIn("# TYPE things_total counter", lines)
+        self.assertIn('things_total{kind="a"} 3', lines)
+        self.assertIn('things_total{kind="say \\"hi\\""} 1', lines)
+        self.assertIn("unlabelled_total 0", lines)
+        self.assertIn("answer 42", lines)
+        # buckets are cumulative, and a value on a bound goes in that bucket
+        self.assertIn('took_bucket{le="1.0"} 2', lines)
+        self.assertIn('took_bucket{le="2.0"} 3', lines)
+        self.assertIn('took_bucket{le="+Inf"} 4', lines)
+        self.assertIn("took_sum 6.0", lines)
+        self.assertIn("took_count 4", lines)
+
+        with self.assertRaises(ValueError):
+            registry.counter("answer", "Again.")
+
+
+class TestMiddleware(unittest.TestCase):
+    def test_labels_by_route(self):
+        requests = Histogram("requests", "Requests.", ("method", "path", "status"))
+        finished = []
+        app = MetricsMiddleware(
+            fake_app, requests, lambda *args: finished.append(args[0])
+        )
+        request(app, "/things/1")
+        request(app, "/things/2")
+        request(app, "/missing")
+        self.assertEqual(requests.count("GET", "/things/{id}", "200"), 2)
+        self.assertEqual(requests.count("GET", "unmatched", "404"), 1)
+        self.assertEqual(finished, ["/things/{id}", "/things/{id}", "unmatched"])
+
+
+class TestSamplingProfiler(unittest.TestCase):
+    def test_keeps_slow_requests(self):
+        profiler = SamplingProfiler(interval=0.001, slow=0.05)
+        # not running, so nothing is kept
+        profiler.request_finished("/slow", time.perf_counter(), 1.0)
+        self.assertEqual(len(profiler.slow_requests), 0)
+
+        profiler.start()
+        try:
+            start = time.perf_counter()
+            time.sleep(0.01)
+            profiler.request_finished("/fast", start, time.perf_counter() - start)
+            start = time.perf_counter()
+            time.sleep(0.1)
+            profiler.request_finished("/slow", start, time.perf_counter() - start)
+        finally:
+            profiler.stop()
+
+        self.assertEqual([r.path for r in profiler.slow_requests], ["/slow"])
+        stacks = profiler.slow_requests[0].stacks
+        self.assertGreater(sum(stacks.values()), 10)
+        self.assertTrue(any("test_keeps_slow_requests" in stack for stack in stacks))
@@ -0,0 +1,72 @@
+import unittest
+import numpy as np
+from app.photos import photo_route, simplify, trigger_points
+from app.projection import METRES_PER_DEGREE
+
+
+def distance_to_route(points, route):
+    """Distance from each point to the closest segment of a route."""
+    starts, ends = route[:-1], route[1:]
+    segments = ends - starts
+    along = np.einsum("psk,sk->ps", points[:, None] - starts, segments) / np.einsum(
+        "sk,sk->s", segments, segments
+    )
+    closest = starts + np.clip(along, 0, 1)[..., None] * segments
+    return np.linalg.norm(points[:, None] - closest, axis=2).min(axis=1)
+
+
+class TestSimplify(unittest.TestCase):
+    def test_collinear(self):
+        route = np.column_stack((np.linspace(0, 10, 11), np.zeros(11)))
+        self.assertTrue((simplify(route, 0.1) == [[0, 0], [10, 0]]).all())
+
+    def test_within_tolerance(self):
+        angles = np.linspace(0, 6 * np.pi, 2000)
+        spiral = np.column_stack((angles * np.cos(angles), angles * np.sin(angles)))
+        simplified = simplify(spiral, 0.05)
+        self.assertLess(len(simplified), len(spiral) / 4)
+        self.assertTrue((simplified[[0, -1]] == spiral[[0, -1]]).all())
+        self.assertLessEqual(distance_to_route(spiral, simplified).max(), 0.05 + 1e-9)
+
+    def test_keeps_doubling_back(self):
+        # out and back along a line, so every point is on the line from start to end
+        route = np.array([[0.0, 0.0], [10.0, 0.0], [2.0, 0.0]])
+        self.assertEqual(len(simplify(route, 0.1)), 3)
+
+    def test_no_tolerance(self):
+        route = np.array([[0.0, 0.0], [1.0, 0.0], [2.0, 0.0]])
+        self.assertIs(simplify(route, 0.0), route)
+
+
+class TestTriggerPoints(unittest.TestCase):
+    def test_spacing(self):
+        route = np.array([[0.0, 0.0], [0.0, 10.0], [5.0, 10.0]])
+        points = trigger_points(route, 2.0)
+        self.assertEqual(len(points), 9)
+        self.assertTrue(np.allclose(points[[0, -1]], route[[0, -1]]))
+        self.assertTrue(np.allclose(points[5], [0.0, 10.0]))
+        self.assertTrue(np.allclose(points[6], [2.0, 10.0]))
+        # the last one is only as far from the one before as is left
+        gaps = np.hypot(*np.diff(points, axis=0).T)
+        self.assertTrue(np.allclose(gaps[:-1], 2.0))
+        self.assertAlmostEqual(gaps[-1], 1.0)
+
+    def test_repeated_points(self):
+        route = np.array([[0.0, 0.0], [0.0, 0.0], [0.0, 3.0], [0.0, 3.0]])
+        points = trigger_points(route, 1.0)
+        self.assertTrue(np.allclose(points[:, 1], [0, 1, 2, 3]))
+
+    def test_degenerate(self):
+        self.assertEqual(len(trigger_points(np.empty((0, 2)), 1.0)), 0)
+        self.assertEqual(len(trigger_points(np.array([[1.0, 1.0]] * 3), 1.0)), 1)
+
+
+class TestPhotoRoute(unittest.TestCase):
+    def test_metres(self):
+        # 100m due north, with a redundant point half way
+        step = 100 / METRES_PER_DEGREE
+        route = np.array([[51.0, -1.0], [51.0 + step / 2, -1.0], [51.0 + step, -1.0]])
+        simplified, photos = photo_route(route, 10.0, 1.0)
+        self.assertTrue(np.allclose(simplified, route[[0, -1]]))
+        self.assertEqual(len(photos), 11)
+        self.assertTrue(np.allclose(np.diff(photos[:, 0]), step / 10))
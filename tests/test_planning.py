@@ -0,0 +1,37 @@
+import math
+import unittest
+import numpy as np
+from app.area_resolution import TargetCircle
+from app.planning import plan_route, route_cost
+
+
+class TestRouteCost(unittest.TestCase):
+    def test_square(self):
+        route = np.array([[0.0, 0.0], [0.0, 1.0], [1.0, 1.0], [1.0, 0.0], [1.0, 0.0]])
+        cost = route_cost(route)
+        self.assertEqual((cost.length, cost.turns, cost.points), (3.0, 2, 5))
+
+    def test_straight(self):
+        route = np.array([[0.0, 0.0], [1.0, 1.0], [2.0, 2.0]])
+        cost = route_cost(route)
+        self.assertTrue(math.isclose(cost.length, 2 * math.sqrt(2)))
+        self.assertEqual(cost.turns, 0)
+
+
+class TestPlanner(unittest.TestCase):
+    def test_auto_picks_shortest(self):
+        circle = TargetCircle(lat=0.01, lon=100.0, radius=2000.0)
+        planned = plan_route(circle, 100.0)
+        self.assertEqual(planned.method, "boustrophedon")
+        for cost in planned.candidates.values():
+            self.assertLessEqual(planned.cost.length, cost.length)
+
+    def test_boustrophedon_alternates(self):
+        circle = TargetCircle(lat=0.0, lon=0.0, radius=10.0)
+        route = circle.sweep_route(5.0, 0.0)
+        # the same lines as path_method3, but every other one reversed
+        self.assertEqual(
+            sorted(map(tuple, route.tolist())), sorted(circle.path_method3(5.0))
+        )
+        self.assertEqual(route[3].tolist(), [0.0, -10.0])
+        self.assertEqual(route[4].tolist(), [0.0, 10.0])
@@ -0,0 +1,84 @@
+import asyncio
+import os
+import subprocess
+import sys
+import unittest
+import numpy as np
+from app.area_resolution import TargetCircle, TargetPolygon
+from app.planning import plan_route
+from app.preview import PreviewRenderer, preview_key, render_preview
+from app.projection import LocalFrame
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+CIRCLE = TargetCircle(lat=51.5, lon=-1.0, radius=100.0)
+POLYGON = TargetPolygon(
+    exterior=[(0.0, 0.0), (0.0, 0.001), (0.001, 0.001), (0.001, 0.0)],
+    holes=[[(0.0004, 0.0004), (0.0004, 0.0006), (0.0006, 0.0006)]],
+)
+
+
+class TestPreview(unittest.TestCase):
+    def test_outline(self):
+        (ring,) = CIRCLE.outline()
+        self.assertTrue(np.allclose(ring[0], ring[-1]))
+        # the radius is in metres
+        local = LocalFrame(51.5, -1.0).to_local(ring)
+        self.assertTrue(np.allclose(np.hypot(*local.T), 100.0))
+        exterior, hole = POLYGON.outline()
+        self.assertEqual((len(exterior), len(hole)), (5, 4))
+        self.assertTrue((exterior[0] == exterior[-1]).all())
+
+    def test_render(self):
+        for target in (CIRCLE, POLYGON):
+            png = render_preview(target, plan_route(target, 10.0).route)
+            self.assertTrue(png.startswith(PNG_SIGNATURE))
+
+    def test_key(self):
+        route = plan_route(CIRCLE, 10.0).route
+        self.assertEqual(preview_key(CIRCLE, route), preview_key(CIRCLE, route.copy()))
+        self.assertNotEqual(preview_key(CIRCLE, route), preview_key(CIRCLE, route[1:]))
+        moved = TargetCircle(lat=51.5, lon=-1.0, radius=101.0)
+        self.assertNotEqual(preview_key(CIRCLE, route), preview_key(moved, route))
+
+    def test_cached(self):
+        renderer = PreviewRenderer(workers=1)
+        self.addCleanup(renderer.shutdown)
+        route = plan_route(CIRCLE, 10.0).route
+
+        async def render_twice():
+            # the second is asked for while the first is still rendering
+            return await asyncio.gather(
+                renderer.render(CIRCLE, route), renderer.render(CIRCLE, route)
+            )
+
+        first, second = asyncio.run(render_twice())
+        self.assertTrue(first.startswith(PNG_SIGNATURE))
+        self.assertEqual(first, second)
+        self.assertEqual(len(renderer), 1)
+        self.assertEqual(asyncio.run(renderer.render(CIRCLE, route)), first)
+        self.assertEqual((renderer.hits, renderer.misses), (1, 2))
+
+    def test_bounded(self):
+        renderer = PreviewRenderer(max_bytes=10)
+        renderer._put("a", b"12345")
+        renderer._put("b", b"12345")
+        renderer._put("c", b"12345")
+        self.assertEqual(list(renderer._cache), ["b", "c"])
+        # too big to cache at all
+        renderer._put("d", b"x" * 11)
+        self.assertEqual(list(renderer._cache), ["b", "c"])
+
+    def test_lazy_import(self):
+        imported = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "import sys, app.main; print('matplotlib' in sys.modules)",
+            ],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        )
+        self.assertEqual(imported.stdout.strip(), "False")
@@ -0,0 +1,66 @@
+import math
+import unittest
+import numpy as np
+from app.area_resolution import TargetCircle, TargetPolygon
+from app.planning import plan_route
+from app.projection import METRES_PER_DEGREE, FrameAnchor, LocalFrame
+
+
+class TestLocalFrame(unittest.TestCase):
+    def test_round_trip(self):
+        frame = LocalFrame(51.5, -0.1)
+        points = np.array([[51.5, -0.1], [51.6, 0.2], [51.4, -0.3]])
+        local = frame.to_local(points)
+        self.assertEqual(local[0].tolist(), [0.0, 0.0])
+        self.assertTrue(np.allclose(frame.to_latlon(local), points))
+
+    def test_longitude_shrinks_with_latitude(self):
+        for lat in (0.0, 45.0, 80.0):
+            frame = LocalFrame(lat, 10.0)
+            north, east = frame.to_local(np.array([lat + 0.01, 10.01]))
+            self.assertAlmostEqual(north, 0.01 * METRES_PER_DEGREE)
+            self.assertAlmostEqual(east, north * math.cos(math.radians(lat)))
+
+    def test_antimeridian(self):
+        frame = LocalFrame(0.0, 179.99)
+        east = frame.to_local(np.array([0.0, -179.99]))[1]
+        self.assertAlmostEqual(east, 0.02 * METRES_PER_DEGREE)
+        self.assertAlmostEqual(frame.to_latlon(np.array([0.0, east]))[1], -179.99)
+
+
+class TestFrameAnchor(unittest.TestCase):
+    def test_range(self):
+        anchor = FrameAnchor(max_distance=1000.0)
+        self.assertTrue(anchor.in_range(np.array([10.0]), np.array([10.0])).all())
+        frame = anchor.at(60.0, 10.0)
+        self.assertIs(anchor.at(60.005, 10.0), frame)
+        near = 900.0 / METRES_PER_DEGREE
+        inside = anchor.in_range(np.array([60.0 + near, 60.0]), np.array([10.0, 10.1]))
+        self.assertEqual(inside.tolist(), [True, False])
+        with self.assertRaises(ValueError):
+            anchor.at(60.0, 10.1)
+
+
+class TestPlanningInMetres(unittest.TestCase):
+    def test_circle_is_round_at_any_latitude(self):
+        for lat in (0.0, 60.0):
+            circle = TargetCircle(lat=lat, lon=0.0, radius=500.0)
+            planned = plan_route(circle, 20.0, method="path_method1")
+            # every other point is on the rim, 500m from the centre
+            local = LocalFrame(lat, 0.0).to_local(planned.route[1::2])
+            self.assertTrue(np.allclose(np.hypot(local[:, 0], local[:, 1]), 500.0))
+
+    def test_cost_in_metres(self):
+        # a 1km square, swept at 100m apart, is about 10 lines of 1km
+        side = 1000.0 / METRES_PER_DEGREE
+        lon_side = side / math.cos(math.radians(60.0))
+        square = TargetPolygon(
+            exterior=[
+                (60.0, 0.0),
+                (60.0, lon_side),
+                (60.0 + side, lon_side),
+                (60.0 + side, 0.0),
+            ]
+        )
+        planned = plan_route(square, 100.0)
+        self.assertAlmostEqual(planned.cost.length, 10_900.0, delta=1.0)
@@ -0,0 +1,69 @@
+import unittest
+import numpy as np
+from app.area_resolution import LocalCircle, TargetCircle
+from app.projection import FrameAnchor
+from app.replanning import Replanner
+
+
+def fly(replanner, id, lats, lons):
+    """Report every position in turn, as a drone would."""
+    lats, lons = np.ravel(lats), np.ravel(lons)
+    replanner.observe([id] * len(lats), lats, lons)
+
+
+class TestReplanner(unittest.TestCase):
+    def test_drop_only_returns_unflown(self):
+        replanner = Replanner(cell_size=1.0, vision=1.0)
+        circle = LocalCircle(lat=0.0, lon=0.0, radius=10.0)
+        replanner.assign("a", circle, priority=3, vision=2.0)
+        # fly along the western half, row by row
+        lats, lons = np.meshgrid(np.arange(-10.0, 11.0), np.arange(-10.0, 0.5))
+        fly(replanner, "a", lats, lons)
+
+        route, area, priority, vision = replanner.drop("a")
+        self.assertEqual((priority, vision), (3, 2.0))
+        self.assertTrue((route[:, 1] > 0).all())
+        _, cols = np.nonzero(area.mask)
+        self.assertTrue((cols + area.origin[1] >= 0).all())
+        # nothing left assigned to drop again
+        self.assertIsNone(replanner.drop("a"))
+
+    def test_drop_fully_flown(self):
+        replanner = Replanner(cell_size=1.0, vision=2.0)
+        replanner.assign("a", LocalCircle(lat=0.0, lon=0.0, radius=3.0))
+        lats, lons = np.meshgrid(np.arange(-3.0, 4.0), np.arange(-3.0, 4.0))
+        fly(replanner, "a", lats, lons)
+        # finished, so no longer assigned
+        self.assertNotIn("a", replanner)
+        self.assertIsNone(replanner.drop("a"))
+        self.assertIsNone(replanner.drop("unassigned"))
+
+    def test_only_flown_while_assigned(self):
+        replanner = Replanner(cell_size=1.0, vision=1.0)
+        circle = LocalCircle(lat=0.0, lon=0.0, radius=5.0)
+        lats, lons = np.meshgrid(np.arange(-5.0, 6.0), np.arange(-5.0, 0.5))
+        # flown before being assigned, and by another drone
+        fly(replanner, "a", lats, lons)
+        replanner.assign("a", circle)
+        fly(replanner, "b", lats, lons)
+
+        _, area, _, _ = replanner.drop("a")
+        self.assertEqual(area.mask.sum(), replanner.grid.rasterize(circle)[1].sum())
+
+    def test_reassigning_forgets_flown(self):
+        replanner = Replanner(cell_size=1.0, vision=1.0)
+        circle = LocalCircle(lat=0.0, lon=0.0, radius=5.0)
+        replanner.assign("a", circle)
+        lats, lons = np.meshgrid(np.arange(-5.0, 6.0), np.arange(-5.0, 0.5))
+        fly(replanner, "a", lats, lons)
+        replanner.assign("a", circle)
+
+        _, area, _, _ = replanner.drop("a")
+        self.assertEqual(area.mask.sum(), replanner.grid.rasterize(circle)[1].sum())
+
+    def test_out_of_range_not_tracked(self):
+        replanner = Replanner(cell_size=10.0, vision=10.0, anchor=FrameAnchor())
+        replanner.assign("a", TargetCircle(lat=60.0, lon=10.0, radius=100.0))
+        # too far from where the first one anchored the grid
+        replanner.assign("a", TargetCircle(lat=65.0, lon=10.0, radius=100.0))
+        self.assertNotIn("a", replanner)
@@ -0,0 +1,40 @@
+import unittest
+from app.area_resolution import TargetCircle
+from app.route_cache import RouteCache
+
+
+class TestRouteCache(unittest.TestCase):
+    def test_hit_shares_route(self):
+        cache = RouteCache()
+        first = cache.route(TargetCircle(lat=1.0, lon=2.0, radius=50.0), 5.0)
+        # near-identical circle normalizes to the same key
+        second = cache.route(TargetCircle(lat=1.0000000001, lon=2.0, radius=50.0), 5.0)
+        self.assertIs(first, second)
+        self.assertFalse(first.route.flags.writeable)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_method_in_key(self):
+        cache = RouteCache()
+        circle = TargetCircle(lat=1.0, lon=2.0, radius=50.0)
+        cache.route(circle, 5.0, "path_method1")
+        cache.route(circle, 5.0, "path_method3")
+        self.assertEqual((cache.hits, cache.misses), (0, 2))
+
+    def test_evicts_lru_by_entries(self):
+        cache = RouteCache(max_entries=2)
+        circles = [TargetCircle(lat=float(i), lon=0.0, radius=10.0) for i in range(3)]
+        cache.route(circles[0], 5.0)
+        cache.route(circles[1], 5.0)
+        cache.route(circles[0], 5.0)
+        cache.route(circles[2], 5.0)
+        self.assertEqual((len(cache), cache.evictions), (2, 1))
+        # circle 1 was least recently used, so it should be the one that went
+        cache.route(circles[0], 5.0)
+        self.assertEqual(cache.hits, 2)
+
+    def test_evicts_by_points(self):
+        cache = RouteCache(max_points=15)
+        for i in range(3):
+            cache.route(TargetCircle(lat=float(i), lon=0.0, radius=10.0), 5.0)
+        self.assertLessEqual(cache.stats().points, 15)
+        self.assertGreater(cache.evictions, 0)
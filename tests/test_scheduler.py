@@ -0,0 +1,67 @@
+import unittest
+from unittest import mock
+import numpy as np
+from app.scheduler import RouteScheduler
+
+
+def route(n: float):
+    return np.array([[n, n]])
+
+
+class TestRouteScheduler(unittest.TestCase):
+    def pop_all(self, scheduler: RouteScheduler) -> list[float]:
+        popped = []
+        while (queued := scheduler.pop()) is not None:
+            popped.append(queued.route[0, 0])
+        return popped
+
+    def test_fifo_within_priority(self):
+        scheduler = RouteScheduler()
+        scheduler.extend([route(1), route(2), route(3)])
+        self.assertEqual(self.pop_all(scheduler), [1, 2, 3])
+
+    def test_priority_first(self):
+        scheduler = RouteScheduler()
+        scheduler.push(route(1), priority=0)
+        scheduler.push(route(2), priority=2)
+        scheduler.push(route(3), priority=1)
+        scheduler.push(route(4), priority=2)
+        self.assertEqual(self.pop_all(scheduler), [2, 4, 3, 1])
+
+    def test_aging(self):
+        scheduler = RouteScheduler(aging=10.0)
+        with mock.patch("time.monotonic", return_value=0.0):
+            scheduler.push(route(1), priority=0)
+        # waited longer than two priority levels' worth, so it goes first
+        with mock.patch("time.monotonic", return_value=25.0):
+            scheduler.push(route(2), priority=2)
+        self.assertEqual(self.pop_all(scheduler), [1, 2])
+
+    def test_empty(self):
+        self.assertIsNone(RouteScheduler().pop())
+
+    def test_pop_near(self):
+        scheduler = RouteScheduler(cell_size=1.0)
+        scheduler.extend([route(1), route(5), route(9)])
+        self.assertEqual(scheduler.pop(near=(6.0, 6.0)).route[0, 0], 5)
+        self.assertEqual(len(scheduler), 2)
+        # the route taken by proximity doesn't come out again in priority order
+        self.assertEqual(self.pop_all(scheduler), [1, 9])
+
+    def test_tour_order(self):
+        scheduler = RouteScheduler(order="tour", tour_budget=1.0)
+        # three east-west routes along a line, queued out of order and one backwards
+        scheduler.extend(
+            [
+                np.array([[0.0, 4.0], [0.0, 5.0]]),
+                np.array([[0.0, 1.0], [0.0, 0.0]]),
+                np.array([[0.0, 2.0], [0.0, 3.0]]),
+            ]
+        )
+        routes = []
+        while (queued := scheduler.pop()) is not None:
+            routes.append(queued.route.tolist())
+        lons = [lon for route in routes for _, lon in route]
+        self.assertIn(
+            lons, ([0.0, 1.0, 2.0, 3.0, 4.0, 5.0], [5.0, 4.0, 3.0, 2.0, 1.0, 0.0])
+        )
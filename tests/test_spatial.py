@@ -0,0 +1,57 @@
+import random
+import unittest
+import math
+from app.spatial import GridIndex
+
+
+class TestGridIndex(unittest.TestCase):
+    def test_nearest_matches_brute_force(self):
+        rng = random.Random(1)
+        index = GridIndex(cell_size=1.0)
+        points = dict()
+        for i in range(500):
+            points[i] = (rng.uniform(-20, 20), rng.uniform(-20, 20))
+            index.insert(i, points[i])
+        # move and remove some, to check the index keeps up
+        for i in range(0, 500, 7):
+            points[i] = (rng.uniform(-20, 20), rng.uniform(-20, 20))
+            index.insert(i, points[i])
+        for i in range(0, 500, 11):
+            del points[i]
+            index.remove(i)
+        self.assertEqual(len(index), len(points))
+
+        for _ in range(100):
+            query = (rng.uniform(-30, 30), rng.uniform(-30, 30))
+            expected = min(points, key=lambda k: math.dist(points[k], query))
+            self.assertEqual(index.nearest(query), expected)
+
+    def test_range_queries_match_brute_force(self):
+        rng = random.Random(2)
+        for cell_size in (0.1, 1.0, 100.0):
+            index = GridIndex(cell_size=cell_size)
+            points = {
+                i: (rng.uniform(-10, 10), rng.uniform(-10, 10)) for i in range(300)
+            }
+            for key, point in points.items():
+                index.insert(key, point)
+
+            centre = (rng.uniform(-10, 10), rng.uniform(-10, 10))
+            expected = {k for k, p in points.items() if math.dist(p, centre) <= 4.0}
+            self.assertEqual(set(index.within(centre, 4.0)), expected)
+
+            low, high = (-3.0, -1.0), (2.0, 6.0)
+            expected = {
+                k
+                for k, p in points.items()
+                if low[0] <= p[0] <= high[0] and low[1] <= p[1] <= high[1]
+            }
+            self.assertEqual(set(index.in_bbox(low, high)), expected)
+
+    def test_nearest_far_away(self):
+        index = GridIndex(cell_size=0.01)
+        index.insert("a", (50.0, 50.0))
+        self.assertEqual(index.nearest((-50.0, -50.0)), "a")
+
+    def test_empty(self):
+        self.assertIsNone(GridIndex(cell_size=1.0).nearest((0.0, 0.0)))
@@ -0,0 +1,222 @@
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime, timezone
+from unittest import mock
+
+import numpy as np
+
+from app.drone_store import DroneData, DroneStatus, DroneStatusBatch
+from app.scheduler import RouteScheduler
+from app.state import MEMORY, SQLITE, MemoryBackend, SQLiteBackend, open_backend
+
+
+def drone(lat: float, battery: int = 100) -> DroneData:
+    return DroneData(
+        status=DroneStatus.flying,
+        battery=battery,
+        lastUpdate=datetime(2024, 1, 1, tzinfo=timezone.utc),
+        lastSeen=(lat, 0.0),
+    )
+
+
+def route(n: float):
+    return np.array([[n, n], [n, n + 1]])
+
+
+def take_all(path: str) -> list[int]:
+    """Take routes from the shared queue in another process, until there are none left."""
+    backend = SQLiteBackend(path)
+    taken = []
+    while (queued := backend.queue.pop()) is not None:
+        taken.append(int(queued.route[0, 0]))
+    backend.close()
+    return taken
+
+
+class TestSQLiteBackend(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "state.db")
+        self.backend = self.open()
+
+    def open(self) -> SQLiteBackend:
+        backend = SQLiteBackend(self.path, aging=10.0)
+        self.addCleanup(backend.close)
+        return backend
+
+    def test_drones(self):
+        drones = self.backend.drones
+        self.assertEqual(
+            drones.put_batch(DroneStatusBatch.of({"a": drone(1), "b": drone(2)})),
+            ["a", "b"],
+        )
+        self.assertFalse(drones.put("a", drone(1)))
+        self.assertTrue(drones.put("a", drone(1, battery=50)))
+        self.assertEqual(drones["a"], drone(1, battery=50))
+        self.assertEqual(drones.position("b"), (2.0, 0.0))
+        self.assertEqual(dict(drones.items()), {"a": drone(1, 50), "b": drone(2)})
+        drones.remove("a")
+        self.assertNotIn("a", drones)
+        self.assertEqual(len(drones), 1)
+        with self.assertRaises(KeyError):
+            drones["a"]
+
+    def test_changes_seen_by_other_workers(self):
+        other = self.open()
+        self.backend.drones.put_batch(
+            DroneStatusBatch.of({"a": drone(1), "b": drone(2)})
+        )
+        version, changed = other.drones.changed_since(0)
+        self.assertEqual(
+            sorted(changed), [("a", (1.0, 0.0), version), ("b", (2.0, 0.0), version)]
+        )
+
+        other.drones.put("b", drone(3))
+        self.backend.drones.remove("a")
+        latest, changed = self.backend.drones.changed_since(version)
+        self.assertEqual(
+            changed, [("b", (3.0, 0.0), version + 1), ("a", None, version + 2)]
+        )
+        self.assertEqual(latest, version + 2)
+        self.assertEqual(self.backend.drones.changed_since(latest), (latest, []))
+
+    def test_reads_not_blocked_by_pending_write(self):
+        self.backend.drones.put("a", drone(1))
+        other = self.open()
+        # another worker holds the write lock, so a write here has to wait for it
+        other.db.execute("BEGIN IMMEDIATE")
+        writer = threading.Thread(target=self.backend.drones.put, args=("a", drone(2)))
+        writer.start()
+        try:
+            time.sleep(0.1)
+            start = time.perf_counter()
+            self.assertEqual(self.backend.drones.position("a"), (1.0, 0.0))
+            self.assertEqual(len(self.backend.queue), 0)
+            self.assertLess(time.perf_counter() - start, 0.05)
+        finally:
+            other.db.execute("ROLLBACK")
+            writer.join()
+        self.assertEqual(self.backend.drones.position("a"), (2.0, 0.0))
+
+    def test_empty_pop_takes_no_lock(self):
+        other = self.open()
+        other.db.execute("BEGIN IMMEDIATE")
+        try:
+            # would wait out the busy timeout if it needed the write lock
+            start = time.perf_counter()
+            self.assertIsNone(self.backend.queue.pop(near=(0.0, 0.0)))
+            self.assertLess(time.perf_counter() - start, 0.05)
+        finally:
+            other.db.execute("ROLLBACK")
+
+    def test_reads_only_see_committed(self):
+        self.backend.drones.put("a", drone(1))
+        with self.assertRaises(RuntimeError):
+            with self.backend.transaction() as db:
+                db.execute("UPDATE drones SET lat = 99 WHERE id = 'a'")
+                self.assertEqual(self.backend.drones.position("a"), (1.0, 0.0))
+                raise RuntimeError("roll back")
+        self.assertEqual(self.backend.drones.position("a"), (1.0, 0.0))
+
+    def test_priority_and_aging(self):
+        queue = self.backend.queue
+        with mock.patch("time.time", return_value=0.0):
+            queue.push(route(1), priority=0)
+            queue.push(route(2), priority=1)
+        # waited longer than two priority levels' worth, so it goes after the first two
+        with mock.patch("time.time", return_value=25.0):
+            queue.push(route(3), priority=2)
+        popped = [queue.pop().route[0, 0] for _ in range(3)]
+        self.assertEqual(popped, [2, 1, 3])
+        self.assertIsNone(queue.pop())
+
+    def test_round_trip(self):
+        self.backend.queue.push(route(1), priority=3, vision=15.0)
+        queued = self.open().queue.pop()
+        np.testing.assert_array_equal(queued.route, route(1))
+        self.assertEqual((queued.priority, queued.vision), (3, 15.0))
+        self.assertEqual(len(self.backend.queue), 0)
+
+    def test_routes_without_vision(self):
+        # a database from before routes kept their vision radius
+        self.backend.close()
+        os.remove(self.path)
+        db = sqlite3.connect(self.path)
+        db.execute(
+            "CREATE TABLE routes (id INTEGER PRIMARY KEY AUTOINCREMENT, key REAL NOT NULL,"
+            " priority INTEGER NOT NULL, enqueued REAL NOT NULL, start_lat REAL,"
+            " start_lon REAL, points BLOB NOT NULL, area BLOB NOT NULL)"
+        )
+        db.execute(
+            "INSERT INTO routes (key, priority, enqueued, points, area)"
+            " VALUES (0, 1, 0, ?, ?)",
+            (route(1).astype("<f8").tobytes(), b""),
+        )
+        db.commit()
+        db.close()
+
+        queue = self.open().queue
+        self.assertIsNone(queue.pop().vision)
+        queue.push(route(2), vision=5.0)
+        self.assertEqual(queue.pop().vision, 5.0)
+
+    def test_pop_near(self):
+        queue = self.backend.queue
+        queue.extend([route(1), route(5), route(9)])
+        self.assertEqual(queue.pop(near=(6.0, 6.0)).route[0, 0], 5)
+        self.assertEqual(queue.oldest().route[0, 0], 1)
+        self.assertEqual(len(queue), 2)
+
+    def test_pop_near_beyond_boxes(self):
+        queue = self.backend.queue
+        # the closest is outside the smaller boxes, and one in a box isn't the closest
+        queue.extend([route(50), route(-30), np.array([[0.0, 9.5], [0.0, 10.0]])])
+        self.assertEqual(queue.pop(near=(-8.0, 0.0)).route[0, 1], 9.5)
+        self.assertEqual(queue.pop(near=(100.0, 100.0)).route[0, 0], 50)
+        self.assertEqual(queue.pop(near=(0.0, 0.0)).route[0, 0], -30)
+
+    def test_tombstones_purged(self):
+        backend = SQLiteBackend(self.path, tombstone_versions=2)
+        self.addCleanup(backend.close)
+        drones = backend.drones
+        drones.put_batch(DroneStatusBatch.of({"a": drone(1), "b": drone(2)}))
+        drones.remove("a")
+        self.assertEqual(drones.purged(), 0)
+        drones.put("b", drone(3))
+        drones.remove("b")
+        # "a" was removed two versions before "b", so is gone, but "b" isn't yet
+        self.assertEqual(drones.purged(), 2)
+        _, changed = drones.changed_since(0)
+        self.assertEqual([(id, position) for id, position, _ in changed], [("b", None)])
+
+    def test_atomic_pop_across_processes(self):
+        self.backend.queue.extend(route(n) for n in range(200))
+        # each process opens its own connection, so forking is fine (and much quicker)
+        method = "fork" if os.name == "posix" else "spawn"
+        with multiprocessing.get_context(method).Pool(4) as pool:
+            taken = pool.map(take_all, [self.path] * 4)
+        # every route went to exactly one worker
+        self.assertEqual(sorted(sum(taken, [])), list(range(200)))
+
+
+class TestOpenBackend(unittest.TestCase):
+    def test_memory(self):
+        queue = RouteScheduler()
+        backend = open_backend(MEMORY, queue)
+        self.assertIsInstance(backend, MemoryBackend)
+        self.assertIs(backend.queue, queue)
+        self.assertFalse(backend.shared)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            open_backend("redis", RouteScheduler())
+        with self.assertRaises(ValueError):
+            open_backend(SQLITE, RouteScheduler())
+        with self.assertRaises(ValueError):
+            open_backend(SQLITE, RouteScheduler(order="tour"), path="state.db")
@@ -0,0 +1,46 @@
+import asyncio
+import unittest
+from app.streaming import StatusFeed
+
+
+class TestStatusFeed(unittest.TestCase):
+    def test_changed_since(self):
+        feed = StatusFeed()
+        feed.publish("a")
+        version = feed.publish("b")
+        feed.publish("c")
+        feed.publish("a")
+        self.assertEqual(feed.changed_since(version), ["a", "c"])
+        self.assertEqual(feed.changed_since(feed.version), [])
+
+    def test_removals_forgotten(self):
+        feed = StatusFeed(max_removed=2)
+        feed.publish("a")
+        first = feed.publish("b", removed=True)
+        feed.publish("c", removed=True)
+        # coming back means it's no longer removed
+        feed.publish("b")
+        feed.publish("d", removed=True)
+        self.assertEqual(feed.horizon, 0)
+        feed.publish("e", removed=True)
+        # "c" is forgotten, so nothing from before it was removed can be answered
+        self.assertEqual(feed.horizon, first + 1)
+        self.assertIsNone(feed.changed_since(first))
+        self.assertEqual(feed.changed_since(first + 1), ["e", "d", "b"])
+        self.assertIsNone(feed.last_changed("c"))
+
+    def test_subscription_coalesces(self):
+        async def run():
+            feed = StatusFeed()
+            subscription = feed.subscribe()
+            feed.publish("a")
+            feed.publish("b")
+            feed.publish("a")
+            first = await subscription.next()
+            feed.unsubscribe(subscription)
+            feed.publish("a")
+            return first, subscription.pending
+
+        first, pending = asyncio.run(run())
+        self.assertEqual(first, ["a", "b"])
+        self.assertEqual(pending, {})
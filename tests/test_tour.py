@@ -0,0 +1,54 @@
+import itertools
+import math
+import random
+import unittest
+from app.tour import TourPlanner
+
+
+def brute_force(ends) -> float:
+    best = math.inf
+    for order in itertools.permutations(range(len(ends))):
+        for flips in itertools.product((False, True), repeat=len(ends)):
+            cost = 0.0
+            for a, b, flip_a, flip_b in zip(order, order[1:], flips, flips[1:]):
+                exit = ends[a][0 if flip_a else 1]
+                entry = ends[b][1 if flip_b else 0]
+                cost += math.dist(exit, entry)
+            best = min(best, cost)
+    return best
+
+
+class TestTourPlanner(unittest.TestCase):
+    def random_ends(self, rng: random.Random, n: int):
+        return [
+            (
+                (rng.uniform(0, 10), rng.uniform(0, 10)),
+                (rng.uniform(0, 10), rng.uniform(0, 10)),
+            )
+            for _ in range(n)
+        ]
+
+    def test_close_to_optimal(self):
+        rng = random.Random(4)
+        for _ in range(5):
+            ends = self.random_ends(rng, 5)
+            tour = TourPlanner()
+            for i, (start, end) in enumerate(ends):
+                tour.add(i, start, end)
+            tour.rebuild(budget=1.0)
+            self.assertLessEqual(tour.cost(), brute_force(ends) * 1.25)
+
+    def test_incremental(self):
+        rng = random.Random(5)
+        tour = TourPlanner()
+        ends = self.random_ends(rng, 50)
+        for i, (start, end) in enumerate(ends):
+            tour.add(i, start, end, budget=0.01)
+        tour.remove(7)
+        self.assertEqual(
+            sorted(id for id, _ in tour.order()), [i for i in range(50) if i != 7]
+        )
+        # the incremental tour should be no worse than a fresh nearest neighbour one
+        incremental = tour.cost()
+        tour.rebuild()
+        self.assertLessEqual(incremental, tour.cost() * 1.1)
@@ -0,0 +1,32 @@
+import unittest
+import numpy as np
+from app import wire
+
+
+class TestWire(unittest.TestCase):
+    def test_polyline_reference(self):
+        # the example from the polyline algorithm's documentation
+        route = np.array([[38.5, -120.2], [40.7, -120.95], [43.252, -126.453]])
+        encoded = wire.encode_polyline(route)
+        self.assertEqual(encoded, b"_p~iF~ps|U_ulLnnqC_mqNvxq`@")
+        self.assertTrue(np.allclose(wire.decode_polyline(encoded), route))
+
+    def test_polyline_empty(self):
+        self.assertEqual(wire.encode_polyline(np.empty((0, 2))), b"")
+
+    def test_negotiate(self):
+        self.assertEqual(wire.negotiate(None), wire.JSON)
+        self.assertEqual(wire.negotiate("*/*"), wire.JSON)
+        self.assertEqual(wire.negotiate(wire.FLOAT32), wire.FLOAT32)
+        self.assertEqual(
+            wire.negotiate(f"{wire.FLOAT32};q=0.5, {wire.POLYLINE}"), wire.POLYLINE
+        )
+
+    def test_photo_route(self):
+        route = np.array([[51.5, -1.0], [51.6, -1.1]])
+        photos = np.array([[51.5, -1.0], [51.55, -1.05], [51.6, -1.1]])
+        for media_type in wire.MEDIA_TYPES:
+            encoded = wire.encode_photo_route(route, photos, media_type)
+            decoded = wire.decode_photo_route(encoded, media_type, len(route))
+            self.assertTrue(np.allclose(decoded[0], route, atol=1e-5))
+            self.assertTrue(np.allclose(decoded[1], photos, atol=1e-5))